@@ -1,141 +1,193 @@
-import argparse, collections, logging, sys, time
+import argparse, io, logging, os, sys, time
 
-import binary_tree, byte_reader
+import binary_tree, bit_reader, coder_logging, coder_stats, container_format, out_file, vitter_huffman_tree
 
 class AdaptiveHuffmanDecoder(object):
-    def __init__(self, srcFilePath: str, outFilePath: str, srcMaxBufferLength: int = 1024, outMaxBufferLength: int = 1024, debug: bool = False):
+    def __init__(self, srcFilePath: str, outFilePath: str, srcMaxBufferLength: int = 1024, outMaxBufferLength: int = 1024,
+                 progressCallback: coder_stats.ProgressCallback = None, profile: bool = False, debug: bool = False):
         self.m_srcFilePath: str = srcFilePath
         self.m_outFilePath: str = outFilePath
 
         self.m_srcMaxBufferLength: int = srcMaxBufferLength
         self.m_outMaxBufferLength: int = outMaxBufferLength
 
+        # Read from the header and trailer. Symbol count -1 = not stored
+        self.m_engine: str = container_format.AdaptiveContainerFormat.ENGINE_BASIC
+        self.m_treeReconstructionInterval: int = 1
+        self.m_rescaleThreshold: int = 0
+        self.m_encodedBits: int = 0
+        self.m_symbolCount: int = -1
+
+        # Stats of the last Run. Progress is reported on every flush of the out buffer
+        self.m_progressCallback: coder_stats.ProgressCallback = progressCallback
+        self.m_profile: bool = profile
+        self.m_stats: coder_stats.CoderStats = None
+
         self.m_debug: bool = debug
         
-        self.m_logger: logging.Logger = logging.getLogger(__name__)
-        self.m_logger.addHandler(logging.StreamHandler(sys.stdout))
+        self.m_logger: logging.Logger = coder_logging.GetCoderLogger(__name__, sys.stdout)
     
-    def Run(self) -> None:
+    def Run(self) -> coder_stats.CoderStats:
         self.m_logger.info("Decoding...")
+
+        self.m_stats = coder_stats.CoderStats(self.m_progressCallback, self.m_profile)
+
+        with self.m_stats.Measure():
+            self.__Decode()
         
-        startTime: float = time.time()
-        self.__Decode()
-        endTime: float = time.time()
-        
-        self.m_logger.info(f"Done. Decoding time: {endTime - startTime}s")
+        self.m_logger.info(f"Done. Decoding time: {self.m_stats.m_totalTime}s")
+        self.m_stats.m_bytesIn = os.stat(self.m_srcFilePath).st_size
+        self.m_stats.m_bytesOut = os.stat(self.m_outFilePath).st_size
+        self.m_stats.m_encodedBits = self.m_encodedBits
+        self.m_stats.m_symbolCount = self.m_stats.m_bytesOut
+        return self.m_stats
 
     def __Decode(self) -> None:
-        byteReader: byte_reader.ByteReader = byte_reader.ByteReader(debug=self.m_debug)
         outBuffer: bytearray = bytearray()
-        codeHistory: collections.deque = collections.deque([])
-        codeHistoryCapacity: int = 7
 
         with open(self.m_outFilePath, "wb") as outFile:
             with open(self.m_srcFilePath, "rb") as srcFile:
-                def UpdateBuffer() -> bool:
-                    buffer: bytes = srcFile.read(self.m_srcMaxBufferLength)
-                    
-                    if buffer == b'':
-                        return False
-                    
-                    byteReader.SetBuffer(buffer)
-                    return True
-            
-                UpdateBuffer()
-                
-                # First byte info:
-                # First 5 bits = tree reconstruction interval
-                # Last 3 bits = padding zeros
-                byte: int = byteReader.ReadByte()
-                treeReconstructionInterval: int = (byte >> 3) + 1
-                paddingZeros: int = byte & 0b00000111
-
-                if self.m_debug:
-                    self.m_logger.debug(f"Tree reconstruction interval: {treeReconstructionInterval}")
-                    self.m_logger.debug(f"Padding zero's: {paddingZeros}")
-
-                tree: binary_tree.AdaptiveHuffmanTree = binary_tree.AdaptiveHuffmanTree(treeReconstructionInterval)
-                
-                # Getting first character
-                byte: int = byteReader.ReadByte()
-                outBuffer.append(byte)
-                tree.AddSymbol(byte)
-                currentCode: str = ""
-                
-                while byteReader.CanRead() or UpdateBuffer():
-                    result: int = byteReader.ReadBit()
-
-                    if result == -1:
-                        continue
-                    
-                    currentCode += str(result)
-                    symbol: int = tree.GetSymbol(currentCode)
-                    
-                    if self.m_debug:
-                        self.m_logger.debug(f"Current code: {currentCode}")
-                    
-                    if symbol == tree.m_nytValue:
-                        # NYT node. Read byte, decode and add to the tree
-                        result: int = byteReader.ReadByte()
-                        
-                        if result == -1:
-                            if UpdateBuffer():
-                                result = byteReader.ReadByte()
-                            else:
-                                assert False, "End of file"
-                                
-                        if self.m_debug:
-                            self.m_logger.debug(f"Found NYT code {currentCode}. Decoded '{chr(result)}' ({result:08b})")
-                        
-                        outBuffer.append(result)
-                        tree.AddSymbol(result)
-                        codeHistory.append(currentCode)
-                        currentCode = ""
-                    elif symbol >= 0:
-                        # Decode symbol. Add to the tree
+                with self.m_stats.Phase(coder_stats.CoderStats.HEADER_READ):
+                    bitReader: bit_reader.BitReader = self.__DecodeHeader(srcFile)
+
+                self.m_stats.m_progressTotal = max(self.m_symbolCount, 0)
+                startTime: float = time.perf_counter()
+                writtenBytes: int = 0
+
+                if self.m_symbolCount >= 0:
+                    out_file.OutFile.Preallocate(outFile, self.m_symbolCount)
+
+                if self.m_engine == container_format.AdaptiveContainerFormat.ENGINE_VITTER:
+                    tree: vitter_huffman_tree.VitterHuffmanTree = vitter_huffman_tree.VitterHuffmanTree(self.m_rescaleThreshold)
+                else:
+                    tree: binary_tree.AdaptiveHuffmanTree = binary_tree.AdaptiveHuffmanTree(self.m_treeReconstructionInterval, self.m_rescaleThreshold)
+
+                # Every symbol takes at least one bit, so without a symbol count the encoded bits end decoding
+                symbolsLeft: int = self.m_symbolCount if self.m_symbolCount >= 0 else self.m_encodedBits
+                bitsLeft: int = self.m_encodedBits
+
+                peek = bitReader.Peek
+                consume = bitReader.Consume
+                internalNodeValue: int = tree.m_internalNodeValue
+                nytValue: int = tree.m_nytValue
+
+                # Cursor goes one edge down per bit of a peeked window and stays where it is when
+                # the window runs out in the middle of a code. NYT code of the empty tree is empty,
+                # so the first symbol needs no bits to be found
+                windowSize: int = 64
+                node: binary_tree.Node = tree.m_root
+
+                while symbolsLeft > 0:
+                    window: int = peek(windowSize)
+                    windowBits: int = windowSize
+
+                    # Bits below it are past the end of encoded data
+                    lowestBit: int = max(windowSize - bitsLeft, 0)
+
+                    while symbolsLeft > 0:
+                        symbol: int = node.m_byte
+
+                        if symbol == internalNodeValue:
+                            if windowBits == lowestBit:
+                                break
+
+                            windowBits -= 1
+                            node = node.m_right if (window >> windowBits) & 1 else node.m_left
+                            continue
+
+                        if symbol == nytValue:
+                            # NYT node. Next byte is a new symbol
+                            if windowBits - 8 < lowestBit:
+                                break
+
+                            windowBits -= 8
+                            symbol = (window >> windowBits) & 0xFF
+
                         if self.m_debug:
                             self.m_logger.debug(f"Decoded '{chr(symbol)}' ({symbol:08b})")
-                        
+
                         outBuffer.append(symbol)
                         tree.AddSymbol(symbol)
-                        codeHistory.append(currentCode)
-                        currentCode = ""
-                    
-                    if len(codeHistory) > codeHistoryCapacity:
-                        codeHistory.popleft()
-                    
+                        symbolsLeft -= 1
+                        node = tree.m_root
+
+                    usedBits: int = windowSize - windowBits
+                    if usedBits == 0:
+                        break
+
+                    consume(usedBits)
+                    bitsLeft -= usedBits
+
                     if len(outBuffer) > self.m_outMaxBufferLength:
                         if self.m_debug:
                             self.m_logger.debug(f"Out buffer overflow. Writing content to the {self.m_outFilePath}")
                         
                         outFile.write(outBuffer)
+                        writtenBytes += len(outBuffer)
                         outBuffer.clear()
+                        self.m_stats.ReportProgress(writtenBytes)
 
-                assert '1' not in currentCode
-
-                paddingZeros -= len(currentCode)
-                while paddingZeros > 0:
-                    if self.m_debug:
-                        self.m_logger.debug(f"{paddingZeros} padding zeros left")
-
-                    lastCode = codeHistory[-1]
-                    codeHistory.pop()
+                self.m_stats.AddPhaseTime(coder_stats.CoderStats.BODY_DECODE, time.perf_counter() - startTime)
 
-                    assert '1' not in lastCode
-
-                    paddingZeros -= len(lastCode)
-                    outBuffer = outBuffer[:-1]
+                assert bitsLeft == 0 and node == tree.m_root, "Encoded data does not end on a code boundary"
+                assert self.m_symbolCount < 0 or symbolsLeft == 0, f"Decoded {self.m_symbolCount - symbolsLeft} of {self.m_symbolCount} symbols"
             
             if len(outBuffer) > 0:
                 outFile.write(outBuffer)
                 outBuffer.clear()
-                    
+
+    def __DecodeHeader(self, srcFile: io.BufferedReader) -> bit_reader.BitReader:
+        # Returns a reader positioned at the first encoded bit
+        fileSize: int = os.stat(self.m_srcFilePath).st_size
+        magic: bytes = srcFile.read(len(container_format.AdaptiveContainerFormat.MAGIC))
+
+        if magic != container_format.AdaptiveContainerFormat.MAGIC:
+            # Legacy first byte info:
+            # First 5 bits = tree reconstruction interval
+            # Last 3 bits = padding zeros
+            bitReader: bit_reader.BitReader = bit_reader.BitReader(srcFile, self.m_srcMaxBufferLength, buffer=magic, debug=self.m_debug)
+            byte: int = bitReader.Read(8) if fileSize > 0 else 0
+            self.m_treeReconstructionInterval = (byte >> 3) + 1
+            self.m_encodedBits = max(fileSize - 1, 0) * 8 - (byte & 0b00000111)
+            self.m_symbolCount = -1
+        else:
+            version: int = srcFile.read(1)[0]
+            if version != container_format.AdaptiveContainerFormat.VERSION:
+                raise Exception(f"Unsupported adaptive container version: {version}")
+
+            engine: int = srcFile.read(1)[0]
+            if engine >= len(container_format.AdaptiveContainerFormat.ENGINES):
+                raise Exception(f"Unknown adaptive engine: {engine}")
+
+            self.m_engine = container_format.AdaptiveContainerFormat.ENGINES[engine]
+            self.m_treeReconstructionInterval = srcFile.read(1)[0]
+            self.m_rescaleThreshold = container_format.ContainerFormat.UnpackFields(srcFile.read(container_format.ContainerFormat.INDEX_FIELD_BYTES))[0]
+
+            headerBytes: int = container_format.AdaptiveContainerFormat.HEADER_BYTES
+            trailerBytes: int = container_format.AdaptiveContainerFormat.TRAILER_BYTES
+            srcFile.seek(-trailerBytes, os.SEEK_END)
+            trailer: bytes = srcFile.read(trailerBytes)
+
+            # Trailer is the symbol count, then padding zeros
+            self.m_encodedBits = (fileSize - headerBytes - trailerBytes) * 8 - trailer[-1]
+            self.m_symbolCount = container_format.ContainerFormat.UnpackFields(trailer[:-1])[0]
+
+            srcFile.seek(headerBytes)
+            bitReader: bit_reader.BitReader = bit_reader.BitReader(srcFile, self.m_srcMaxBufferLength, debug=self.m_debug)
+
+        if self.m_debug:
+            self.m_logger.debug(f"Engine: {self.m_engine}. Tree reconstruction interval: {self.m_treeReconstructionInterval}. Rescale threshold: {self.m_rescaleThreshold}")
+            self.m_logger.debug(f"Encoded bits: {self.m_encodedBits}. Symbols: {self.m_symbolCount}")
+
+        return bitReader
                 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("srcFile", help = "Path to the source file")
     parser.add_argument("outFile", help = "Path to the out file")
     parser.add_argument("-l", "--logLevel", dest="logLevel", type = int, default = 2, help = "To configure logging messages. 1 - DEBUG, 2 - INFO, 3 - WARNING, 4 - ERROR, 5 - CRITICAL")
+    parser.add_argument("--logFile", dest="logFile", default = "logs/adaptive_decoder.log", help = "Log file. Its directory is created if missing. By default logs/adaptive_decoder.log")
+    parser.add_argument("--profile", dest="profile", action = "store_true", help = "Profile decoding with cProfile and print the slowest functions")
     args = parser.parse_args()
     
     srcFile: str = args.srcFile
@@ -145,11 +197,14 @@ def main():
     if logLevel <= 0 or logLevel > 5:
         raise Exception("Bad logLevel")
     
-    logging.basicConfig(level = logLevel * 10, filename = "logs/adaptive_decoder.log", filemode = "w",
-        format = "%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    coder_logging.ConfigureLogging(logLevel, args.logFile)
         
-    encoder: AdaptiveHuffmanDecoder = AdaptiveHuffmanDecoder(srcFile, outFile, debug = logLevel == 1)
-    encoder.Run()
+    decoder: AdaptiveHuffmanDecoder = AdaptiveHuffmanDecoder(srcFile, outFile, profile = args.profile, debug = logLevel == 1)
+    stats: coder_stats.CoderStats = decoder.Run()
+    stats.Print(srcFile, outFile, sys.stdout)
+
+    if args.profile:
+        print(stats.GetProfile())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
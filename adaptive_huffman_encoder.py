@@ -1,99 +1,113 @@
-import argparse, logging, os, sys, time
+from typing import TextIO
 
-import binary_tree, byte_writer
+import argparse, collections, logging, os, sys, time
+
+import binary_tree, bit_writer, coder_logging, coder_stats, container_format, out_file, vitter_huffman_tree
 
 class AdaptiveHuffmanEncoder(object):
-    def __init__(self, srcFilePath: str, outFilePath: str, treeReconstructionInterval: int = 1, srcMaxBufferLength: int = 1024, outMaxBufferLength: int = 1024, debug: bool = False):
+    def __init__(self, srcFilePath: str, outFilePath: str, treeReconstructionInterval: int = 1, engine: str = container_format.AdaptiveContainerFormat.ENGINE_BASIC, rescaleThreshold: int = 0, srcMaxBufferLength: int = 1024, outMaxBufferLength: int = 1024,
+                 progressCallback: coder_stats.ProgressCallback = None, profile: bool = False, debug: bool = False):
         self.m_srcFilePath: str = srcFilePath
         self.m_outFilePath: str = outFilePath
+        self.m_outFileSize: int = 0
+
+        # Messages go to stderr when encoded data goes to stdout
+        self.m_messageFile: TextIO = sys.stderr if out_file.OutFile.IsStdout(outFilePath) else sys.stdout
 
         self.m_srcMaxBufferLength: int = srcMaxBufferLength
         self.m_outMaxBufferLength: int = outMaxBufferLength
         self.m_treeReconstructionInterval: int = treeReconstructionInterval
+        self.m_engine: str = engine
+        self.m_rescaleThreshold: int = rescaleThreshold
+
+        # Stats of the last Run. Progress is reported on every read of the source
+        self.m_progressCallback: coder_stats.ProgressCallback = progressCallback
+        self.m_profile: bool = profile
+        self.m_stats: coder_stats.CoderStats = None
 
         self.m_debug: bool = debug
         
-        self.m_logger: logging.Logger = logging.getLogger(__name__)
-        self.m_logger.addHandler(logging.StreamHandler(sys.stdout))
+        self.m_logger: logging.Logger = coder_logging.GetCoderLogger(__name__, self.m_messageFile)
     
-    def Run(self) -> None:
+    def Run(self) -> coder_stats.CoderStats:
         self.m_logger.info("Encoding...")
+
+        self.m_stats = coder_stats.CoderStats(self.m_progressCallback, self.m_profile)
+        self.m_stats.m_progressTotal = os.stat(self.m_srcFilePath).st_size
+
+        with self.m_stats.Measure():
+            self.__Encode()
         
-        startTime: float = time.time()
-        self.__Encode()
-        endTime: float = time.time()
-        
-        self.m_logger.info(f"Done. Encoding time: {endTime - startTime}s")
-        srcFileSize: int = os.stat(self.m_srcFilePath).st_size
-        outFileSize: int = os.stat(self.m_outFilePath).st_size
-        print(f"'{self.m_srcFilePath}' size: {srcFileSize}B, {round(srcFileSize / 1024, 3)}Kb, {round(srcFileSize / (1024 ** 2), 3)}Mb")
-        print(f"'{self.m_outFilePath}' size: {outFileSize}B, {round(outFileSize / 1024, 3)}Kb, {round(outFileSize / (1024 ** 2), 3)}Mb")
-        print(f"Compression ratio: {srcFileSize / outFileSize}")
+        self.m_logger.info(f"Done. Encoding time: {self.m_stats.m_totalTime}s")
+        self.m_stats.m_bytesIn = self.m_stats.m_progressTotal
+        self.m_stats.m_bytesOut = self.m_outFileSize
+        return self.m_stats
 
     def __Encode(self) -> None:
-        tree: binary_tree.AdaptiveHuffmanTree = binary_tree.AdaptiveHuffmanTree(self.m_treeReconstructionInterval)
-        byteWriter: byte_writer.ByteWriter = byte_writer.ByteWriter(self.m_debug)
-        paddingZeros: int = 0
-
-        ###### FIRST BYTE INFO ######
-        # Tree reconstruction interval value. 5 bits. Max value 32
-        self.m_treeReconstructionInterval -= 1
-        byteWriter.WriteBitsFromByte(self.m_treeReconstructionInterval, 5)
-        
-        # Leaving space for padding zeros amount at the end of file. Max value 7 (0b111)
-        for _ in range(3):
-            byteWriter.WriteBit(0)
-        #############################
+        # Reconstruction interval is stored for every engine, only the basic one uses it
+        if self.m_engine == container_format.AdaptiveContainerFormat.ENGINE_VITTER:
+            tree: vitter_huffman_tree.VitterHuffmanTree = vitter_huffman_tree.VitterHuffmanTree(self.m_rescaleThreshold)
+        else:
+            tree: binary_tree.AdaptiveHuffmanTree = binary_tree.AdaptiveHuffmanTree(self.m_treeReconstructionInterval, self.m_rescaleThreshold)
+
+        bitWriter: bit_writer.BitWriter = bit_writer.BitWriter(self.m_outMaxBufferLength, debug=self.m_debug)
+
+        with out_file.OutFile(self.m_outFilePath) as outFile:
+            startTime: float = time.perf_counter()
+            outFile.Write(container_format.AdaptiveContainerFormat.MAGIC + bytes([container_format.AdaptiveContainerFormat.VERSION, container_format.AdaptiveContainerFormat.ENGINES.index(self.m_engine), self.m_treeReconstructionInterval]))
+            outFile.Write(container_format.ContainerFormat.PackFields((self.m_rescaleThreshold,)))
+            self.m_stats.m_headerBits = outFile.GetBytesWritten() * 8
+
+            symbolCount: int = 0
+            byteCounts: collections.Counter = collections.Counter()
 
-        with open(self.m_outFilePath, "wb") as outFile:
             with open(self.m_srcFilePath, "rb") as srcFile:
                 while (buffer := srcFile.read(self.m_srcMaxBufferLength)) != b'':
+                    byteCounts.update(buffer)
                     for byte in buffer:
-                        code: str = tree.GetHuffmanCode(byte)
+                        code, length = tree.GetCode(byte)
 
                         if self.m_debug:
-                            self.m_logger.debug(f"Got '{chr(byte)}' ({byte:08b}). Huffman code: {code}")
+                            self.m_logger.debug(f"Got '{chr(byte)}' ({byte:08b}). Huffman code: {tree.GetHuffmanCode(byte)}")
 
                         tree.AddSymbol(byte)
+                        symbolCount += 1
 
-                        byteWriter.WriteBitsFromByte(int(code, 2), len(code))
+                        bitWriter.Write(code, length)
 
-                        if len(byteWriter.m_buffer) > self.m_outMaxBufferLength:
-                            content = byteWriter.PopContent()
-                            outFile.write(content)
+                        if bitWriter.GetLength() > self.m_outMaxBufferLength:
+                            outFile.Write(bitWriter.PopContent())
 
-            if byteWriter.m_leftToWriteBits < 8:
-                paddingZeros = byteWriter.m_leftToWriteBits
-                byteWriter.AppendByteToBuffer()
-            
-            if len(byteWriter.m_buffer) > 0:
-                content = byteWriter.PopContent(getAll=True)
-                outFile.write(content)
+                    self.m_stats.ReportProgress(symbolCount)
+
+            self.m_stats.m_encodedBits = bitWriter.GetBitsWritten()
+            self.m_stats.m_symbolCount = symbolCount
+            self.m_stats.m_entropy = coder_stats.CoderStats.Entropy(byteCounts)
+
+            # Symbol count and padding zeros are known only now, so they go to the trailer
+            paddingZeros: int = bitWriter.AlignToByte()
 
-        if paddingZeros > 0:
             if self.m_debug:
                 self.m_logger.debug(f"Padding zeros = {paddingZeros}")
 
-            with open(self.m_outFilePath, "r+b") as outFile:
-                firstByte: int = int.from_bytes(outFile.read(1), byteorder="big")
-                
-                if self.m_debug:
-                    self.m_logger.debug(f"First byte: {firstByte:08b}")
-                
-                firstByte |= paddingZeros
-                
-                if self.m_debug:
-                    self.m_logger.debug(f"Updated to: {firstByte:08b}")
-                
-                outFile.seek(0)
-                outFile.write(bytearray([firstByte]))
+            outFile.Write(bitWriter.PopContent())
+            outFile.Write(container_format.ContainerFormat.PackFields((symbolCount,)) + bytes([paddingZeros]))
+            self.m_outFileSize = outFile.GetBytesWritten()
+
+            # Writes are timed on their own
+            self.m_stats.AddPhaseTime(coder_stats.CoderStats.BODY_ENCODE, time.perf_counter() - startTime - outFile.m_writeTime)
+            self.m_stats.AddPhaseTime(coder_stats.CoderStats.IO, outFile.m_writeTime)
                 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("srcFile", help = "Path to the source file")
     parser.add_argument("outFile", help = "Path to the out file")
     parser.add_argument("-l", "--logLevel", dest="logLevel", type = int, default = 2, help = "To configure logging messages. 1 - DEBUG, 2 - INFO, 3 - WARNING, 4 - ERROR, 5 - CRITICAL")
-    parser.add_argument("-r", "--reconstructionInterval", dest="reconstructionInterval", type = int, default = 1, help = "Huffman tree reconstruction interval")
+    parser.add_argument("--logFile", dest="logFile", default = "logs/adaptive_encoder.log", help = "Log file. Its directory is created if missing. By default logs/adaptive_encoder.log")
+    parser.add_argument("-r", "--reconstructionInterval", dest="reconstructionInterval", type = int, default = 1, help = "Huffman tree reconstruction interval. Basic engine only")
+    parser.add_argument("-e", "--engine", dest="engine", choices = container_format.AdaptiveContainerFormat.ENGINES, default = container_format.AdaptiveContainerFormat.ENGINE_BASIC, help = "Adaptive tree update. basic - swaps with grandparent's children, vitter - Vitter's algorithm")
+    parser.add_argument("--rescaleThreshold", dest="rescaleThreshold", type = int, default = 0, help = f"Halve symbol counts when their sum passes it. By default 0 (never), else at least {container_format.AdaptiveContainerFormat.MIN_RESCALE_THRESHOLD}")
+    parser.add_argument("--profile", dest="profile", action = "store_true", help = "Profile encoding with cProfile and print the slowest functions")
     args = parser.parse_args()
     
     srcFile: str = args.srcFile
@@ -101,17 +115,23 @@ def main():
     reconstructionInterval: int = args.reconstructionInterval
     logLevel: int = args.logLevel
 
-    if reconstructionInterval <= 0 or reconstructionInterval > 32:
+    if reconstructionInterval <= 0 or reconstructionInterval > container_format.AdaptiveContainerFormat.MAX_RECONSTRUCTION_INTERVAL:
         raise Exception("Bad reconstructionInterval")
     
+    if args.rescaleThreshold != 0 and args.rescaleThreshold < container_format.AdaptiveContainerFormat.MIN_RESCALE_THRESHOLD:
+        raise Exception("Bad rescaleThreshold")
+
     if logLevel <= 0 or logLevel > 5:
         raise Exception("Bad logLevel")
     
-    logging.basicConfig(level = logLevel * 10, filename = "logs/adaptive_encoder.log", filemode = "w",
-        format = "%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    coder_logging.ConfigureLogging(logLevel, args.logFile)
         
-    encoder: AdaptiveHuffmanEncoder = AdaptiveHuffmanEncoder(srcFile, outFile, treeReconstructionInterval = reconstructionInterval, debug = logLevel == 1)
-    encoder.Run()
+    encoder: AdaptiveHuffmanEncoder = AdaptiveHuffmanEncoder(srcFile, outFile, treeReconstructionInterval = reconstructionInterval, engine = args.engine, rescaleThreshold = args.rescaleThreshold, profile = args.profile, debug = logLevel == 1)
+    stats: coder_stats.CoderStats = encoder.Run()
+    stats.Print(srcFile, outFile, encoder.m_messageFile)
+
+    if args.profile:
+        print(stats.GetProfile(), file=encoder.m_messageFile)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,139 @@
+from typing import Dict, List, Tuple
+
+import mapped_file
+import hashlib, json, logging, os, tempfile, zlib
+
+class AnalysisCache(object):
+    # Byte popularity and code lengths of analyzed files, so a file encoded again is not
+    # analyzed again. One JSON file per entry in m_cacheDir, named by the hash of its key:
+    # file fingerprint (size, mtime, CRC-32 of the content) and code parameters.
+    # A changed file has another fingerprint, so its old entry is never hit and ages out.
+    # Entry mtime is its last use, the least recently used ones are removed past m_maxBytes
+    DEFAULT_MAX_BYTES: int = 64 * 1024 * 1024
+    ENTRY_SUFFIX: str = ".json"
+    VERSION: int = 1
+
+    # Files that can not be mapped are hashed in chunks of this size
+    HASH_CHUNK_SIZE: int = 1024 * 1024
+
+    def __init__(self, cacheDir: str, maxBytes: int = DEFAULT_MAX_BYTES, debug: bool = False):
+        self.m_cacheDir: str = cacheDir
+        self.m_maxBytes: int = maxBytes
+
+        # Of this process. Entries are shared by all processes using m_cacheDir
+        self.m_hits: int = 0
+        self.m_misses: int = 0
+        self.m_evictions: int = 0
+
+        self.m_debug: bool = debug
+        self.m_logger: logging.Logger = logging.getLogger(__name__)
+
+        os.makedirs(cacheDir, exist_ok=True)
+
+    @staticmethod
+    def Fingerprint(filePath: str, useMmap: bool = True) -> Tuple[int, int, int]:
+        # (size, mtime in ns, CRC-32 of the content). CRC-32 is much faster than analysis
+        # and catches changes that keep the size and the mtime
+        stat: os.stat_result = os.stat(filePath)
+        checksum: int = 0
+
+        with mapped_file.MappedFile(filePath, useMmap) as source:
+            if source.IsMapped():
+                checksum = zlib.crc32(source.m_view)
+            else:
+                while (chunk := source.m_file.read(AnalysisCache.HASH_CHUNK_SIZE)) != b'':
+                    checksum = zlib.crc32(chunk, checksum)
+
+        return stat.st_size, stat.st_mtime_ns, checksum
+
+    @staticmethod
+    def MakeKey(fingerprint: Tuple[int, int, int], processBits: int, treeBuildMethod: str, maxCodeLength: int) -> str:
+        # Code lengths depend on how the code is built, not only on the source
+        return json.dumps([AnalysisCache.VERSION, *fingerprint, processBits, treeBuildMethod, maxCodeLength])
+
+    def Get(self, key: str) -> Tuple[Dict[Tuple[int, str], int], Dict[int, int], int]:
+        # (byte popularity, code lengths, code length limit cost), None = miss
+        entryPath: str = self.__EntryPath(key)
+
+        try:
+            with open(entryPath) as file:
+                entry: Dict = json.load(file)
+
+            if entry["key"] != key:
+                raise ValueError("Entry of another key")
+
+            bytePopularity: Dict[Tuple[int, str], int] = {(value, string): count for value, string, count in entry["bytePopularity"]}
+            codeLengths: Dict[int, int] = {symbol: length for symbol, length in entry["codeLengths"]}
+            codeLengthLimitCost: int = entry["codeLengthLimitCost"]
+
+            # Marks the entry as recently used
+            os.utime(entryPath)
+        except FileNotFoundError:
+            self.m_misses += 1
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as error:
+            # Damaged or written by another version. Built again
+            self.m_logger.warning(f"Dropping cache entry {entryPath}: {error}")
+            self.__Remove(entryPath)
+            self.m_misses += 1
+            return None
+
+        self.m_hits += 1
+        if self.m_debug:
+            self.m_logger.debug(f"Cache hit: {key}")
+
+        return bytePopularity, codeLengths, codeLengthLimitCost
+
+    def Put(self, key: str, bytePopularity: Dict[Tuple[int, str], int], codeLengths: Dict[int, int], codeLengthLimitCost: int) -> None:
+        entry: Dict = {
+            "key": key,
+            "bytePopularity": [[value, string, count] for (value, string), count in bytePopularity.items()],
+            "codeLengths": [[symbol, length] for symbol, length in codeLengths.items()],
+            "codeLengthLimitCost": codeLengthLimitCost,
+        }
+
+        # Written aside and renamed, so other processes never read a partial entry
+        descriptor, tempPath = tempfile.mkstemp(dir=self.m_cacheDir, suffix=".tmp")
+        with os.fdopen(descriptor, "w") as file:
+            json.dump(entry, file)
+
+        os.replace(tempPath, self.__EntryPath(key))
+        self.Evict()
+
+    def Evict(self) -> None:
+        # Least recently used entries go first until the rest fits in m_maxBytes
+        entries: List[Tuple[float, int, str]] = []
+
+        for name in os.listdir(self.m_cacheDir):
+            if not name.endswith(self.ENTRY_SUFFIX):
+                continue
+
+            entryPath: str = os.path.join(self.m_cacheDir, name)
+            try:
+                stat: os.stat_result = os.stat(entryPath)
+            except FileNotFoundError:
+                # Evicted by another process
+                continue
+
+            entries.append((stat.st_mtime, stat.st_size, entryPath))
+
+        totalBytes: int = sum(size for _, size, _ in entries)
+        for _, size, entryPath in sorted(entries):
+            if totalBytes <= self.m_maxBytes:
+                break
+
+            self.__Remove(entryPath)
+            self.m_evictions += 1
+            totalBytes -= size
+
+    def GetCounters(self) -> Dict[str, int]:
+        return {"cacheHits": self.m_hits, "cacheMisses": self.m_misses, "cacheEvictions": self.m_evictions}
+
+    def __EntryPath(self, key: str) -> str:
+        return os.path.join(self.m_cacheDir, hashlib.sha1(key.encode()).hexdigest() + self.ENTRY_SUFFIX)
+
+    def __Remove(self, entryPath: str) -> None:
+        try:
+            os.remove(entryPath)
+        except FileNotFoundError:
+            pass
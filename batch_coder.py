@@ -0,0 +1,237 @@
+from __future__ import annotations
+from typing import Dict, Iterator, List, Tuple
+
+import adaptive_huffman_decoder, adaptive_huffman_encoder, analysis_cache, code_table, coder_logging, container_format, huffman_decoder, huffman_encoder
+import argparse, concurrent.futures, contextlib, logging, logging.handlers, multiprocessing, os, sys, time
+
+class BatchCoder(object):
+    ENCODE: str = "encode"
+    DECODE: str = "decode"
+    OPERATIONS: Tuple[str, ...] = (ENCODE, DECODE)
+
+    HUFFMAN: str = "huffman"
+    ADAPTIVE: str = "adaptive"
+    CODERS: Tuple[str, ...] = (HUFFMAN, ADAPTIVE)
+
+    DEFAULT_SUFFIX: str = ".huf"
+    DECODED_SUFFIX: str = ".out"
+
+    # Files a worker takes at once. Fewer round trips to the pool for many small files
+    CHUNK_SIZE: int = 16
+
+    # Coder of the current worker process
+    s_worker: BatchCoder = None
+
+    def __init__(self, operation: str, outDir: str, coder: str = HUFFMAN, processBits: int = 8, maxCodeLength: int = 0, engine: str = container_format.AdaptiveContainerFormat.ENGINE_BASIC,
+                 codeTables: List[code_table.CodeTable] = None, analysisCache: analysis_cache.AnalysisCache = None, jobs: int = 1, bufferLength: int = 64 * 1024, suffix: str = DEFAULT_SUFFIX, debug: bool = False):
+        # Every file is coded on its own by one of jobs processes. Processes live for the whole
+        # batch, so a file costs a coder run, not an interpreter start
+        self.m_operation: str = operation
+        self.m_outDir: str = outDir
+        self.m_coder: str = coder
+        self.m_jobs: int = jobs
+
+        self.m_processBits: int = processBits
+        self.m_maxCodeLength: int = maxCodeLength
+        self.m_engine: str = engine
+        self.m_bufferLength: int = bufferLength
+
+        # Encoded files get suffix appended, decoded files lose it
+        self.m_suffix: str = suffix
+
+        # Code tables are loaded once and kept by every worker. Encoder uses the first one
+        self.m_codeTables: List[code_table.CodeTable] = codeTables or []
+        self.m_analysisCache: analysis_cache.AnalysisCache = analysisCache
+
+        if self.m_coder == self.ADAPTIVE and (len(self.m_codeTables) > 0 or analysisCache != None):
+            raise Exception("Adaptive coder does not use code tables or the analysis cache")
+
+        self.m_debug: bool = debug
+        self.m_logger: logging.Logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def CollectFiles(inputPaths: List[str], fileListPath: str = None) -> List[Tuple[str, str]]:
+        # (source path, path relative to the out directory). Files of a directory keep their
+        # place below it, files given on their own are put right in the out directory
+        files: List[Tuple[str, str]] = []
+
+        if fileListPath != None:
+            with open(fileListPath) if fileListPath != "-" else contextlib.nullcontext(sys.stdin) as fileList:
+                inputPaths = inputPaths + [line.rstrip("\n") for line in fileList if line.strip() != ""]
+
+        for inputPath in inputPaths:
+            if not os.path.isdir(inputPath):
+                files.append((inputPath, os.path.basename(inputPath)))
+                continue
+
+            for dirPath, dirNames, fileNames in os.walk(inputPath):
+                # Walked in a stable order
+                dirNames.sort()
+                for fileName in sorted(fileNames):
+                    filePath: str = os.path.join(dirPath, fileName)
+                    files.append((filePath, os.path.relpath(filePath, inputPath)))
+
+        return files
+
+    def MakeTasks(self, files: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        # (source path, out path)
+        tasks: List[Tuple[str, str]] = []
+        sources: Dict[str, str] = {}
+
+        for srcFilePath, relativePath in files:
+            if self.m_operation == self.ENCODE:
+                relativePath += self.m_suffix
+            elif self.m_suffix != "" and relativePath.endswith(self.m_suffix):
+                relativePath = relativePath[:-len(self.m_suffix)]
+            else:
+                relativePath += self.DECODED_SUFFIX
+
+            outFilePath: str = os.path.join(self.m_outDir, relativePath)
+            if outFilePath in sources:
+                raise Exception(f"{srcFilePath} and {sources[outFilePath]} would both be written to {outFilePath}")
+
+            sources[outFilePath] = srcFilePath
+            tasks.append((srcFilePath, outFilePath))
+
+        return tasks
+
+    def Run(self, tasks: List[Tuple[str, str]]) -> Iterator[Dict]:
+        # Yields the result of every task in order of tasks
+        for directory in sorted({os.path.dirname(outFilePath) for _, outFilePath in tasks}):
+            os.makedirs(directory, exist_ok=True)
+
+        if self.m_jobs == 1 or len(tasks) <= 1:
+            for task in tasks:
+                yield self.CodeFile(*task)
+            return
+
+        # Workers log through the queue, so the log file has a single writer
+        logQueue: multiprocessing.Queue = multiprocessing.Queue()
+        listener: logging.handlers.QueueListener = logging.handlers.QueueListener(logQueue, *logging.getLogger().handlers, respect_handler_level=True)
+        listener.start()
+
+        try:
+            initArgs: Tuple = (self, logQueue, logging.getLogger().getEffectiveLevel())
+            with concurrent.futures.ProcessPoolExecutor(self.m_jobs, initializer=BatchCoder.InitWorker, initargs=initArgs) as executor:
+                yield from executor.map(BatchCoder.CodeFileInWorker, tasks, chunksize=self.CHUNK_SIZE)
+        finally:
+            listener.stop()
+
+    @staticmethod
+    def InitWorker(batchCoder: BatchCoder, logQueue: multiprocessing.Queue, logLevel: int) -> None:
+        rootLogger: logging.Logger = logging.getLogger()
+        rootLogger.handlers = [logging.handlers.QueueHandler(logQueue)]
+        rootLogger.setLevel(logLevel)
+
+        BatchCoder.s_worker = batchCoder
+
+    @staticmethod
+    def CodeFileInWorker(task: Tuple[str, str]) -> Dict:
+        return BatchCoder.s_worker.CodeFile(*task)
+
+    def CodeFile(self, srcFilePath: str, outFilePath: str) -> Dict:
+        # A failed file is reported, the batch goes on
+        result: Dict = {"srcFilePath": srcFilePath, "outFilePath": outFilePath, "bytesIn": 0, "bytesOut": 0, "seconds": 0, "error": None}
+        startTime: float = time.perf_counter()
+
+        try:
+            self.CreateCoder(srcFilePath, outFilePath).Run()
+
+            result["bytesIn"] = os.stat(srcFilePath).st_size
+            result["bytesOut"] = os.stat(outFilePath).st_size
+        except Exception as error:
+            self.m_logger.error(f"Failed to {self.m_operation} {srcFilePath}: {error}")
+            result["error"] = f"{type(error).__name__}: {error}"
+
+            # No partial output is left behind
+            with contextlib.suppress(OSError):
+                os.remove(outFilePath)
+
+        result["seconds"] = time.perf_counter() - startTime
+        return result
+
+    def CreateCoder(self, srcFilePath: str, outFilePath: str):
+        bufferLength: int = self.m_bufferLength
+
+        if self.m_coder == self.ADAPTIVE and self.m_operation == self.ENCODE:
+            return adaptive_huffman_encoder.AdaptiveHuffmanEncoder(srcFilePath, outFilePath, engine=self.m_engine, srcMaxBufferLength=bufferLength, outMaxBufferLength=bufferLength, debug=self.m_debug)
+
+        if self.m_coder == self.ADAPTIVE:
+            return adaptive_huffman_decoder.AdaptiveHuffmanDecoder(srcFilePath, outFilePath, srcMaxBufferLength=bufferLength, outMaxBufferLength=bufferLength, debug=self.m_debug)
+
+        if self.m_operation == self.ENCODE:
+            codeTable: code_table.CodeTable = self.m_codeTables[0] if len(self.m_codeTables) > 0 else None
+            return huffman_encoder.HuffmanEncoder(srcFilePath, outFilePath, self.m_processBits, srcMaxBufferLength=bufferLength, outMaxBufferLength=bufferLength, maxCodeLength=self.m_maxCodeLength,
+                                                  codeTable=codeTable, analysisCache=self.m_analysisCache, debug=self.m_debug)
+
+        return huffman_decoder.HuffmanDecoder(srcFilePath, outFilePath, srcMaxBufferLength=bufferLength, outMaxBufferLength=bufferLength, codeTables=self.m_codeTables, debug=self.m_debug)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = "Encode or decode many files with a pool of worker processes")
+    parser.add_argument("operation", choices = BatchCoder.OPERATIONS, help = "What to do with every file")
+    parser.add_argument("inputs", nargs = "*", help = "Files and directories. Directories are walked recursively")
+    parser.add_argument("-o", "--outDir", dest="outDir", required = True, help = "Out directory. Files of an input directory keep their relative paths")
+    parser.add_argument("-f", "--fileList", dest="fileList", default = None, help = "File with one path per line, - for stdin. Added to inputs")
+    parser.add_argument("-j", "--jobs", dest="jobs", type = int, default = os.cpu_count() or 1, help = "Worker processes. By default the number of CPUs")
+    parser.add_argument("-c", "--coder", dest="coder", choices = BatchCoder.CODERS, default = BatchCoder.HUFFMAN, help = "huffman - static Huffman coder, adaptive - adaptive Huffman coder")
+    parser.add_argument("-p", "--processBits", dest="processBits", type = int, default = 8, help = "How much bits to process. Static encoder only. By default 8 (1 byte)")
+    parser.add_argument("-m", "--maxCodeLength", dest="maxCodeLength", type = int, default = 0, help = "Longest allowed Huffman code in bits. Static encoder only. By default 0 (not limited)")
+    parser.add_argument("-e", "--engine", dest="engine", choices = container_format.AdaptiveContainerFormat.ENGINES, default = container_format.AdaptiveContainerFormat.ENGINE_BASIC, help = "Adaptive tree update. Adaptive encoder only")
+    parser.add_argument("-T", "--table", dest="tables", action = "append", default = [], help = "Code table made by code_table.py. The encoder uses the first one, the decoder picks by ID")
+    parser.add_argument("--cacheDir", dest="cacheDir", default = None, help = "Directory caching analysis and code of sources by their fingerprint. Static encoder only")
+    parser.add_argument("--cacheSize", dest="cacheSize", type = int, default = analysis_cache.AnalysisCache.DEFAULT_MAX_BYTES, help = f"Cache size in bytes. By default {analysis_cache.AnalysisCache.DEFAULT_MAX_BYTES}")
+    parser.add_argument("-b", "--bufferLength", dest="bufferLength", type = int, default = 64 * 1024, help = "Source and out buffer lengths. By default 65536")
+    parser.add_argument("-s", "--suffix", dest="suffix", default = BatchCoder.DEFAULT_SUFFIX, help = f"Appended to encoded files, removed from decoded ones. By default {BatchCoder.DEFAULT_SUFFIX}")
+    parser.add_argument("-l", "--logLevel", dest="logLevel", type = int, default = 3, help = "To configure logging messages. 1 - DEBUG, 2 - INFO, 3 - WARNING, 4 - ERROR, 5 - CRITICAL. By default 3")
+    parser.add_argument("--logFile", dest="logFile", default = "logs/batch_coder.log", help = "Log file of all workers. Its directory is created if missing. By default logs/batch_coder.log")
+    args = parser.parse_args()
+
+    if args.logLevel <= 0 or args.logLevel > 5:
+        raise Exception("Bad logLevel")
+
+    if args.jobs <= 0:
+        raise Exception("Bad jobs")
+
+    if args.processBits <= 1 or args.processBits > 16:
+        raise Exception("Bad processBits")
+
+    if args.bufferLength <= 0:
+        raise Exception("Bad bufferLength")
+
+    if args.cacheSize <= 0:
+        raise Exception("Bad cacheSize")
+
+    coder_logging.ConfigureLogging(args.logLevel, args.logFile)
+
+    codeTables: List[code_table.CodeTable] = [code_table.CodeTable.Load(filePath) for filePath in args.tables]
+    processBits: int = codeTables[0].m_processBits if len(codeTables) > 0 and args.operation == BatchCoder.ENCODE else args.processBits
+    analysisCache: analysis_cache.AnalysisCache = analysis_cache.AnalysisCache(args.cacheDir, args.cacheSize) if args.cacheDir != None else None
+
+    batchCoder: BatchCoder = BatchCoder(args.operation, args.outDir, args.coder, processBits, args.maxCodeLength, args.engine, codeTables, analysisCache,
+                                        args.jobs, args.bufferLength, args.suffix, debug = args.logLevel == 1)
+    tasks: List[Tuple[str, str]] = batchCoder.MakeTasks(BatchCoder.CollectFiles(args.inputs, args.fileList))
+
+    failures: List[Dict] = []
+    bytesIn, bytesOut = 0, 0
+    startTime: float = time.perf_counter()
+
+    for result in batchCoder.Run(tasks):
+        if result["error"] != None:
+            failures.append(result)
+            print(f"Failed: {result['srcFilePath']}: {result['error']}", file=sys.stderr)
+            continue
+
+        bytesIn += result["bytesIn"]
+        bytesOut += result["bytesOut"]
+
+    elapsed: float = time.perf_counter() - startTime
+
+    print(f"Files: {len(tasks) - len(failures)} done, {len(failures)} failed, {args.jobs} jobs")
+    print(f"In: {bytesIn}B, out: {bytesOut}B, ratio {max(bytesIn, bytesOut) / max(min(bytesIn, bytesOut), 1):.4f}")
+    print(f"Time: {round(elapsed, 4)}s, {len(tasks) / max(elapsed, 1e-9):.1f} files/s, {bytesIn / (1024 ** 2) / max(elapsed, 1e-9):.3f} MB/s")
+
+    if len(failures) > 0:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+from typing import Dict, List
+
+import argparse, math, os, random, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import binary_tree, container_format, vitter_huffman_tree
+
+def MakeCorpora(length: int, rng: random.Random) -> Dict[str, bytes]:
+    # Zipf-like bytes are similar to text, the shifting one changes its alphabet halfway
+    zipfWeights: List[float] = [1 / (rank + 1) for rank in range(256)]
+    half: int = length // 2
+
+    return {
+        "zipf": bytes(rng.choices(range(256), zipfWeights, k = length)),
+        "uniform": bytes(rng.randrange(256) for _ in range(length)),
+        "skewed": bytes(rng.choices(range(4), [90, 6, 3, 1], k = length)),
+        "shifting": bytes(rng.choices(range(32), zipfWeights[:32], k = half)) + bytes(rng.choices(range(224, 256), zipfWeights[:32], k = length - half)),
+    }
+
+def CreateTree(engine: str, reconstructionInterval: int, rescaleThreshold: int):
+    if engine == container_format.AdaptiveContainerFormat.ENGINE_VITTER:
+        return vitter_huffman_tree.VitterHuffmanTree(rescaleThreshold)
+
+    return binary_tree.AdaptiveHuffmanTree(reconstructionInterval, rescaleThreshold)
+
+def Entropy(data: bytes) -> float:
+    # Bits per symbol of a static Huffman code can not go much below it
+    counts: Dict[int, int] = {}
+    for byte in data:
+        counts[byte] = counts.get(byte, 0) + 1
+
+    return -sum(count / len(data) * math.log2(count / len(data)) for count in counts.values())
+
+def Measure(data: bytes, engine: str, reconstructionInterval: int, rescaleThreshold: int) -> Dict[str, float]:
+    tree = CreateTree(engine, reconstructionInterval, rescaleThreshold)
+    totalBits: int = 0
+
+    startTime: float = time.perf_counter()
+    for byte in data:
+        _, length = tree.GetCode(byte)
+        tree.AddSymbol(byte)
+        totalBits += length
+    elapsed: float = time.perf_counter() - startTime
+
+    # Depth of the final tree over the symbols seen
+    depths: List[int] = [tree.GetCode(symbol)[1] for symbol in tree.m_symbolNodes]
+
+    return {
+        "usPerSymbol": elapsed / len(data) * 1e6,
+        "bitsPerSymbol": totalBits / len(data),
+        "maxDepth": max(depths),
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = "Adaptive Huffman engines: update cost and code length per symbol")
+    parser.add_argument("files", nargs = "*", help = "Files measured in addition to the synthetic corpora")
+    parser.add_argument("-n", "--length", dest="length", type = int, default = 100_000, help = "Synthetic corpus length in bytes")
+    parser.add_argument("-r", "--reconstructionInterval", dest="reconstructionInterval", type = int, default = 1, help = "Reconstruction interval of the basic engine")
+    parser.add_argument("--rescaleThreshold", dest="rescaleThreshold", type = int, default = 0, help = "Halve counts when their sum passes it. By default 0 (never)")
+    args = parser.parse_args()
+
+    corpora: Dict[str, bytes] = MakeCorpora(args.length, random.Random(0))
+    for filePath in args.files:
+        with open(filePath, "rb") as file:
+            corpora[os.path.basename(filePath)] = file.read()
+
+    print(f"{'corpus':>12} | {'entropy':>7} | {'engine':>6} | {'us/symbol':>9} | {'bits/symbol':>11} | {'max depth':>9}")
+
+    for name, data in corpora.items():
+        if len(data) == 0:
+            continue
+
+        entropy: float = Entropy(data)
+        for engine in container_format.AdaptiveContainerFormat.ENGINES:
+            result: Dict[str, float] = Measure(data, engine, args.reconstructionInterval, args.rescaleThreshold)
+            print(f"{name:>12} | {entropy:>7.3f} | {engine:>6} | {result['usPerSymbol']:>9.2f} | {result['bitsPerSymbol']:>11.3f} | {result['maxDepth']:>9}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+from typing import Callable, Dict, List, Tuple
+
+import argparse, bz2, concurrent.futures, contextlib, io, itertools, json, logging, lzma, multiprocessing, os, random, resource, struct, sys, tempfile, time, zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import adaptive_huffman_decoder, adaptive_huffman_encoder, code_table, container_format, huffman_decoder, huffman_encoder
+
+CORPORA: Tuple[str, ...] = ("uniform", "zipf", "text", "binary", "skewed", "incompressible")
+
+# Coders of this repo. Every run is a separate process, so peak RSS is its own
+HUFFMAN: str = "huffman"
+
+# Static coder with a code table trained on the corpus itself. Files have the table ID instead of the code
+HUFFMAN_TABLE: str = "huffman-table"
+STATIC_CODERS: Tuple[str, ...] = (HUFFMAN, HUFFMAN_TABLE)
+ADAPTIVE_CODERS: Dict[str, str] = {f"adaptive-{engine}": engine for engine in container_format.AdaptiveContainerFormat.ENGINES}
+
+# In-memory reference points
+REFERENCE_CODERS: Dict[str, Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+    "zlib": (zlib.compress, zlib.decompress),
+    "bz2": (bz2.compress, bz2.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+
+def MakeCorpus(name: str, length: int, rng: random.Random) -> bytes:
+    if name == "uniform":
+        # All byte values equally likely
+        return bytes(rng.choices(range(256), k = length))
+
+    if name == "zipf":
+        return bytes(rng.choices(range(256), [1 / (rank + 1) for rank in range(256)], k = length))
+
+    if name == "text":
+        words: List[str] = ["".join(rng.choices("etaoinshrdlcumwfgypbvkjxqz", k = rng.randint(1, 9))) for _ in range(2000)]
+        text: str = " ".join(rng.choices(words, [1 / (rank + 1) for rank in range(len(words))], k = length // 4))
+        return text.encode()[:length].ljust(length, b" ")
+
+    if name == "binary":
+        # Fixed size records: counter, small int, float, flags
+        records: bytes = b"".join(struct.pack("<IhdB", index, rng.randint(-100, 100), rng.gauss(0, 1), rng.choice((0, 1, 3)))
+                                  for index in range(length // struct.calcsize("<IhdB") + 1))
+        return records[:length]
+
+    if name == "skewed":
+        return bytes(rng.choices(range(4), [90, 6, 3, 1], k = length))
+
+    if name == "incompressible":
+        return rng.randbytes(length)
+
+    raise Exception(f"Unknown corpus: {name}")
+
+def PeakRss() -> int:
+    # KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def RunCoder(coder: str, operation: str, srcFilePath: str, outFilePath: str, processBits: int, bufferSize: int, useMmap: bool, tableFilePath: str) -> Dict[str, float]:
+    # Runs in a fresh process. Coders print their summaries, which are not needed here
+    logging.disable(logging.CRITICAL)
+
+    # Loading the code table is not timed
+    codeTable: code_table.CodeTable = code_table.CodeTable.Load(tableFilePath) if coder == HUFFMAN_TABLE else None
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        startTime: float = time.perf_counter()
+
+        if coder in STATIC_CODERS and operation == "encode":
+            huffman_encoder.HuffmanEncoder(srcFilePath, outFilePath, processBits, srcMaxBufferLength = bufferSize, outMaxBufferLength = bufferSize, useMmap = useMmap, codeTable = codeTable).Run()
+        elif coder in STATIC_CODERS:
+            codeTables: List[code_table.CodeTable] = [codeTable] if codeTable != None else []
+            huffman_decoder.HuffmanDecoder(srcFilePath, outFilePath, srcMaxBufferLength = bufferSize, outMaxBufferLength = bufferSize, useMmap = useMmap, codeTables = codeTables).Run()
+        elif operation == "encode":
+            adaptive_huffman_encoder.AdaptiveHuffmanEncoder(srcFilePath, outFilePath, engine = ADAPTIVE_CODERS[coder], srcMaxBufferLength = bufferSize, outMaxBufferLength = bufferSize).Run()
+        else:
+            adaptive_huffman_decoder.AdaptiveHuffmanDecoder(srcFilePath, outFilePath, srcMaxBufferLength = bufferSize, outMaxBufferLength = bufferSize).Run()
+
+        seconds: float = time.perf_counter() - startTime
+
+    return {"seconds": seconds, "peakRssKb": PeakRss()}
+
+def RunReference(coder: str, operation: str, data: bytes) -> Dict[str, float]:
+    compress, decompress = REFERENCE_CODERS[coder]
+    content: bytes = compress(data)
+
+    startTime: float = time.perf_counter()
+    if operation == "encode":
+        compress(data)
+    else:
+        decompress(content)
+    seconds: float = time.perf_counter() - startTime
+
+    return {"seconds": seconds, "peakRssKb": PeakRss(), "encodedSize": len(content)}
+
+def RunInProcess(function: Callable, *args) -> Dict[str, float]:
+    context = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(1, mp_context = context) as executor:
+        return executor.submit(function, *args).result()
+
+def Measure(function: Callable, args: Tuple, repeats: int) -> Dict[str, float]:
+    # Best time of repeats, highest peak RSS
+    results: List[Dict[str, float]] = [RunInProcess(function, *args) for _ in range(repeats)]
+    best: Dict[str, float] = min(results, key = lambda result: result["seconds"])
+    best["peakRssKb"] = max(result["peakRssKb"] for result in results)
+    return best
+
+def RunSuite(args: argparse.Namespace, workDir: str) -> List[Dict]:
+    results: List[Dict] = []
+
+    for corpus, sizeKb in itertools.product(args.corpora, args.sizes):
+        # Seeded per corpus, so a corpus does not depend on which others run
+        data: bytes = MakeCorpus(corpus, sizeKb * 1024, random.Random(f"{args.seed}-{corpus}-{sizeKb}"))
+        srcFilePath: str = os.path.join(workDir, f"{corpus}_{sizeKb}.bin")
+        with open(srcFilePath, "wb") as file:
+            file.write(data)
+
+        runs: List[Tuple[str, int, int]] = []
+        for coder in STATIC_CODERS:
+            if coder in args.coders:
+                runs += [(coder, processBits, bufferSize) for processBits, bufferSize in itertools.product(args.processBits, args.bufferSizes)]
+
+        # Adaptive coders always work on bytes
+        runs += [(coder, 8, bufferSize) for coder in ADAPTIVE_CODERS if coder in args.coders for bufferSize in args.bufferSizes]
+
+        for coder, processBits, bufferSize in runs:
+            encodedFilePath: str = os.path.join(workDir, "encoded")
+            decodedFilePath: str = os.path.join(workDir, "decoded")
+            tableFilePath: str = os.path.join(workDir, "table")
+
+            if coder == HUFFMAN_TABLE:
+                code_table.CodeTable.Train([srcFilePath], processBits).Save(tableFilePath)
+
+            encoded: Dict[str, float] = Measure(RunCoder, (coder, "encode", srcFilePath, encodedFilePath, processBits, bufferSize, args.useMmap, tableFilePath), args.repeats)
+            decoded: Dict[str, float] = Measure(RunCoder, (coder, "decode", encodedFilePath, decodedFilePath, processBits, bufferSize, args.useMmap, tableFilePath), args.repeats)
+
+            with open(decodedFilePath, "rb") as file:
+                if file.read() != data:
+                    raise Exception(f"{coder} did not restore {corpus} ({sizeKb}KB, processBits {processBits})")
+
+            encodedSize: int = os.stat(encodedFilePath).st_size
+            for operation, result in (("encode", encoded), ("decode", decoded)):
+                results.append(MakeRecord(coder, operation, corpus, sizeKb, processBits, bufferSize, result, encodedSize))
+                PrintRecord(results[-1])
+
+        for coder in REFERENCE_CODERS:
+            if coder not in args.coders:
+                continue
+
+            for operation in ("encode", "decode"):
+                result: Dict[str, float] = Measure(RunReference, (coder, operation, data), args.repeats)
+                results.append(MakeRecord(coder, operation, corpus, sizeKb, 8, 0, result, result["encodedSize"]))
+                PrintRecord(results[-1])
+
+    return results
+
+def MakeRecord(coder: str, operation: str, corpus: str, sizeKb: int, processBits: int, bufferSize: int, result: Dict[str, float], encodedSize: int) -> Dict:
+    return {
+        "coder": coder, "operation": operation, "corpus": corpus, "sizeKb": sizeKb, "processBits": processBits, "bufferSize": bufferSize,
+        "seconds": result["seconds"],
+        "mbPerSecond": sizeKb / 1024 / max(result["seconds"], 1e-9),
+        "ratio": sizeKb * 1024 / max(encodedSize, 1),
+        "peakRssKb": result["peakRssKb"],
+    }
+
+def RecordKey(record: Dict) -> Tuple:
+    return (record["coder"], record["operation"], record["corpus"], record["sizeKb"], record["processBits"], record["bufferSize"])
+
+def PrintRecord(record: Dict) -> None:
+    # Progress goes to stderr, stdout is left for the JSON
+    print(f"{record['coder']:>15} {record['operation']:>6} {record['corpus']:>14} {record['sizeKb']:>6}KB p={record['processBits']:<2} buf={record['bufferSize']:<6} "
+          f"{record['mbPerSecond']:>9.3f} MB/s ratio {record['ratio']:>6.3f} rss {record['peakRssKb']}KB", file=sys.stderr)
+
+def CompareWithBaseline(results: List[Dict], baseline: List[Dict], tolerance: float) -> List[str]:
+    # Runs slower or compressing worse than the baseline by more than tolerance
+    baselineRecords: Dict[Tuple, Dict] = {RecordKey(record): record for record in baseline}
+    regressions: List[str] = []
+
+    for record in results:
+        old: Dict = baselineRecords.get(RecordKey(record))
+        if old == None:
+            continue
+
+        if record["mbPerSecond"] < old["mbPerSecond"] * (1 - tolerance):
+            regressions.append(f"{RecordKey(record)}: {old['mbPerSecond']:.3f} -> {record['mbPerSecond']:.3f} MB/s")
+
+        if record["ratio"] < old["ratio"] * (1 - tolerance):
+            regressions.append(f"{RecordKey(record)}: ratio {old['ratio']:.3f} -> {record['ratio']:.3f}")
+
+    return regressions
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = "Throughput, compression ratio and peak RSS of the coders on synthetic corpora")
+    parser.add_argument("-c", "--corpora", dest="corpora", nargs = "+", choices = CORPORA, default = list(CORPORA), help = "Synthetic corpora to run on")
+    parser.add_argument("-s", "--sizes", dest="sizes", nargs = "+", type = int, default = [64, 256], help = "Input sizes in KB")
+    parser.add_argument("-p", "--processBits", dest="processBits", nargs = "+", type = int, default = [8, 12], help = "processBits of the static coders")
+    parser.add_argument("-b", "--bufferSizes", dest="bufferSizes", nargs = "+", type = int, default = [1024, 65536], help = "Source and out buffer lengths")
+    parser.add_argument("--coders", dest="coders", nargs = "+", choices = [*STATIC_CODERS, *ADAPTIVE_CODERS, *REFERENCE_CODERS], default = [*STATIC_CODERS, *ADAPTIVE_CODERS, *REFERENCE_CODERS], help = "Coders to run")
+    parser.add_argument("-r", "--repeats", dest="repeats", type = int, default = 1, help = "Best time of N runs is reported")
+    parser.add_argument("--noMmap", dest="useMmap", action = "store_false", help = "Static coders read their sources in chunks instead of mapping them to memory")
+    parser.add_argument("--seed", dest="seed", type = int, default = 0, help = "Seed of the synthetic corpora")
+    parser.add_argument("-o", "--output", dest="output", default = None, help = "Write results as JSON here instead of stdout. Can be a later baseline")
+    parser.add_argument("--baseline", dest="baseline", default = None, help = "JSON results of an earlier run to compare with")
+    parser.add_argument("--tolerance", dest="tolerance", type = float, default = 0.1, help = "Allowed slowdown or ratio loss against the baseline. By default 0.1 (10%%)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workDir:
+        results: List[Dict] = RunSuite(args, workDir)
+
+    content: str = json.dumps(results, indent = 2)
+    if args.output != None:
+        with open(args.output, "w") as file:
+            file.write(content)
+    else:
+        print(content)
+
+    if args.baseline != None:
+        with open(args.baseline) as file:
+            regressions: List[str] = CompareWithBaseline(results, json.load(file), args.tolerance)
+
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+
+        if len(regressions) > 0:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
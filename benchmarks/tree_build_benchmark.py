@@ -0,0 +1,66 @@
+from typing import Dict, List
+
+import argparse, os, random, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import binary_tree, huffman_tree_builder
+
+def MakePopularity(alphabetSize: int, processBits: int, rng: random.Random) -> Dict[int, int]:
+    # Zipf-like counts, similar to what real files produce
+    return {symbol: max(1, int(1_000_000 / (rank + 1)) + rng.randint(0, 16))
+            for rank, symbol in enumerate(rng.sample(range(1 << processBits), alphabetSize))}
+
+def BuildByResorting(symbolPopularity: Dict[int, int]) -> binary_tree.Node:
+    # Reference: the original construction that re-sorted all nodes on every merge
+    leafs: List[binary_tree.Node] = [binary_tree.Node(byte, count) for byte, count in symbolPopularity.items()]
+
+    while len(leafs) > 1:
+        leafs = sorted(leafs, key = lambda leaf: leaf.m_count)
+
+        left: binary_tree.Node = leafs.pop(0)
+        right: binary_tree.Node = leafs.pop(0)
+
+        newNode: binary_tree.Node = binary_tree.Node(count = left.m_count + right.m_count)
+        newNode.AddLeft(left)
+        newNode.AddRight(right)
+
+        leafs.append(newNode)
+
+    return leafs[0]
+
+def Measure(function, repeats: int) -> float:
+    best: float = float("inf")
+    for _ in range(repeats):
+        startTime: float = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - startTime)
+
+    return best
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = "Huffman tree construction time across alphabet sizes")
+    parser.add_argument("-p", "--processBits", dest="processBits", type = int, default = 16, help = "Symbol width. Alphabet sizes go up to 2^processBits")
+    parser.add_argument("-r", "--repeats", dest="repeats", type = int, default = 3, help = "Best of N runs is reported")
+    parser.add_argument("--maxResortSize", dest="maxResortSize", type = int, default = 4096, help = "Largest alphabet to run the original re-sorting construction on")
+    args = parser.parse_args()
+
+    rng: random.Random = random.Random(0)
+    print(f"{'alphabet':>9} | {'resort, s':>10} | {'heap, s':>10} | {'twoqueue, s':>11}")
+
+    for bits in range(4, args.processBits + 1, 2):
+        alphabetSize: int = 1 << bits
+        symbolPopularity = MakePopularity(alphabetSize, args.processBits, rng)
+
+        resortTime: str = "-"
+        if alphabetSize <= args.maxResortSize:
+            resortTime = f"{Measure(lambda: BuildByResorting(symbolPopularity), args.repeats):.4f}"
+
+        # Builder construction (sorting the leafs) is part of both measured methods
+        heapTime: float = Measure(lambda: huffman_tree_builder.HuffmanTreeBuilder(symbolPopularity).BuildWithHeap(), args.repeats)
+        twoQueuesTime: float = Measure(lambda: huffman_tree_builder.HuffmanTreeBuilder(symbolPopularity).BuildWithTwoQueues(), args.repeats)
+
+        print(f"{alphabetSize:>9} | {resortTime:>10} | {heapTime:>10.4f} | {twoQueuesTime:>11.4f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import Dict
+from typing import Dict, List, Tuple
 
 class Node(object):
     def __init__(self, byte: int = 0, count: int = 0):
@@ -24,7 +24,7 @@ class Node(object):
         return False
 
 class AdaptiveHuffmanTree(object):
-    def __init__(self, reconstructionInterval: int = 1):
+    def __init__(self, reconstructionInterval: int = 1, rescaleThreshold: int = 0):
         self.m_nytValue = -1
         self.m_internalNodeValue = -2
         
@@ -34,6 +34,12 @@ class AdaptiveHuffmanTree(object):
         self.m_reconstructionInterval: int = reconstructionInterval
         self.m_untilTreeReconstruction: int = self.m_reconstructionInterval
 
+        # Counts are halved when their sum passes the threshold, so old statistics fade
+        # out and counts stay bounded. 0 = never. Internal counts are only estimates
+        # between updates, so the sum is counted separately
+        self.m_rescaleThreshold: int = rescaleThreshold
+        self.m_totalCount: int = 0
+
     def AddSymbol(self, symbol: int) -> None:
         if symbol not in self.m_symbolNodes:
             self.__AddNewSymbol(symbol)
@@ -44,6 +50,10 @@ class AdaptiveHuffmanTree(object):
             symbolNode.m_parent.m_count += 1
             symbolNode.m_count += 1
             self.__Update(symbolNode)
+
+        self.m_totalCount += 1
+        if self.m_rescaleThreshold > 0 and self.m_totalCount > self.m_rescaleThreshold:
+            self.__Rescale()
     
     def GetHuffmanCode(self, symbol: int) -> str:
         if symbol not in self.m_symbolNodes:
@@ -54,6 +64,11 @@ class AdaptiveHuffmanTree(object):
         # symbol huffman code
         return self.__ConstructCode(self.m_symbolNodes[symbol])
 
+    def GetCode(self, symbol: int) -> Tuple[int, int]:
+        # (code, length)
+        code: str = self.GetHuffmanCode(symbol)
+        return int(code, 2) if code != "" else 0, len(code)
+
     def GetSymbol(self, code: str) -> int:
         currentNode: Node = self.m_root
         
@@ -129,6 +144,23 @@ class AdaptiveHuffmanTree(object):
         if self.m_untilTreeReconstruction <= 0:
             self.m_untilTreeReconstruction = self.m_reconstructionInterval
     
+    def __Rescale(self) -> None:
+        # Halves leaf counts, rounding up so no symbol drops to 0, and sums them up again.
+        # Tree shape is kept, updates reorder it as counts change
+        stack: List[Tuple[Node, bool]] = [(self.m_root, False)]
+
+        while len(stack) > 0:
+            node, isVisited = stack.pop()
+
+            if node.IsLeaf():
+                node.m_count = (node.m_count + 1) // 2
+            elif isVisited:
+                node.m_count = node.m_left.m_count + node.m_right.m_count
+            else:
+                stack.extend(((node, True), (node.m_left, False), (node.m_right, False)))
+
+        self.m_totalCount = self.m_root.m_count
+
     def __ConstructCode(self, currentNode: Node) -> str:
         code: str = ""
         while currentNode.m_parent != None:
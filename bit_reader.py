@@ -0,0 +1,95 @@
+from typing import BinaryIO
+
+import logging
+
+class BitReader(object):
+    def __init__(self, source: BinaryIO = None, bufferSize: int = 1024, buffer: bytes = b'', debug: bool = False):
+        # Bytes come from buffer first, then from source.read(bufferSize) until it returns b''
+        self.m_source: BinaryIO = source
+        self.m_bufferSize: int = bufferSize
+        self.m_buffer: memoryview = memoryview(buffer)
+        self.m_position: int = 0
+        self.m_isSourceExhausted: bool = source == None
+
+        # Unread bits. Lowest m_windowBits bits of m_window are valid, higher ones are garbage
+        self.m_window: int = 0
+        self.m_windowBits: int = 0
+        self.m_loadedBits: int = 0
+
+        self.m_debug: bool = debug
+        self.m_logger: logging.Logger = logging.getLogger(__name__)
+
+    def Peek(self, count: int) -> int:
+        # Next count bits without consuming them. Bits past the end of data read as zeros
+        if self.m_windowBits < count:
+            self.__Refill(count)
+
+            if self.m_windowBits < count:
+                return (self.m_window << (count - self.m_windowBits)) & ((1 << count) - 1)
+
+        return (self.m_window >> (self.m_windowBits - count)) & ((1 << count) - 1)
+
+    def Consume(self, count: int) -> None:
+        if self.m_windowBits < count:
+            self.__Refill(count)
+
+            if self.m_windowBits < count:
+                raise EOFError(f"Can not consume {count} bits, only {self.m_windowBits} left")
+
+        self.m_windowBits -= count
+
+    def Read(self, count: int) -> int:
+        value: int = self.Peek(count)
+        self.Consume(count)
+        return value
+
+    def Available(self, count: int) -> int:
+        # How many of the next count bits exist
+        if self.m_windowBits < count:
+            self.__Refill(count)
+
+            if self.m_windowBits < count:
+                return self.m_windowBits
+
+        return count
+
+    def IsAtEnd(self) -> bool:
+        return self.Available(1) == 0
+
+    def GetConsumedBits(self) -> int:
+        return self.m_loadedBits - self.m_windowBits
+
+    def __Refill(self, count: int) -> None:
+        self.m_window &= (1 << self.m_windowBits) - 1
+
+        while self.m_windowBits < count:
+            if self.m_position + 8 <= len(self.m_buffer):
+                loadedBytes: int = 8
+            elif self.m_position < len(self.m_buffer):
+                loadedBytes: int = len(self.m_buffer) - self.m_position
+            elif not self.m_isSourceExhausted:
+                self.__ReadSource()
+                continue
+            else:
+                return
+
+            self.m_window = (self.m_window << (loadedBytes * 8)) | int.from_bytes(self.m_buffer[self.m_position:self.m_position + loadedBytes], "big")
+            self.m_windowBits += loadedBytes * 8
+            self.m_loadedBits += loadedBytes * 8
+            self.m_position += loadedBytes
+
+    def __ReadSource(self) -> None:
+        buffer: bytes = self.m_source.read(self.m_bufferSize)
+
+        if buffer == b'':
+            if self.m_debug:
+                self.m_logger.debug("Reached end of source")
+
+            self.m_isSourceExhausted = True
+            return
+
+        if self.m_debug:
+            self.m_logger.debug(f"Read {len(buffer)} bytes from source")
+
+        self.m_buffer = memoryview(buffer)
+        self.m_position = 0
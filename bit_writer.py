@@ -0,0 +1,123 @@
+import logging
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+class BitWriter(object):
+    # Longest code WriteArray takes. With up to 7 bits before it, a code fits in 64 bits
+    MAX_ARRAY_CODE_LENGTH: int = 57
+
+    def __init__(self, capacity: int = 1024, debug: bool = False):
+        # Whole bytes go to a preallocated buffer. m_length of them are used
+        self.m_buffer: bytearray = bytearray(capacity)
+        self.m_length: int = 0
+
+        # Bits not yet flushed to the buffer. Lowest m_bitsCount bits are valid
+        self.m_bits: int = 0
+        self.m_bitsCount: int = 0
+        self.m_flushedBits: int = 0
+
+        self.m_debug: bool = debug
+        self.m_logger: logging.Logger = logging.getLogger(__name__)
+
+    def Write(self, value: int, length: int) -> None:
+        self.m_bits = (self.m_bits << length) | value
+        self.m_bitsCount += length
+
+        if self.m_bitsCount >= 64:
+            self.__FlushWholeBytes()
+
+    def WriteArray(self, values, lengths) -> None:
+        # Same as Write for every value, lengths as a numpy int64 array. Codes never overlap,
+        # so the bytes of each code are summed into place instead of ORed one by one
+        if len(values) == 0:
+            return
+
+        self.__FlushWholeBytes()
+
+        # Bits left from the last call start the first byte
+        ends = np.cumsum(lengths) + self.m_bitsCount
+        starts = ends - lengths
+        totalBits: int = int(ends[-1])
+        byteCount: int = (totalBits + 7) >> 3
+
+        # Code k aligned to its first byte in a big-endian 64-bit word
+        words = values.astype(np.uint64) << (64 - (starts & 7) - lengths).astype(np.uint64)
+        firstBytes = starts >> 3
+        spanBytes: int = (7 + int(lengths.max()) + 7) >> 3
+
+        # Bytes past the last code are zeros of the words
+        content = np.zeros(byteCount + spanBytes, dtype=np.float64)
+        for index in range(spanBytes):
+            part = (words >> np.uint64(56 - 8 * index)) & np.uint64(0xFF)
+            content += np.bincount(firstBytes + index, weights=part, minlength=len(content))
+
+        content = content.astype(np.uint8)
+        content[0] |= (self.m_bits << (8 - self.m_bitsCount)) & 0xFF
+
+        # Partial last byte stays in m_bits
+        wholeBytes: int = totalBits >> 3
+        leftoverBits: int = totalBits & 7
+        end: int = self.m_length + wholeBytes
+
+        if end > len(self.m_buffer):
+            self.m_buffer.extend(bytes(max(end - len(self.m_buffer), len(self.m_buffer))))
+
+        self.m_buffer[self.m_length:end] = content[:wholeBytes].tobytes()
+        self.m_length = end
+
+        self.m_bits = int(content[wholeBytes]) >> (8 - leftoverBits) if leftoverBits > 0 else 0
+        self.m_bitsCount = leftoverBits
+        self.m_flushedBits += wholeBytes * 8
+
+    def AlignToByte(self) -> int:
+        paddingZeros: int = -self.m_bitsCount % 8
+
+        if paddingZeros > 0:
+            self.Write(0, paddingZeros)
+
+        self.__FlushWholeBytes()
+
+        if self.m_debug:
+            self.m_logger.debug(f"Aligned to byte with {paddingZeros} padding zeros")
+
+        return paddingZeros
+
+    def GetBitsWritten(self) -> int:
+        return self.m_flushedBits + self.m_bitsCount
+
+    def GetLength(self) -> int:
+        # Whole bytes ready to be popped
+        return self.m_length + (self.m_bitsCount >> 3)
+
+    def PopContent(self) -> bytes:
+        self.__FlushWholeBytes()
+
+        content: bytes = bytes(memoryview(self.m_buffer)[:self.m_length])
+        self.m_length = 0
+
+        if self.m_debug:
+            self.m_logger.debug(f"Popped {len(content)} bytes. {self.m_bitsCount} bits left")
+
+        return content
+
+    def __FlushWholeBytes(self) -> None:
+        byteCount: int = self.m_bitsCount >> 3
+
+        if byteCount == 0:
+            return
+
+        leftoverBits: int = self.m_bitsCount & 7
+        end: int = self.m_length + byteCount
+
+        if end > len(self.m_buffer):
+            self.m_buffer.extend(bytes(max(end - len(self.m_buffer), len(self.m_buffer))))
+
+        self.m_buffer[self.m_length:end] = (self.m_bits >> leftoverBits).to_bytes(byteCount, "big")
+        self.m_length = end
+
+        self.m_bits &= (1 << leftoverBits) - 1
+        self.m_bitsCount = leftoverBits
+        self.m_flushedBits += byteCount * 8
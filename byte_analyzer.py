@@ -1,52 +1,93 @@
-from typing import Dict, Tuple
+from typing import Dict, Iterator, Tuple
 
-import byte_reader
-import io
+import bit_reader, mapped_file, symbol_extractor
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 class ByteAnalyzer(object):
-    def __init__(self, fileName: str, processBits: int, bufferSize: int = 1024, debug: bool = False):
+    def __init__(self, fileName: str, processBits: int, bufferSize: int = 1024, chunkSize: int = 1024 * 1024, buffer: bytes = None, useMmap: bool = True, debug: bool = False):
+        # Analyzed data comes from buffer if it is given, otherwise from the file.
+        # The file is mapped to memory unless useMmap is False or it can not be mapped
         self.m_fileName: str = fileName
+        self.m_buffer: bytes = buffer
+        self.m_useMmap: bool = useMmap
+
         self.m_bufferSize: int = bufferSize
+        self.m_chunkSize: int = chunkSize
         self.m_processBits: int = processBits
         self.m_debug: bool = debug
 
     def Analyze(self) -> Dict[Tuple[int, str], int]:
+        if np is not None:
+            return self.AnalyzeVectorized()
+
+        return self.AnalyzeBitwise()
+
+    @staticmethod
+    def SymbolPopularity(bytePopularity: Dict[Tuple[int, str], int]) -> Dict[int, int]:
+        # The last symbol is encoded with its padding zeros, so symbols are
+        # counted by their padded value
+        symbolPopularity: Dict[int, int] = {}
+        for byte, count in bytePopularity.items():
+            symbol: int = int(byte[1], 2)
+            symbolPopularity[symbol] = symbolPopularity.get(symbol, 0) + count
+
+        return symbolPopularity
+
+    def AnalyzeVectorized(self) -> Dict[Tuple[int, str], int]:
+        processBits: int = self.m_processBits
+        counts = np.zeros(1 << processBits, dtype=np.int64)
+        extractor: symbol_extractor.SymbolExtractor = symbol_extractor.SymbolExtractor(processBits)
+
+        for chunk in self.__ReadChunks(self.m_chunkSize):
+            counts += np.bincount(extractor.Feed(chunk), minlength=len(counts))
+
+        # Last symbol may be shorter than processBits. It is counted by its own bits
+        symbols, lastSymbolBits = extractor.Flush()
+        lastSymbols = symbols[-1:] if lastSymbolBits < processBits else symbols[:0]
+        counts += np.bincount(symbols[:len(symbols) - len(lastSymbols)], minlength=len(counts))
+
         bytePopularity: Dict[Tuple[int, str], int] = {}
-        byteReader: byte_reader.ByteReader = byte_reader.ByteReader(debug=self.m_debug)
-        srcFile: io.BufferedReader = open(self.m_fileName, "rb")
-        
-        def UpdateBuffer() -> bool:
-            buffer: bytes = srcFile.read(self.m_bufferSize)
-
-            if buffer == b'':
-                return False
-
-            byteReader.SetBuffer(buffer)
-            return True
-
-        UpdateBuffer()
-        while byteReader.CanRead() or UpdateBuffer():
-            binary: int = 0
-            string: str = ""
-            for _ in range(self.m_processBits):
-                result: int = byteReader.ReadBit()
-
-                if result == -1:
-                    if UpdateBuffer():
-                        result = byteReader.ReadBit()
-                    else:
-                        break
-                
-                binary <<= 1
-                binary |= result
-                string += str(result)
-            
-            byte: Tuple[int, str] = (binary, string.ljust(self.m_processBits, '0'))
+        for value in np.flatnonzero(counts):
+            bytePopularity[(int(value), f"{value:0{processBits}b}")] = int(counts[value])
+
+        for symbol in lastSymbols.tolist():
+            byte: Tuple[int, str] = (symbol >> (processBits - lastSymbolBits), f"{symbol:0{processBits}b}")
+            bytePopularity[byte] = bytePopularity.get(byte, 0) + 1
+
+        return bytePopularity
+
+    def AnalyzeBitwise(self) -> Dict[Tuple[int, str], int]:
+        if self.m_buffer != None:
+            return self.__CountSymbols(bit_reader.BitReader(buffer=self.m_buffer, debug=self.m_debug))
+
+        with mapped_file.MappedFile(self.m_fileName, self.m_useMmap, self.m_debug) as source:
+            return self.__CountSymbols(source.CreateBitReader(self.m_bufferSize))
+
+    def __CountSymbols(self, bitReader: bit_reader.BitReader) -> Dict[Tuple[int, str], int]:
+        bytePopularity: Dict[Tuple[int, str], int] = {}
+
+        while (readBits := bitReader.Available(self.m_processBits)) > 0:
+            binary: int = bitReader.Read(readBits)
+            byte: Tuple[int, str] = (binary, f"{binary:0{readBits}b}".ljust(self.m_processBits, '0'))
 
             if byte not in bytePopularity:
                 bytePopularity[byte] = 0
 
             bytePopularity[byte] += 1
 
-        srcFile.close()
         return bytePopularity
+
+    def __ReadChunks(self, chunkSize: int) -> Iterator[bytes]:
+        # Slices of a buffer or of the mapped file are not copied
+        if self.m_buffer != None:
+            view: memoryview = memoryview(self.m_buffer)
+            for start in range(0, len(view), chunkSize):
+                yield view[start:start + chunkSize]
+            return
+
+        with mapped_file.MappedFile(self.m_fileName, self.m_useMmap, self.m_debug) as source:
+            yield from source.ReadChunks(chunkSize)
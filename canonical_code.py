@@ -0,0 +1,207 @@
+from __future__ import annotations
+from typing import Callable, Dict, List, Tuple
+
+import binary_tree, bit_writer, huffman_tree_builder
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+class CanonicalCode(object):
+    MIN_LENGTH_BITS: int = 7
+    LENGTH_WIDTH_BITS: int = 3
+
+    def __init__(self, codeLengths: Dict[int, int]):
+        self.m_codeLengths: Dict[int, int] = codeLengths
+
+        # symbol -> (code, codeLength). Codes of the same length are consecutive
+        # numbers in symbol order, so the lengths alone define the whole code
+        self.m_codes: Dict[int, Tuple[int, int]] = {}
+
+        code: int = 0
+        previousLength: int = 0
+        for symbol, length in sorted(codeLengths.items(), key = lambda item: (item[1], item[0])):
+            code <<= length - previousLength
+            self.m_codes[symbol] = (code, length)
+
+            code += 1
+            previousLength = length
+
+        # processBits -> GetCodeArrays result
+        self.m_codeArrays: Dict[int, Tuple] = {}
+
+    @staticmethod
+    def BuildCodeLengths(symbolPopularity: Dict[int, int], treeBuildMethod: str, maxCodeLength: int = 0) -> Tuple[Dict[int, int], int]:
+        # Code lengths of a Huffman Code for symbolPopularity and the encoded bits their limit
+        # to maxCodeLength costs. 0 = code length is not limited
+        root: binary_tree.Node = huffman_tree_builder.HuffmanTreeBuilder(symbolPopularity).Build(treeBuildMethod)
+        codeLengths: Dict[int, int] = CanonicalCode.CodeLengthsFromTree(root)
+
+        if maxCodeLength == 0 or max(codeLengths.values(), default = 0) <= maxCodeLength:
+            return codeLengths, 0
+
+        limitedCodeLengths: Dict[int, int] = CanonicalCode.LimitedCodeLengths(symbolPopularity, maxCodeLength)
+        limitCost: int = sum(count * (limitedCodeLengths[symbol] - codeLengths[symbol]) for symbol, count in symbolPopularity.items())
+
+        return limitedCodeLengths, limitCost
+
+    @staticmethod
+    def CodeLengthsFromTree(root: binary_tree.Node) -> Dict[int, int]:
+        if root == None:
+            return {}
+
+        if root.IsLeaf():
+            # A single symbol still needs one bit per occurrence
+            return {root.m_byte: 1}
+
+        codeLengths: Dict[int, int] = {}
+        stack: List[Tuple[binary_tree.Node, int]] = [(root, 0)]
+
+        while len(stack) > 0:
+            node, depth = stack.pop()
+
+            if node.IsLeaf():
+                codeLengths[node.m_byte] = depth
+            else:
+                stack.append((node.m_right, depth + 1))
+                stack.append((node.m_left, depth + 1))
+
+        return codeLengths
+
+    @staticmethod
+    def LimitedCodeLengths(symbolPopularity: Dict[int, int], maxCodeLength: int) -> Dict[int, int]:
+        # Package-merge: optimal code lengths under the constraint length <= maxCodeLength
+        symbols: List[int] = sorted(symbolPopularity.keys(), key = lambda symbol: (symbolPopularity[symbol], symbol))
+
+        if len(symbols) <= 1:
+            return {symbol: 1 for symbol in symbols}
+
+        if len(symbols) > (1 << maxCodeLength):
+            raise Exception(f"{len(symbols)} symbols do not fit in codes of at most {maxCodeLength} bits")
+
+        leafWeights: List[int] = [symbolPopularity[symbol] for symbol in symbols]
+
+        # Every level lists its items in weight order: leaf index, or -1 for a package
+        # of two consecutive items of the previous level
+        weights: List[int] = leafWeights
+        levels: List[List[int]] = [list(range(len(symbols)))]
+
+        for _ in range(maxCodeLength - 1):
+            packages: List[int] = [weights[index] + weights[index + 1] for index in range(0, len(weights) - 1, 2)]
+
+            mergedWeights: List[int] = []
+            mergedItems: List[int] = []
+            leafIndex, packageIndex = 0, 0
+            while leafIndex < len(leafWeights) or packageIndex < len(packages):
+                if packageIndex == len(packages) or (leafIndex < len(leafWeights) and leafWeights[leafIndex] <= packages[packageIndex]):
+                    mergedWeights.append(leafWeights[leafIndex])
+                    mergedItems.append(leafIndex)
+                    leafIndex += 1
+                else:
+                    mergedWeights.append(packages[packageIndex])
+                    mergedItems.append(-1)
+                    packageIndex += 1
+
+            weights = mergedWeights
+            levels.append(mergedItems)
+
+        # The first 2n - 2 items of the last level are the solution. A leaf adds one bit to
+        # its symbol for every level it is selected in, and m selected packages select
+        # the first 2m items of the level below
+        lengths: List[int] = [0] * len(symbols)
+        selected: int = 2 * len(symbols) - 2
+        for items in reversed(levels):
+            selectedPackages: int = 0
+            for item in items[:selected]:
+                if item >= 0:
+                    lengths[item] += 1
+                else:
+                    selectedPackages += 1
+
+            selected = 2 * selectedPackages
+
+        return {symbol: length for symbol, length in zip(symbols, lengths)}
+
+    def GetCodeArrays(self, processBits: int) -> Tuple:
+        # (code values, code lengths) indexed by symbol for BitWriter.WriteArray, length 0 = not
+        # in the code. Built once. None without numpy, or when a code or the escape code
+        # followed by a raw symbol is too long for BitWriter.WriteArray
+        if processBits in self.m_codeArrays:
+            return self.m_codeArrays[processBits]
+
+        escapeSymbol: int = 1 << processBits
+        _, escapeLength = self.m_codes.get(escapeSymbol, (0, 0))
+        maxLength: int = max(self.m_codeLengths.values(), default = 0)
+        codeArrays: Tuple = None
+
+        if np is not None and max(maxLength, escapeLength + processBits) <= bit_writer.BitWriter.MAX_ARRAY_CODE_LENGTH:
+            # Escape symbol is out of the symbol range
+            codes: List[Tuple[int, int, int]] = [(symbol, code, length) for symbol, (code, length) in self.m_codes.items() if symbol != escapeSymbol]
+            symbols = np.array([symbol for symbol, _, _ in codes], dtype=np.int64)
+
+            codeValues = np.zeros(escapeSymbol, dtype=np.uint64)
+            codeLengths = np.zeros(escapeSymbol, dtype=np.int64)
+            codeValues[symbols] = [code for _, code, _ in codes]
+            codeLengths[symbols] = [length for _, _, length in codes]
+            codeArrays = (codeValues, codeLengths)
+
+        self.m_codeArrays[processBits] = codeArrays
+        return codeArrays
+
+    def GetDecodeCodes(self) -> List[Tuple[int, int, int]]:
+        # (symbol, code, codeLength) in canonical order
+        return sorted(((symbol, code, length) for symbol, (code, length) in self.m_codes.items()), key = lambda item: (item[2], item[0]))
+
+    def Write(self, writeBits: Callable[[int, int], None], processBits: int) -> None:
+        # symbolCount (processBits + 1 bits)
+        # minLength (7 bits), lengthWidth (3 bits)
+        # for every present symbol in ascending order:
+        #   Elias gamma of (symbol - previousSymbol), then length - minLength in lengthWidth bits
+        writeBits(len(self.m_codeLengths), processBits + 1)
+
+        if len(self.m_codeLengths) == 0:
+            return
+
+        minLength: int = min(self.m_codeLengths.values())
+        lengthWidth: int = (max(self.m_codeLengths.values()) - minLength).bit_length()
+        assert max(self.m_codeLengths.values()) < (1 << self.MIN_LENGTH_BITS), "Code length does not fit in the header"
+
+        writeBits(minLength, self.MIN_LENGTH_BITS)
+        writeBits(lengthWidth, self.LENGTH_WIDTH_BITS)
+
+        previousSymbol: int = -1
+        for symbol in sorted(self.m_codeLengths.keys()):
+            gap: int = symbol - previousSymbol
+            writeBits(0, gap.bit_length() - 1)
+            writeBits(gap, gap.bit_length())
+
+            if lengthWidth > 0:
+                writeBits(self.m_codeLengths[symbol] - minLength, lengthWidth)
+
+            previousSymbol = symbol
+
+    @staticmethod
+    def Read(readBits: Callable[[int], int], processBits: int) -> CanonicalCode:
+        codeLengths: Dict[int, int] = {}
+        symbolCount: int = readBits(processBits + 1)
+
+        if symbolCount == 0:
+            return CanonicalCode(codeLengths)
+
+        minLength: int = readBits(CanonicalCode.MIN_LENGTH_BITS)
+        lengthWidth: int = readBits(CanonicalCode.LENGTH_WIDTH_BITS)
+
+        previousSymbol: int = -1
+        for _ in range(symbolCount):
+            gapBits: int = 1
+            while readBits(1) == 0:
+                gapBits += 1
+
+            gap: int = (1 << (gapBits - 1)) | readBits(gapBits - 1)
+            symbol: int = previousSymbol + gap
+
+            codeLengths[symbol] = minLength + (readBits(lengthWidth) if lengthWidth > 0 else 0)
+            previousSymbol = symbol
+
+        return CanonicalCode(codeLengths)
@@ -0,0 +1,131 @@
+from __future__ import annotations
+from typing import Dict, List, Tuple
+
+import bit_reader, bit_writer, byte_analyzer, canonical_code, coder_logging, decode_table, huffman_tree_builder
+import argparse, logging, os, zlib
+
+class CodeTable(object):
+    # Huffman Code trained on a sample corpus and shared by encoder and decoder, so files
+    # carry its ID instead of their own code lengths table
+    # File: MAGIC, version (8 bits), table ID (ID_BITS), processBits (8 bits),
+    # code lengths table (see CanonicalCode.Write), aligned to a byte
+    MAGIC: bytes = b"HUFT"
+    VERSION: int = 1
+    ID_BITS: int = 32
+
+    def __init__(self, processBits: int, codeLengths: Dict[int, int]):
+        self.m_processBits: int = processBits
+        self.m_canonicalCode: canonical_code.CanonicalCode = canonical_code.CanonicalCode(codeLengths)
+
+        # Symbols missing from the corpus are written as the escape code followed by the raw symbol
+        self.m_escapeSymbol: int = 1 << processBits if 1 << processBits in codeLengths else -1
+
+        # Checksum of the code lengths. Retraining on another corpus gives another ID,
+        # so a file is never decoded with a table it was not encoded with
+        self.m_tableId: int = zlib.crc32(self.__PackCode())
+
+        # (symbol, code, codeLength) in canonical order. The decode table is built
+        # on first use and kept for every decoded file
+        self.m_decodeCodes: List[Tuple[int, int, int]] = self.m_canonicalCode.GetDecodeCodes()
+        self.m_decodeTable: decode_table.DecodeTable = None
+
+    @staticmethod
+    def Train(corpusFilePaths: List[str], processBits: int, treeBuildMethod: str = huffman_tree_builder.HuffmanTreeBuilder.HEAP, maxCodeLength: int = 0) -> CodeTable:
+        symbolPopularity: Dict[int, int] = {}
+
+        for filePath in corpusFilePaths:
+            bytePopularity: Dict[Tuple[int, str], int] = byte_analyzer.ByteAnalyzer(filePath, processBits).Analyze()
+
+            for symbol, count in byte_analyzer.ByteAnalyzer.SymbolPopularity(bytePopularity).items():
+                symbolPopularity[symbol] = symbolPopularity.get(symbol, 0) + count
+
+        if len(symbolPopularity) < 1 << processBits:
+            # Messages may hold symbols the corpus does not. Escape is one past the largest symbol
+            symbolPopularity[1 << processBits] = 1
+
+        codeLengths, _ = canonical_code.CanonicalCode.BuildCodeLengths(symbolPopularity, treeBuildMethod, maxCodeLength)
+        return CodeTable(processBits, codeLengths)
+
+    def GetCodes(self) -> Dict[int, Tuple[int, int]]:
+        return self.m_canonicalCode.m_codes
+
+    def GetDecodeTable(self) -> decode_table.DecodeTable:
+        if self.m_decodeTable == None:
+            self.m_decodeTable = decode_table.DecodeTable(self.m_decodeCodes)
+
+        return self.m_decodeTable
+
+    def Save(self, filePath: str) -> None:
+        bitWriter: bit_writer.BitWriter = bit_writer.BitWriter()
+        bitWriter.Write(self.VERSION, 8)
+        bitWriter.Write(self.m_tableId, self.ID_BITS)
+        bitWriter.Write(self.m_processBits, 8)
+
+        with open(filePath, "wb") as file:
+            file.write(self.MAGIC + bitWriter.PopContent() + self.__PackCode())
+
+    @staticmethod
+    def Load(filePath: str) -> CodeTable:
+        with open(filePath, "rb") as file:
+            content: bytes = file.read()
+
+        if content[:len(CodeTable.MAGIC)] != CodeTable.MAGIC:
+            raise Exception(f"{filePath} is not a code table")
+
+        bitReader: bit_reader.BitReader = bit_reader.BitReader(buffer=content[len(CodeTable.MAGIC):])
+        try:
+            version: int = bitReader.Read(8)
+            if version != CodeTable.VERSION:
+                raise Exception(f"Unsupported code table version: {version}")
+
+            tableId: int = bitReader.Read(CodeTable.ID_BITS)
+            processBits: int = bitReader.Read(8)
+            codeLengths: Dict[int, int] = canonical_code.CanonicalCode.Read(bitReader.Read, processBits).m_codeLengths
+        except EOFError:
+            raise EOFError(f"Reached end of file while decoding code table {filePath}")
+
+        codeTable: CodeTable = CodeTable(processBits, codeLengths)
+        if codeTable.m_tableId != tableId:
+            raise Exception(f"Code table {filePath} is damaged: ID {tableId:08x}, code lengths of {codeTable.m_tableId:08x}")
+
+        return codeTable
+
+    def __PackCode(self) -> bytes:
+        bitWriter: bit_writer.BitWriter = bit_writer.BitWriter()
+        self.m_canonicalCode.Write(bitWriter.Write, self.m_processBits)
+        bitWriter.AlignToByte()
+        return bitWriter.PopContent()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = "Train a Huffman Code on a sample corpus. Files encoded with it carry the table ID instead of a code lengths table")
+    parser.add_argument("outFile", help = "Path to the code table file")
+    parser.add_argument("corpusFiles", nargs = "+", help = "Sample files, typical for the data to be encoded")
+    parser.add_argument("-p", "--processBits", dest="processBits", type = int, default = 8, help = "How much bits to process. By default 8 (1 byte)")
+    parser.add_argument("-l", "--logLevel", dest="logLevel", type = int, default = 2, help = "To configure logging messages. 1 - DEBUG, 2 - INFO, 3 - WARNING, 4 - ERROR, 5 - CRITICAL")
+    parser.add_argument("--logFile", dest="logFile", default = "logs/code_table.log", help = "Log file. Its directory is created if missing. By default logs/code_table.log")
+    parser.add_argument("-t", "--treeBuildMethod", dest="treeBuildMethod", choices = huffman_tree_builder.HuffmanTreeBuilder.METHODS, default = huffman_tree_builder.HuffmanTreeBuilder.HEAP, help = "Huffman tree construction. heap - priority queue, twoqueue - linear merge over sorted counts")
+    parser.add_argument("-m", "--maxCodeLength", dest="maxCodeLength", type = int, default = 0, help = "Longest allowed Huffman code in bits. By default 0 (not limited)")
+    args = parser.parse_args()
+
+    if args.logLevel <= 0 or args.logLevel > 5:
+        raise Exception("Bad logLevel")
+
+    if args.processBits <= 1 or args.processBits > 16:
+        raise Exception("Bad processBits")
+
+    if args.maxCodeLength < 0 or args.maxCodeLength >= 1 << canonical_code.CanonicalCode.MIN_LENGTH_BITS:
+        raise Exception("Bad maxCodeLength")
+
+    coder_logging.ConfigureLogging(args.logLevel, args.logFile)
+
+    logger: logging.Logger = logging.getLogger(__name__)
+    logger.info(f"Training on {len(args.corpusFiles)} files...")
+
+    codeTable: CodeTable = CodeTable.Train(args.corpusFiles, args.processBits, args.treeBuildMethod, args.maxCodeLength)
+    codeTable.Save(args.outFile)
+
+    corpusSize: int = sum(os.stat(filePath).st_size for filePath in args.corpusFiles)
+    print(f"Code table {codeTable.m_tableId:08x}: {len(codeTable.GetCodes())} codes, trained on {corpusSize}B, saved to '{args.outFile}'")
+
+if __name__ == "__main__":
+    main()
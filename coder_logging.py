@@ -0,0 +1,23 @@
+from typing import TextIO
+
+import logging, os
+
+FORMAT: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+def GetCoderLogger(name: str, messageFile: TextIO) -> logging.Logger:
+    # Messages of a coder go to messageFile as well. Handlers belong to the logger of the module,
+    # so it gets one per message file, not one more for every coder created
+    logger: logging.Logger = logging.getLogger(name)
+
+    if not any(isinstance(handler, logging.StreamHandler) and handler.stream is messageFile for handler in logger.handlers):
+        logger.addHandler(logging.StreamHandler(messageFile))
+
+    return logger
+
+def ConfigureLogging(logLevel: int, logFilePath: str) -> None:
+    # logLevel 1 - DEBUG ... 5 - CRITICAL. Directory of the log file is created if missing
+    logDir: str = os.path.dirname(logFilePath)
+    if logDir != "":
+        os.makedirs(logDir, exist_ok=True)
+
+    logging.basicConfig(level = logLevel * 10, filename = logFilePath, filemode = "w", format = FORMAT)
@@ -0,0 +1,125 @@
+from typing import Callable, Dict, Iterator, List, TextIO
+
+import cProfile, contextlib, io, math, pstats, time
+
+# processed bytes, total bytes (0 = unknown), bytes per second so far
+ProgressCallback = Callable[[int, int, float], None]
+
+class CoderStats(object):
+    # Phases. Time of a phase is summed over all of its parts
+    ANALYZE: str = "analyze"
+    TREE_BUILD: str = "treeBuild"
+    HEADER_WRITE: str = "headerWrite"
+    HEADER_READ: str = "headerRead"
+    BODY_ENCODE: str = "bodyEncode"
+    BODY_DECODE: str = "bodyDecode"
+    IO: str = "io"
+
+    def __init__(self, progressCallback: ProgressCallback = None, profile: bool = False):
+        self.m_phaseTimes: Dict[str, float] = {}
+        self.m_totalTime: float = 0
+        self.m_startTime: float = 0
+
+        self.m_bytesIn: int = 0
+        self.m_bytesOut: int = 0
+        self.m_headerBits: int = 0
+
+        # Code bits of the body, without header, trailer and padding
+        self.m_encodedBits: int = 0
+        self.m_symbolCount: int = 0
+
+        # Bits per symbol. Entropy of the symbol distribution, -1 = not known
+        self.m_entropy: float = -1
+
+        # Coder specific numbers, like the cost of a code length limit
+        self.m_extra: Dict[str, float] = {}
+
+        self.m_progressCallback: ProgressCallback = progressCallback
+        self.m_progressTotal: int = 0
+        self.m_profiler: cProfile.Profile = cProfile.Profile() if profile else None
+
+    @contextlib.contextmanager
+    def Measure(self) -> Iterator[None]:
+        # Whole run. Profiled when asked for
+        self.m_startTime = time.perf_counter()
+
+        if self.m_profiler != None:
+            self.m_profiler.enable()
+
+        try:
+            yield
+        finally:
+            if self.m_profiler != None:
+                self.m_profiler.disable()
+
+            self.m_totalTime = time.perf_counter() - self.m_startTime
+
+    @contextlib.contextmanager
+    def Phase(self, name: str) -> Iterator[None]:
+        startTime: float = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.AddPhaseTime(name, time.perf_counter() - startTime)
+
+    def AddPhaseTime(self, name: str, seconds: float) -> None:
+        self.m_phaseTimes[name] = self.m_phaseTimes.get(name, 0) + seconds
+
+    def ReportProgress(self, processedBytes: int) -> None:
+        if self.m_progressCallback == None:
+            return
+
+        elapsed: float = time.perf_counter() - self.m_startTime
+        self.m_progressCallback(processedBytes, self.m_progressTotal, processedBytes / elapsed if elapsed > 0 else 0)
+
+    def GetAverageCodeLength(self) -> float:
+        return self.m_encodedBits / self.m_symbolCount if self.m_symbolCount > 0 else 0
+
+    def GetCompressionRatio(self) -> float:
+        # Original size / encoded size, whichever way the coder went
+        encodedBytes: int = min(self.m_bytesIn, self.m_bytesOut)
+        return max(self.m_bytesIn, self.m_bytesOut) / encodedBytes if encodedBytes > 0 else 0
+
+    def GetProfile(self, sortKey: str = "cumulative", limit: int = 20) -> str:
+        if self.m_profiler == None:
+            return ""
+
+        content: io.StringIO = io.StringIO()
+        pstats.Stats(self.m_profiler, stream=content).sort_stats(sortKey).print_stats(limit)
+        return content.getvalue()
+
+    def ToDict(self) -> Dict[str, object]:
+        return {
+            "totalTime": self.m_totalTime,
+            "phaseTimes": dict(self.m_phaseTimes),
+            "bytesIn": self.m_bytesIn,
+            "bytesOut": self.m_bytesOut,
+            "bitsIn": self.m_bytesIn * 8,
+            "bitsOut": self.m_bytesOut * 8,
+            "headerBits": self.m_headerBits,
+            "encodedBits": self.m_encodedBits,
+            "symbolCount": self.m_symbolCount,
+            "averageCodeLength": self.GetAverageCodeLength(),
+            "entropy": self.m_entropy,
+            "compressionRatio": self.GetCompressionRatio(),
+            **self.m_extra,
+        }
+
+    def Print(self, srcFilePath: str, outFilePath: str, file: TextIO) -> None:
+        for filePath, size in ((srcFilePath, self.m_bytesIn), (outFilePath, self.m_bytesOut)):
+            print(f"'{filePath}' size: {size}B, {round(size / 1024, 3)}Kb, {round(size / (1024 ** 2), 3)}Mb", file=file)
+
+        print(f"Compression ratio: {self.GetCompressionRatio()}", file=file)
+
+        if self.m_symbolCount > 0:
+            entropy: str = f", entropy {round(self.m_entropy, 4)} bits" if self.m_entropy >= 0 else ""
+            print(f"Symbols: {self.m_symbolCount}. Average code length: {round(self.GetAverageCodeLength(), 4)} bits{entropy}", file=file)
+
+        phases: List[str] = [f"{name} {round(seconds, 4)}s" for name, seconds in self.m_phaseTimes.items()]
+        print(f"Time: {round(self.m_totalTime, 4)}s ({', '.join(phases)})", file=file)
+
+    @staticmethod
+    def Entropy(symbolCounts: Dict[int, int]) -> float:
+        total: int = sum(symbolCounts.values())
+        return -sum(count / total * math.log2(count / total) for count in symbolCounts.values() if count > 0) if total > 0 else 0
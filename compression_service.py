@@ -0,0 +1,352 @@
+from __future__ import annotations
+from typing import Deque, Dict, List, Tuple
+
+import code_table, coder_logging, container_format, huffman_decoder, huffman_encoder
+import argparse, asyncio, collections, concurrent.futures, json, logging, os, signal, socket, sys, tempfile, time
+
+class CompressionService(object):
+    # Requests and replies are frames: kind (8 bits), payload length (ContainerFormat.INDEX_FIELD_BYTES), payload.
+    # Request kinds are operations, reply kinds are statuses. A connection may send any number of
+    # requests, each is answered before the next one is read
+    OP_COMPRESS: int = 1
+    OP_DECOMPRESS: int = 2
+    OP_STATS: int = 3
+
+    STATUS_OK: int = 0
+    STATUS_ERROR: int = 1
+
+    # Replied instead of waiting when this many requests already wait for a worker
+    DEFAULT_MAX_QUEUE_DEPTH: int = 1024
+    DEFAULT_MAX_PAYLOAD_BYTES: int = 64 * 1024 * 1024
+
+    # Latency percentiles are taken over the last LATENCY_WINDOW requests
+    LATENCY_WINDOW: int = 10000
+    PERCENTILES: Tuple[int, ...] = (50, 90, 99)
+
+    # Settings of the current worker process: code table, processBits, temporary directory
+    s_workerCodeTable: code_table.CodeTable = None
+    s_workerDecoder: huffman_decoder.HuffmanDecoder = None
+    s_workerProcessBits: int = 8
+
+    def __init__(self, address: str, jobs: int = 1, processBits: int = 8, codeTables: List[code_table.CodeTable] = None,
+                 maxQueueDepth: int = DEFAULT_MAX_QUEUE_DEPTH, maxPayloadBytes: int = DEFAULT_MAX_PAYLOAD_BYTES, debug: bool = False):
+        # address = path of a Unix domain socket, or HOST:PORT of a TCP socket
+        self.m_address: str = address
+        self.m_jobs: int = jobs
+
+        # With code tables messages are compressed with the first one and need no analysis.
+        # Without them every message gets its own code
+        self.m_processBits: int = processBits
+        self.m_codeTables: List[code_table.CodeTable] = codeTables or []
+        self.m_executor: concurrent.futures.ProcessPoolExecutor = None
+
+        # At most jobs requests are in the pool, the others wait for a free worker. Past
+        # maxQueueDepth waiting ones requests are refused, so clients back off
+        self.m_workerSlots: asyncio.Semaphore = None
+        self.m_maxQueueDepth: int = maxQueueDepth
+        self.m_maxPayloadBytes: int = maxPayloadBytes
+
+        self.m_queueDepth: int = 0
+        self.m_inFlight: int = 0
+        self.m_connections: int = 0
+        self.m_completed: int = 0
+        self.m_failed: int = 0
+        self.m_refused: int = 0
+        self.m_bytesIn: int = 0
+        self.m_bytesOut: int = 0
+        self.m_latencies: Deque[float] = collections.deque(maxlen=self.LATENCY_WINDOW)
+        self.m_startTime: float = 0
+
+        self.m_debug: bool = debug
+        self.m_logger: logging.Logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def IsUnixAddress(address: str) -> bool:
+        return ":" not in address and not address.isdigit()
+
+    @staticmethod
+    def SplitAddress(address: str) -> Tuple[str, int]:
+        host, _, port = address.rpartition(":")
+        return host or "127.0.0.1", int(port)
+
+    @staticmethod
+    def PackFrame(kind: int, payload: bytes) -> bytes:
+        return bytes([kind]) + container_format.ContainerFormat.PackFields((len(payload),)) + payload
+
+    @staticmethod
+    async def ReadFrame(reader: asyncio.StreamReader, maxPayloadBytes: int) -> Tuple[int, bytes]:
+        # None at the end of the connection
+        try:
+            head: bytes = await reader.readexactly(1 + container_format.ContainerFormat.INDEX_FIELD_BYTES)
+        except asyncio.IncompleteReadError as error:
+            if len(error.partial) == 0:
+                return None
+
+            raise
+
+        length: int = container_format.ContainerFormat.UnpackFields(head[1:])[0]
+        if length > maxPayloadBytes:
+            raise Exception(f"Payload of {length}B is larger than {maxPayloadBytes}B")
+
+        return head[0], await reader.readexactly(length)
+
+    async def Serve(self) -> None:
+        self.m_startTime = time.perf_counter()
+        self.m_workerSlots = asyncio.Semaphore(self.m_jobs)
+        self.m_executor = concurrent.futures.ProcessPoolExecutor(self.m_jobs, initializer=CompressionService.InitWorker, initargs=(self.m_processBits, self.m_codeTables))
+
+        try:
+            # Workers are started and imports done before the first request
+            loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+            await asyncio.gather(*(loop.run_in_executor(self.m_executor, CompressionService.WarmWorker) for _ in range(self.m_jobs)))
+
+            if self.IsUnixAddress(self.m_address):
+                server: asyncio.AbstractServer = await asyncio.start_unix_server(self.HandleConnection, self.m_address)
+            else:
+                host, port = self.SplitAddress(self.m_address)
+                server: asyncio.AbstractServer = await asyncio.start_server(self.HandleConnection, host, port)
+
+            stopped: asyncio.Event = asyncio.Event()
+            for signalNumber in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(signalNumber, stopped.set)
+
+            self.m_logger.info(f"Listening on {self.GetAddresses(server)} with {self.m_jobs} workers")
+            print(f"Listening on {', '.join(self.GetAddresses(server))} with {self.m_jobs} workers", flush=True)
+
+            async with server:
+                await stopped.wait()
+        finally:
+            self.m_executor.shutdown(cancel_futures=True)
+
+            if self.IsUnixAddress(self.m_address) and os.path.exists(self.m_address):
+                os.remove(self.m_address)
+
+    @staticmethod
+    def GetAddresses(server: asyncio.AbstractServer) -> List[str]:
+        addresses: List[str] = []
+        for serverSocket in server.sockets:
+            name = serverSocket.getsockname()
+            addresses.append(name if isinstance(name, str) else f"{name[0]}:{name[1]}")
+
+        return addresses
+
+    async def HandleConnection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.m_connections += 1
+
+        try:
+            while (frame := await self.ReadFrame(reader, self.m_maxPayloadBytes)) != None:
+                kind, payload = frame
+                status, reply = await self.HandleRequest(kind, payload)
+
+                writer.write(self.PackFrame(status, reply))
+
+                # A client reading slowly holds its connection, not the whole service
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as error:
+            # Broken frame. The connection is out of sync, so it is closed
+            self.m_logger.warning(f"Closing connection: {error}")
+            writer.write(self.PackFrame(self.STATUS_ERROR, str(error).encode()))
+        finally:
+            self.m_connections -= 1
+            writer.close()
+
+    async def HandleRequest(self, kind: int, payload: bytes) -> Tuple[int, bytes]:
+        if kind == self.OP_STATS:
+            return self.STATUS_OK, json.dumps(self.GetStats()).encode()
+
+        if kind not in (self.OP_COMPRESS, self.OP_DECOMPRESS):
+            return self.STATUS_ERROR, f"Unknown operation: {kind}".encode()
+
+        if self.m_queueDepth >= self.m_maxQueueDepth:
+            self.m_refused += 1
+            return self.STATUS_ERROR, f"Busy: {self.m_queueDepth} requests are waiting".encode()
+
+        startTime: float = time.perf_counter()
+        self.m_queueDepth += 1
+
+        try:
+            await self.m_workerSlots.acquire()
+        finally:
+            self.m_queueDepth -= 1
+
+        self.m_inFlight += 1
+        try:
+            function = CompressionService.CompressInWorker if kind == self.OP_COMPRESS else CompressionService.DecompressInWorker
+            reply: bytes = await asyncio.get_running_loop().run_in_executor(self.m_executor, function, payload)
+        except Exception as error:
+            self.m_failed += 1
+            self.m_logger.warning(f"Request {kind} of {len(payload)}B failed: {error}")
+            return self.STATUS_ERROR, f"{type(error).__name__}: {error}".encode()
+        finally:
+            self.m_inFlight -= 1
+            self.m_workerSlots.release()
+
+        self.m_latencies.append(time.perf_counter() - startTime)
+        self.m_completed += 1
+        self.m_bytesIn += len(payload)
+        self.m_bytesOut += len(reply)
+        return self.STATUS_OK, reply
+
+    def GetStats(self) -> Dict[str, object]:
+        latencies: List[float] = sorted(self.m_latencies)
+        percentiles: Dict[str, float] = {}
+
+        for percentile in self.PERCENTILES:
+            # Nearest rank
+            index: int = max(-(-percentile * len(latencies) // 100) - 1, 0)
+            percentiles[f"p{percentile}"] = latencies[index] if len(latencies) > 0 else 0
+
+        return {
+            "uptime": time.perf_counter() - self.m_startTime,
+            "jobs": self.m_jobs,
+            "queueDepth": self.m_queueDepth,
+            "inFlight": self.m_inFlight,
+            "connections": self.m_connections,
+            "completed": self.m_completed,
+            "failed": self.m_failed,
+            "refused": self.m_refused,
+            "bytesIn": self.m_bytesIn,
+            "bytesOut": self.m_bytesOut,
+            "latencySeconds": percentiles,
+        }
+
+    @staticmethod
+    def InitWorker(processBits: int, codeTables: List[code_table.CodeTable]) -> None:
+        # Messages of coders would go to stdout of the service for every request
+        logging.getLogger().setLevel(logging.WARNING)
+
+        CompressionService.s_workerProcessBits = processBits
+        CompressionService.s_workerCodeTable = codeTables[0] if len(codeTables) > 0 else None
+        CompressionService.s_workerDecoder = huffman_decoder.HuffmanDecoder(None, None, codeTables=codeTables)
+
+    @staticmethod
+    def WarmWorker() -> int:
+        return os.getpid()
+
+    @staticmethod
+    def CompressInWorker(data: bytes) -> bytes:
+        if CompressionService.s_workerCodeTable != None:
+            return huffman_encoder.HuffmanEncoder.EncodeMessage(data, CompressionService.s_workerCodeTable)
+
+        # The encoder analyzes a whole file before encoding it. Files of a request are removed with it,
+        # workers exit without running atexit handlers
+        with tempfile.TemporaryDirectory(prefix="huffman_service_") as tempDir:
+            srcFilePath: str = os.path.join(tempDir, "source")
+            outFilePath: str = os.path.join(tempDir, "encoded")
+
+            with open(srcFilePath, "wb") as file:
+                file.write(data)
+
+            huffman_encoder.HuffmanEncoder(srcFilePath, outFilePath, CompressionService.s_workerProcessBits).Run()
+
+            with open(outFilePath, "rb") as file:
+                return file.read()
+
+    @staticmethod
+    def DecompressInWorker(content: bytes) -> bytes:
+        return CompressionService.s_workerDecoder.DecodeMessage(content)
+
+class CompressionClient(object):
+    # Blocking client of CompressionService. One connection, requests one after another
+    def __init__(self, address: str, timeout: float = None):
+        if CompressionService.IsUnixAddress(address):
+            self.m_socket: socket.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.m_socket.settimeout(timeout)
+            self.m_socket.connect(address)
+        else:
+            self.m_socket: socket.socket = socket.create_connection(CompressionService.SplitAddress(address), timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.Close()
+
+    def Compress(self, data: bytes) -> bytes:
+        return self.Request(CompressionService.OP_COMPRESS, data)
+
+    def Decompress(self, content: bytes) -> bytes:
+        return self.Request(CompressionService.OP_DECOMPRESS, content)
+
+    def GetStats(self) -> Dict[str, object]:
+        return json.loads(self.Request(CompressionService.OP_STATS, b''))
+
+    def Request(self, operation: int, payload: bytes) -> bytes:
+        self.m_socket.sendall(CompressionService.PackFrame(operation, payload))
+
+        head: bytes = self.__ReadExactly(1 + container_format.ContainerFormat.INDEX_FIELD_BYTES)
+        reply: bytes = self.__ReadExactly(container_format.ContainerFormat.UnpackFields(head[1:])[0])
+
+        if head[0] != CompressionService.STATUS_OK:
+            raise Exception(f"Service error: {reply.decode(errors='replace')}")
+
+        return reply
+
+    def Close(self) -> None:
+        self.m_socket.close()
+
+    def __ReadExactly(self, length: int) -> bytes:
+        content: bytearray = bytearray()
+        while len(content) < length:
+            chunk: bytes = self.m_socket.recv(length - len(content))
+            if chunk == b'':
+                raise EOFError("Service closed the connection")
+
+            content += chunk
+
+        return bytes(content)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = "Compression service on a warm pool of worker processes, and its client")
+    parser.add_argument("command", choices = ("serve", "compress", "decompress", "stats"), help = "serve - run the service, the others - send a request to it")
+    parser.add_argument("address", help = "Path of a Unix domain socket, or HOST:PORT (PORT alone = localhost)")
+    parser.add_argument("srcFile", nargs = "?", default = "-", help = "Source of compress and decompress. By default stdin")
+    parser.add_argument("outFile", nargs = "?", default = "-", help = "Out file of compress and decompress. By default stdout")
+    parser.add_argument("-j", "--jobs", dest="jobs", type = int, default = os.cpu_count() or 1, help = "Worker processes. By default the number of CPUs")
+    parser.add_argument("-p", "--processBits", dest="processBits", type = int, default = 8, help = "How much bits to process without a code table. By default 8 (1 byte)")
+    parser.add_argument("-T", "--table", dest="tables", action = "append", default = [], help = "Code table made by code_table.py. Compression uses the first one, decompression picks by ID")
+    parser.add_argument("-q", "--maxQueueDepth", dest="maxQueueDepth", type = int, default = CompressionService.DEFAULT_MAX_QUEUE_DEPTH, help = f"Requests waiting for a worker before new ones are refused. By default {CompressionService.DEFAULT_MAX_QUEUE_DEPTH}")
+    parser.add_argument("--maxPayload", dest="maxPayload", type = int, default = CompressionService.DEFAULT_MAX_PAYLOAD_BYTES, help = f"Largest accepted payload in bytes. By default {CompressionService.DEFAULT_MAX_PAYLOAD_BYTES}")
+    parser.add_argument("-l", "--logLevel", dest="logLevel", type = int, default = 2, help = "To configure logging messages. 1 - DEBUG, 2 - INFO, 3 - WARNING, 4 - ERROR, 5 - CRITICAL")
+    parser.add_argument("--logFile", dest="logFile", default = "logs/compression_service.log", help = "Log file. Its directory is created if missing. By default logs/compression_service.log")
+    args = parser.parse_args()
+
+    if args.logLevel <= 0 or args.logLevel > 5:
+        raise Exception("Bad logLevel")
+
+    if args.jobs <= 0:
+        raise Exception("Bad jobs")
+
+    if args.processBits <= 1 or args.processBits > 16:
+        raise Exception("Bad processBits")
+
+    if args.maxQueueDepth <= 0 or args.maxPayload <= 0:
+        raise Exception("Bad maxQueueDepth or maxPayload")
+
+    if args.command == "serve":
+        coder_logging.ConfigureLogging(args.logLevel, args.logFile)
+
+        codeTables: List[code_table.CodeTable] = [code_table.CodeTable.Load(filePath) for filePath in args.tables]
+        processBits: int = codeTables[0].m_processBits if len(codeTables) > 0 else args.processBits
+
+        service: CompressionService = CompressionService(args.address, args.jobs, processBits, codeTables, args.maxQueueDepth, args.maxPayload, debug = args.logLevel == 1)
+        asyncio.run(service.Serve())
+        return
+
+    with CompressionClient(args.address) as client:
+        if args.command == "stats":
+            print(json.dumps(client.GetStats(), indent = 2))
+            return
+
+        with open(args.srcFile, "rb") if args.srcFile != "-" else open(sys.stdin.fileno(), "rb", closefd=False) as file:
+            payload: bytes = file.read()
+
+        reply: bytes = client.Compress(payload) if args.command == "compress" else client.Decompress(payload)
+
+        with open(args.outFile, "wb") if args.outFile != "-" else open(sys.stdout.fileno(), "wb", closefd=False) as file:
+            file.write(reply)
+
+if __name__ == "__main__":
+    main()
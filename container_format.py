@@ -0,0 +1,117 @@
+from typing import Callable, List, Tuple
+
+class ContainerFormat(object):
+    # Legacy files start with processBits - 2 in the first 4 bits, which is never
+    # above 14. 0b1111 there marks a versioned container, the version follows in 4 bits
+    MAGIC: int = 0b1111
+    VERSION: int = 1
+
+    # Header after the magic/version byte:
+    # processBits (8 bits), flags (8 bits),
+    # padding (8 bits, patched after encoding): bits 0-2 = padding zeros at the end of file,
+    #                                           bits 3-6 = padding zeros in the last symbol,
+    #                                           only if HasPaddingByte(flags),
+    # code lengths table (see CanonicalCode.Write)
+
+    # Body is a sequence of independently decodable blocks instead of a single bitstream.
+    # The header is aligned to a byte after the code lengths table and its padding byte is 0.
+    # Each block starts on a byte boundary with a block header: bit length, original length
+    # (INDEX_FIELD_BYTES each). A block header of zeros ends the blocks, so they can be read
+    # in order without seeking. The file ends with the block index:
+    # per block: offset of its data in the file, bit length, original length (INDEX_FIELD_BYTES each),
+    # then the footer: index offset, block count (INDEX_FIELD_BYTES each)
+    FLAG_BLOCKS: int = 0b00000001
+
+    # Only with FLAG_BLOCKS. There is no code lengths table in the header,
+    # every block starts with its own one
+    FLAG_BLOCK_TABLES: int = 0b00000010
+
+    # Code has an escape symbol (1 << processBits). Its code is followed by a raw
+    # symbol of processBits bits, which has no code of its own
+    FLAG_ESCAPE: int = 0b00000100
+
+    # Single bitstream only. There is no padding byte in the header, the file ends with the trailer
+    # instead: encoded bit length, padding zeros in the last symbol (INDEX_FIELD_BYTES each).
+    # Nothing is patched after encoding, so the file is written strictly in order
+    FLAG_TRAILER: int = 0b00001000
+
+    # Only with FLAG_TRAILER. The trailer goes on with symbol count and original length
+    # (INDEX_FIELD_BYTES each), so the decoded size is known before decoding
+    FLAG_COUNTS: int = 0b00010000
+
+    # Single bitstream only. Code comes from a trained code table (see CodeTable), the header
+    # has its ID (CodeTable.ID_BITS) instead of the code lengths table. There is no padding byte
+    # in the header, the last byte of file has the padding zeros in the same layout instead
+    FLAG_TABLE_ID: int = 0b00100000
+
+    KNOWN_FLAGS: int = FLAG_BLOCKS | FLAG_BLOCK_TABLES | FLAG_ESCAPE | FLAG_TRAILER | FLAG_COUNTS | FLAG_TABLE_ID
+
+    INDEX_FIELD_BYTES: int = 8
+    TRAILER_BYTES: int = 2 * INDEX_FIELD_BYTES
+    COUNTS_BYTES: int = 2 * INDEX_FIELD_BYTES
+    TABLE_TRAILER_BYTES: int = 1
+    BLOCK_HEADER_BYTES: int = 2 * INDEX_FIELD_BYTES
+    INDEX_ENTRY_BYTES: int = 3 * INDEX_FIELD_BYTES
+    FOOTER_BYTES: int = 2 * INDEX_FIELD_BYTES
+
+    @staticmethod
+    def WriteHeader(writeBits: Callable[[int, int], None], processBits: int, flags: int) -> None:
+        writeBits((ContainerFormat.MAGIC << 4) | ContainerFormat.VERSION, 8)
+        writeBits(processBits, 8)
+        writeBits(flags, 8)
+
+        # Padding zeros. Patched after encoding
+        if ContainerFormat.HasPaddingByte(flags):
+            writeBits(0, 8)
+
+    @staticmethod
+    def HasPaddingByte(flags: int) -> bool:
+        # Files with a trailer have their padding zeros in it
+        return not flags & (ContainerFormat.FLAG_TRAILER | ContainerFormat.FLAG_TABLE_ID)
+
+    @staticmethod
+    def PackPadding(paddingZeros: int, symbolPaddingZeros: int) -> bytes:
+        return ((symbolPaddingZeros << 3) | paddingZeros).to_bytes(1, "big")
+
+    @staticmethod
+    def PackFields(fields: Tuple[int, ...]) -> bytes:
+        return b''.join(field.to_bytes(ContainerFormat.INDEX_FIELD_BYTES, "big") for field in fields)
+
+    @staticmethod
+    def UnpackFields(content: bytes) -> List[int]:
+        fieldBytes: int = ContainerFormat.INDEX_FIELD_BYTES
+        return [int.from_bytes(content[start:start + fieldBytes], "big") for start in range(0, len(content), fieldBytes)]
+
+    @staticmethod
+    def PackBlockIndex(index: List[Tuple[int, int, int]], indexOffset: int) -> bytes:
+        # Blocks terminator, index entries and footer
+        content: bytes = ContainerFormat.PackFields((0, 0))
+        indexOffset += len(content)
+
+        for entry in index:
+            content += ContainerFormat.PackFields(entry)
+
+        return content + ContainerFormat.PackFields((indexOffset, len(index)))
+
+class AdaptiveContainerFormat(object):
+    # Legacy files are a single byte: tree reconstruction interval - 1 (5 bits),
+    # padding zeros at the end of file (3 bits), followed by encoded data
+    MAGIC: bytes = b"AHUF"
+    VERSION: int = 1
+
+    # Header: MAGIC, version (8 bits), engine (8 bits), tree reconstruction interval (8 bits),
+    #         rescale threshold (ContainerFormat.INDEX_FIELD_BYTES)
+    # Trailer: symbol count (ContainerFormat.INDEX_FIELD_BYTES),
+    #          padding zeros at the end of encoded data (8 bits). Last byte of file
+    HEADER_BYTES: int = len(MAGIC) + 3 + ContainerFormat.INDEX_FIELD_BYTES
+    TRAILER_BYTES: int = ContainerFormat.INDEX_FIELD_BYTES + 1
+
+    # Adaptive tree update. Index in ENGINES is written to the header
+    # basic - binary_tree.AdaptiveHuffmanTree, vitter - vitter_huffman_tree.VitterHuffmanTree
+    ENGINE_BASIC: str = "basic"
+    ENGINE_VITTER: str = "vitter"
+    ENGINES: Tuple[str, ...] = (ENGINE_BASIC, ENGINE_VITTER)
+    MAX_RECONSTRUCTION_INTERVAL: int = 255
+
+    # Halved counts of all 256 symbols sum up to at least 256, so lower thresholds would rescale on every symbol
+    MIN_RESCALE_THRESHOLD: int = 512
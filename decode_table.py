@@ -0,0 +1,53 @@
+from typing import Dict, List, Tuple
+
+class DecodeTable(object):
+    def __init__(self, codes: List[Tuple[int, int, int]], primaryBits: int = 10):
+        # codes: list of (symbol, codeValue, codeLength)
+        self.m_maxCodeLength: int = max((length for _, _, length in codes), default=0)
+        self.m_primaryBits: int = max(1, min(primaryBits, self.m_maxCodeLength))
+
+        # (subBits, symbols, lengths) for codes longer than m_primaryBits. A table is indexed by the
+        # next subBits bits after those of the tables before it, subBits <= m_primaryBits
+        self.m_subTables: List[Tuple[int, List[int], List[int]]] = []
+
+        # Primary table indexed by the next m_primaryBits bits of the stream.
+        # Length 0 means "look into m_subTables[m_symbols[index]]", the same in secondary tables
+        self.m_symbols: List[int] = []
+        self.m_lengths: List[int] = []
+        self.m_symbols, self.m_lengths = self.__Build(codes, 0, self.m_primaryBits)
+
+    def __Build(self, codes: List[Tuple[int, int, int]], skipBits: int, tableBits: int) -> Tuple[List[int], List[int]]:
+        # Table of codes whose first skipBits bits are resolved by the tables before it. Longer codes
+        # go one more level down, so a table never outgrows m_primaryBits however long the codes are
+        symbols: List[int] = [0] * (1 << tableBits)
+        lengths: List[int] = [0] * (1 << tableBits)
+
+        longCodes: Dict[int, List[Tuple[int, int, int]]] = {}
+        for symbol, code, length in codes:
+            suffixLength: int = length - skipBits
+            suffix: int = code & ((1 << suffixLength) - 1)
+
+            if suffixLength <= tableBits:
+                self.__Fill(symbols, lengths, tableBits, symbol, suffix, suffixLength, length)
+            else:
+                prefix: int = suffix >> (suffixLength - tableBits)
+                longCodes.setdefault(prefix, []).append((symbol, code, length))
+
+        for prefix, group in longCodes.items():
+            subSkipBits: int = skipBits + tableBits
+            subBits: int = min(max(length for _, _, length in group) - subSkipBits, self.m_primaryBits)
+            subSymbols, subLengths = self.__Build(group, subSkipBits, subBits)
+
+            symbols[prefix] = len(self.m_subTables)
+            lengths[prefix] = 0
+            self.m_subTables.append((subBits, subSymbols, subLengths))
+
+        return symbols, lengths
+
+    def __Fill(self, symbols: List[int], lengths: List[int], tableBits: int, symbol: int, code: int, codeBits: int, codeLength: int) -> None:
+        # Every index whose top codeBits bits equal the code resolves to the symbol
+        shift: int = tableBits - codeBits
+        start: int = code << shift
+        for index in range(start, start + (1 << shift)):
+            symbols[index] = symbol
+            lengths[index] = codeLength
@@ -1,110 +1,178 @@
-from typing import Dict
+from __future__ import annotations
+from typing import Callable, Dict, List, Tuple
 
-import binary_tree, byte_reader, byte_writer
-import argparse, collections, io, logging, sys, time
+import binary_tree, bit_reader, bit_writer, canonical_code, code_table, coder_logging, coder_stats, container_format, decode_table, mapped_file, out_file
+import argparse, concurrent.futures, io, logging, os, sys, time
 
 class HuffmanDecoder(object):
-    def __init__(self, srcFilePath: str, outFilePath: str, srcMaxBufferLength: int = 1024, outMaxBufferLength: int = 1024, debug: bool = False):
+    # Decoder of the current block worker process
+    s_blockWorker: HuffmanDecoder = None
+
+    def __init__(self, srcFilePath: str, outFilePath: str, srcMaxBufferLength: int = 1024, outMaxBufferLength: int = 1024, jobs: int = 1, decodeRange: Tuple[int, int] = None, useMmap: bool = True,
+                 codeTables: List[code_table.CodeTable] = None, progressCallback: coder_stats.ProgressCallback = None, profile: bool = False, debug: bool = False):
         self.m_srcFilePath: str = srcFilePath
         self.m_outFilePath: str = outFilePath
-        self.m_srcFile: io.BufferedReader = None
+        self.m_source: mapped_file.MappedFile = None
+        self.m_useMmap: bool = useMmap
+        self.m_outFile: io.BufferedRandom = None
+
+        # Blocks are decoded by jobs processes. decodeRange = (start, end) bytes of the
+        # original data to decode, None = everything. Both need a block index
+        self.m_jobs: int = jobs
+        self.m_decodeRange: Tuple[int, int] = decodeRange
 
         self.m_srcMaxBufferLength: int = srcMaxBufferLength
         self.m_outMaxBufferLength: int = outMaxBufferLength
         
-        self.m_byteReader: byte_reader.ByteReader = byte_reader.ByteReader(debug=debug)
+        self.m_bitReader: bit_reader.BitReader = None
         self.m_huffmanTreeRootNode: binary_tree.Node = binary_tree.Node()
-        self.m_huffmanCode: Dict[str, str] = {}
+        self.m_huffmanCode: Dict[str, int] = {}
+        self.m_codes: List[Tuple[int, int, int]] = []
+        self.m_decodeTable: decode_table.DecodeTable = None
+
+        # Trained codes by ID, for files with FLAG_TABLE_ID. m_codeTable = the one of the current file
+        self.m_codeTables: Dict[int, code_table.CodeTable] = {codeTable.m_tableId: codeTable for codeTable in codeTables or []}
+        self.m_codeTable: code_table.CodeTable = None
         
         self.m_processBits: int = 0
+        self.m_flags: int = 0
         self.m_paddingZeros: int = 0
+        self.m_symbolPaddingZeros: int = 0
+
+        # From the trailer with FLAG_COUNTS. -1 = not stored
+        self.m_symbolCount: int = -1
+        self.m_originalLength: int = -1
+
+        # Stats of the last Run. Progress is reported on every flush of the out buffer
+        self.m_progressCallback: coder_stats.ProgressCallback = progressCallback
+        self.m_profile: bool = profile
+        self.m_stats: coder_stats.CoderStats = coder_stats.CoderStats()
 
         self.m_debug: bool = debug
-        self.m_logger: logging.Logger = logging.getLogger(__name__)
-        self.m_logger.addHandler(logging.StreamHandler(sys.stdout))
+        self.m_logger: logging.Logger = coder_logging.GetCoderLogger(__name__, sys.stdout)
 
-    def Run(self) -> None:
-        self.m_srcFile = open(self.m_srcFilePath, "rb")
-        
-        startTime: float = time.time()
-        self.DecodeHeader()
+    def Run(self) -> coder_stats.CoderStats:
+        self.m_stats = coder_stats.CoderStats(self.m_progressCallback, self.m_profile)
 
-        self.m_logger.info("Constructing Huffman Code...")
-        self.ConstructHuffmanCode(self.m_huffmanTreeRootNode)
+        # Source is closed on errors as well, a damaged header included
+        with mapped_file.MappedFile(self.m_srcFilePath, self.m_useMmap, self.m_debug) as self.m_source:
+            self.m_bitReader = self.m_source.CreateBitReader(self.m_srcMaxBufferLength)
 
-        self.m_logger.info("Huffman Code | Character")
-        for code in self.m_huffmanCode.keys():
-            byte = self.m_huffmanCode[code]
-            self.m_logger.info(f"{code} | {byte:0{self.m_processBits}b}")
+            with self.m_stats.Measure():
+                with self.m_stats.Phase(coder_stats.CoderStats.HEADER_READ):
+                    self.DecodeHeader()
 
-        self.DecodeSourceFile()
-        endTime: float = time.time()
-        
-        self.m_srcFile.close()
-        self.m_logger.info(f"Done. Decoding time: {endTime - startTime}s")
+                self.m_logger.info("Huffman Code | Character")
+                for byte, code, length in self.m_codes:
+                    self.m_logger.info(f"{code:0{length}b} | {byte:0{self.m_processBits}b}")
 
-    def UpdateReadBuffer(self) -> bool:
-        if self.m_debug:
-            self.m_logger.debug("Trying to update a read buffer...")
-        buffer: bytes = self.m_srcFile.read(self.m_srcMaxBufferLength)
+                if self.m_flags & container_format.ContainerFormat.FLAG_BLOCKS:
+                    self.DecodeBlocks()
+                elif self.m_decodeRange != None:
+                    raise Exception("Range decoding needs a file with a block index")
+                else:
+                    with self.m_stats.Phase(coder_stats.CoderStats.TREE_BUILD):
+                        self.ConstructDecodeTable()
 
-        if buffer == b'':
-            if self.m_debug:
-                self.m_logger.debug("Reached end of file")
-            
-            return False
+                    self.DecodeSourceFile()
 
-        if self.m_debug:
-            self.m_logger.debug("Read buffer updated!")
-        
-        self.m_byteReader.SetBuffer(buffer)
-        return True
+            self.m_bitReader = None
+
+        self.m_logger.info(f"Done. Decoding time: {self.m_stats.m_totalTime}s")
+
+        self.m_stats.m_bytesIn = os.stat(self.m_srcFilePath).st_size
+        self.m_stats.m_bytesOut = os.stat(self.m_outFilePath).st_size
+        self.m_stats.m_symbolCount = max(self.m_symbolCount, 0)
+        return self.m_stats
+
+    def ReadBits(self, count: int) -> int:
+        try:
+            return self.m_bitReader.Read(count)
+        except EOFError:
+            raise EOFError("Reached end of file while decoding header")
 
     def DecodeHeader(self) -> None:
-        self.m_logger.info("Decoding Huffman Tree...")
-        huffmanTreeDebug: str = ""
-        endOfBufferErrorMessage: str = "Reached end of buffer while decoding Huffman Tree"
+        # First 4 bits = versioned container magic or processBits of a legacy file
+        firstBits: int = self.ReadBits(4)
+        self.m_flags = 0
+        self.m_codeTable = None
+
+        if firstBits == container_format.ContainerFormat.MAGIC:
+            self.DecodeCanonicalHeader()
+        else:
+            self.m_processBits = firstBits + 2
+            self.m_huffmanTreeRootNode = binary_tree.Node()
+            self.m_huffmanCode = {}
+            self.DecodeTreeHeader()
+
+            self.m_logger.info("Constructing Huffman Code...")
+            self.ConstructHuffmanCode(self.m_huffmanTreeRootNode)
+            self.m_codes = [(byte, int(code, 2), len(code)) for code, byte in self.m_huffmanCode.items()]
+
+    def DecodeCanonicalHeader(self) -> None:
+        self.m_logger.info("Decoding Huffman Code lengths...")
+
+        version: int = self.ReadBits(4)
+        if version != container_format.ContainerFormat.VERSION:
+            raise Exception(f"Unsupported container version: {version}")
+
+        self.m_processBits = self.ReadBits(8)
+
+        self.m_flags = self.ReadBits(8)
+        if self.m_flags & ~container_format.ContainerFormat.KNOWN_FLAGS:
+            raise Exception(f"Unsupported container flags: {self.m_flags:08b}")
+
+        self.m_paddingZeros, self.m_symbolPaddingZeros = 0, 0
+        if container_format.ContainerFormat.HasPaddingByte(self.m_flags):
+            paddingByte: int = self.ReadBits(8)
+            self.m_paddingZeros = paddingByte & 0b111
+            self.m_symbolPaddingZeros = paddingByte >> 3
+
+        if self.m_debug:
+            self.m_logger.debug(f"processBits: {self.m_processBits}")
+            self.m_logger.debug(f"Padding zero's: {self.m_paddingZeros}")
+            self.m_logger.debug(f"Padding zero's in last symbol: {self.m_symbolPaddingZeros}")
+
+        if self.m_flags & container_format.ContainerFormat.FLAG_TABLE_ID:
+            self.DecodeTableId()
+        elif not self.m_flags & container_format.ContainerFormat.FLAG_BLOCK_TABLES:
+            self.DecodeCodeLengths()
 
-        self.UpdateReadBuffer()
+    def DecodeTableId(self) -> None:
+        tableId: int = self.ReadBits(code_table.CodeTable.ID_BITS)
 
-        # First 4 bits = process Bits
-        for _ in range(4):
-            bit: int = self.m_byteReader.ReadBit()
-            self.m_processBits <<= 1
-            self.m_processBits |= bit
+        if tableId not in self.m_codeTables:
+            raise Exception(f"Encoded with code table {tableId:08x}, which is not given")
 
-        self.m_processBits += 2
+        self.m_codeTable = self.m_codeTables[tableId]
+        if self.m_codeTable.m_processBits != self.m_processBits:
+            raise Exception(f"Code table {tableId:08x} is trained for processBits {self.m_codeTable.m_processBits}, not {self.m_processBits}")
+
+        self.m_codes = self.m_codeTable.m_decodeCodes
+
+    def DecodeCodeLengths(self) -> None:
+        canonicalCode: canonical_code.CanonicalCode = canonical_code.CanonicalCode.Read(self.ReadBits, self.m_processBits)
+        self.m_codes = canonicalCode.GetDecodeCodes()
+
+    def DecodeTreeHeader(self) -> None:
+        self.m_logger.info("Decoding Huffman Tree...")
+        huffmanTreeDebug: str = ""
 
         # 3 bits = padding zeros at the end of file
-        for _ in range(3):
-            bit: int = self.m_byteReader.ReadBit()
-            self.m_paddingZeros <<= 1
-            self.m_paddingZeros |= bit
+        self.m_paddingZeros = self.ReadBits(3)
         
         # 4 bits = padding zeros in byte
-        bytePaddingZeros: int = 0
-        for _ in range(4):
-            bit: int = self.m_byteReader.ReadBit()
-            bytePaddingZeros <<= 1
-            bytePaddingZeros |= bit
-        
-        self.m_paddingZeros += bytePaddingZeros
+        self.m_symbolPaddingZeros = self.ReadBits(4)
 
         if self.m_debug:
             self.m_logger.debug(f"processBits: {self.m_processBits}")
             self.m_logger.debug(f"Padding zero's: {self.m_paddingZeros}")
+            self.m_logger.debug(f"Padding zero's in last symbol: {self.m_symbolPaddingZeros}")
 
         currentNode: binary_tree.Node = self.m_huffmanTreeRootNode
-        
-        def TryToUpdateBuffer() -> bool:
-            if not self.UpdateReadBuffer():
-                self.m_logger.error(endOfBufferErrorMessage)
-                assert False, endOfBufferErrorMessage
-
-            return True
 
         while True:
-            status: int = self.m_byteReader.ReadBit()
+            status: int = self.ReadBits(1)
             newNode: binary_tree.Node = binary_tree.Node()
             if status == 0:
                 huffmanTreeDebug += '0'
@@ -118,27 +186,14 @@ class HuffmanDecoder(object):
                 
                 if self.m_debug:
                     self.m_logger.debug(f"Read 0 from HuffmanTree. Current huffman tree code: {huffmanTreeDebug}")
-            elif status == 1: # Construct new Node with next byte value
+            else: # Construct new Node with next byte value
                 huffmanTreeDebug += '1'
                 
                 if self.m_debug:
                     self.m_logger.debug(f"Read 1 from HuffmanTree. Current huffman tree code: {huffmanTreeDebug}")
                 
-                byte: int = 0
-                for _ in range(self.m_processBits):
-                    result: int = self.m_byteReader.ReadBit()
-
-                    if result == -1:
-                        if TryToUpdateBuffer():
-                            result = self.m_byteReader.ReadBit()
-                        else:
-                            assert False, "Something is wrong"
-                        
-                    byte <<= 1
-                    byte |= result
-                
-                newNode.m_byte = byte
-                huffmanTreeDebug += bin(byte)[2:].rjust(self.m_processBits, '0')
+                newNode.m_byte = self.ReadBits(self.m_processBits)
+                huffmanTreeDebug += bin(newNode.m_byte)[2:].rjust(self.m_processBits, '0')
                 
                 if self.m_debug:
                     self.m_logger.debug(f"Read {newNode.m_byte} from HuffmanTree. Current huffman tree code: {huffmanTreeDebug}")
@@ -154,11 +209,6 @@ class HuffmanDecoder(object):
                     if currentNode.m_parent == None and currentNode.m_left != None and currentNode.m_right != None:
                         # Reached root. Need to end tree construction
                         break
-            elif status == -1: # Reached end of buffer. Update buffer
-                if self.m_debug:
-                    self.m_logger.debug("ReadBit. Updating buffer")
-                
-                TryToUpdateBuffer()
         
         self.m_logger.info(f"Decoded Huffman Tree: {huffmanTreeDebug}")
 
@@ -174,110 +224,338 @@ class HuffmanDecoder(object):
         if node.IsLeaf(): 
             self.m_huffmanCode[currentCode] = node.m_byte
 
+    def ConstructDecodeTable(self) -> None:
+        # Table of a trained code is built once for all of its files
+        if self.m_codeTable != None:
+            self.m_decodeTable = self.m_codeTable.GetDecodeTable()
+        else:
+            self.m_decodeTable = decode_table.DecodeTable(self.m_codes)
+
+        if self.m_debug:
+            self.m_logger.debug(f"Decode table: {self.m_decodeTable.m_primaryBits} primary bits, {len(self.m_decodeTable.m_subTables)} secondary tables, max code length {self.m_decodeTable.m_maxCodeLength}")
+
     def DecodeSourceFile(self) -> None:
-        currentCode: str = ""
-        byteWriter: byte_writer.ByteWriter = byte_writer.ByteWriter(debug=self.m_debug)
-        codeHistory: collections.deque = collections.deque([])
-        codeHistoryCapacity: int = 8
+        bitsLeft: int = self.ReadEncodedBits(os.stat(self.m_srcFilePath).st_size, self.m_source.Read)
+
+        if self.m_debug:
+            self.m_logger.debug(f"Encoded bits to decode: {bitsLeft}")
+
+        self.m_stats.m_encodedBits = bitsLeft
+        self.m_stats.m_progressTotal = max(self.m_originalLength, 0)
 
         self.m_logger.info("Decoding...")
         with open(self.m_outFilePath, "wb") as outFile:
-            while self.m_byteReader.CanRead() or self.UpdateReadBuffer():
-                status: int = self.m_byteReader.ReadBit()
+            if self.m_originalLength >= 0:
+                out_file.OutFile.Preallocate(outFile, self.m_originalLength)
 
-                if status == -1:
-                    continue
-                
-                currentCode += str(status)
-                
-                if self.m_debug:
-                    self.m_logger.debug(f"Current code: {currentCode}")
-                
-                if currentCode in self.m_huffmanCode:
-                    byte: int = self.m_huffmanCode[currentCode]
-                    
-                    if self.m_debug:
-                        self.m_logger.debug(f'Found {currentCode} in huffman code dictionary. Decoded character: "{byte:0{self.m_processBits}b}"')
-
-                    byteWriter.WriteBitsFromByte(byte, self.m_processBits)
-
-                    codeHistory.append(currentCode)
-                    if len(codeHistory) > codeHistoryCapacity:
-                        codeHistory.popleft()
-                    
-                    currentCode = ""
-
-                    if len(byteWriter.m_buffer) > self.m_outMaxBufferLength:
-                        if self.m_debug:
-                            self.m_logger.debug(f"Write buffer exceeds max buffer length limit! Writing to {self.m_outFilePath}...")
-                        
-                        content: bytearray = byteWriter.PopContent()
-                        outFile.write(content)
-
-            assert '1' not in currentCode
-            self.m_paddingZeros -= len(currentCode)
-
-            if self.m_paddingZeros > 0:
+            with self.m_stats.Phase(coder_stats.CoderStats.BODY_DECODE):
+                symbolCount: int = self.DecodeBits(bitsLeft, outFile, reportProgress=True)
+
+            # Encoded bits of a truncated or damaged file do not end on the stored symbol count
+            if self.m_symbolCount >= 0 and symbolCount != self.m_symbolCount:
+                raise Exception(f"Decoded {symbolCount} symbols instead of {self.m_symbolCount}")
+
+            if self.m_originalLength >= 0 and outFile.tell() != self.m_originalLength:
+                raise Exception(f"Decoded {outFile.tell()}B instead of {self.m_originalLength}B")
+
+    def DecodeMessage(self, content: bytes) -> bytes:
+        # Whole encoded file held in memory, like a message of HuffmanEncoder.EncodeMessage.
+        # Kept for many messages, the decoder builds the table of a trained code only once
+        self.m_bitReader = bit_reader.BitReader(buffer=content, debug=self.m_debug)
+        self.m_symbolCount, self.m_originalLength = -1, -1
+        self.DecodeHeader()
+
+        if self.m_flags & container_format.ContainerFormat.FLAG_BLOCKS:
+            raise Exception("Messages encoded in blocks are not supported")
+
+        self.ConstructDecodeTable()
+        bitsLeft: int = self.ReadEncodedBits(len(content), lambda offset, length: content[offset:offset + length])
+
+        message: io.BytesIO = io.BytesIO()
+        self.DecodeBits(bitsLeft, message)
+        return message.getvalue()
+
+    def ReadEncodedBits(self, fileSize: int, read: Callable[[int, int], bytes]) -> int:
+        # Exact amount of encoded bits, so decoding never has to guess where padding starts.
+        # read(offset, length) returns bytes of the file
+        if self.m_flags & container_format.ContainerFormat.FLAG_TRAILER:
+            return self.ReadTrailer(fileSize, read)
+
+        if self.m_flags & container_format.ContainerFormat.FLAG_TABLE_ID:
+            fileSize -= container_format.ContainerFormat.TABLE_TRAILER_BYTES
+            if fileSize * 8 < self.m_bitReader.GetConsumedBits():
+                raise Exception("Reached end of file while decoding trailer")
+
+            paddingByte: int = read(fileSize, container_format.ContainerFormat.TABLE_TRAILER_BYTES)[0]
+            self.m_paddingZeros = paddingByte & 0b111
+            self.m_symbolPaddingZeros = paddingByte >> 3
+
+        return fileSize * 8 - self.m_bitReader.GetConsumedBits() - self.m_paddingZeros
+
+    def ReadTrailer(self, fileSize: int, read: Callable[[int, int], bytes]) -> int:
+        # Returns the encoded bit length
+        trailerBytes: int = container_format.ContainerFormat.TRAILER_BYTES
+        if self.m_flags & container_format.ContainerFormat.FLAG_COUNTS:
+            trailerBytes += container_format.ContainerFormat.COUNTS_BYTES
+
+        trailerOffset: int = fileSize - trailerBytes
+        if trailerOffset < 0:
+            raise Exception("Reached end of file while decoding trailer")
+
+        fields: List[int] = container_format.ContainerFormat.UnpackFields(read(trailerOffset, trailerBytes))
+        encodedBits, self.m_symbolPaddingZeros = fields[:2]
+
+        if self.m_flags & container_format.ContainerFormat.FLAG_COUNTS:
+            self.m_symbolCount, self.m_originalLength = fields[2:]
+
+        if self.m_debug:
+            self.m_logger.debug(f"Trailer: {encodedBits} encoded bits, {self.m_symbolPaddingZeros} padding zero's in last symbol, {self.m_symbolCount} symbols, {self.m_originalLength}B decoded")
+
+        return encodedBits
+
+    def ReadBlockIndex(self) -> List[Tuple[int, int, int]]:
+        # (offset, bit length, original length) of every block
+        footerOffset: int = os.stat(self.m_srcFilePath).st_size - container_format.ContainerFormat.FOOTER_BYTES
+        indexOffset, blockCount = container_format.ContainerFormat.UnpackFields(self.m_source.Read(footerOffset, container_format.ContainerFormat.FOOTER_BYTES))
+
+        content: bytes = self.m_source.Read(indexOffset, blockCount * container_format.ContainerFormat.INDEX_ENTRY_BYTES)
+        if len(content) != blockCount * container_format.ContainerFormat.INDEX_ENTRY_BYTES:
+            raise Exception("Reached end of file while decoding block index")
+
+        fields: List[int] = container_format.ContainerFormat.UnpackFields(content)
+        return [tuple(fields[start:start + 3]) for start in range(0, len(fields), 3)]
+
+    def DecodeBlocks(self) -> None:
+        blockIndex: List[Tuple[int, int, int]] = self.ReadBlockIndex()
+
+        # Decoded blocks follow each other, so their output offsets are running sums of original lengths
+        tasks: List[Tuple[int, int, int, int]] = []
+        outOffset: int = 0
+        for offset, bitLength, originalLength in blockIndex:
+            tasks.append((offset, bitLength, originalLength, outOffset))
+            outOffset += originalLength
+
+        start, end = self.m_decodeRange if self.m_decodeRange != None else (0, outOffset)
+        end = min(end, outOffset)
+        if start < 0 or start > end:
+            raise Exception(f"Bad decode range {start}:{end}. Decoded size is {outOffset}B")
+
+        self.m_decodeRange = (start, end)
+        tasks = [task for task in tasks if task[3] < end and task[3] + task[2] > start]
+
+        # Blocks are written at their own offsets, possibly out of order
+        with open(self.m_outFilePath, "wb") as outFile:
+            out_file.OutFile.Preallocate(outFile, end - start)
+
+        self.m_logger.info(f"Decoding {len(tasks)} of {len(blockIndex)} blocks with {self.m_jobs} jobs...")
+        self.m_stats.m_encodedBits = sum(task[1] for task in tasks)
+        self.m_stats.m_progressTotal = end - start
+        startTime: float = time.perf_counter()
+
+        if self.m_jobs > 1 and len(tasks) > 1:
+            initArgs: Tuple = (self.m_srcFilePath, self.m_outFilePath, self.m_outMaxBufferLength, self.m_processBits, self.m_flags, self.m_codes, self.m_decodeRange, self.m_useMmap, self.m_debug)
+
+            with concurrent.futures.ProcessPoolExecutor(self.m_jobs, initializer=HuffmanDecoder.InitBlockWorker, initargs=initArgs) as executor:
+                for _, (_, _, originalLength, outOffset) in zip(executor.map(HuffmanDecoder.DecodeBlockInWorker, tasks), tasks):
+                    self.m_stats.ReportProgress(min(end, outOffset + originalLength) - start)
+        else:
+            if not self.m_flags & container_format.ContainerFormat.FLAG_BLOCK_TABLES:
+                self.ConstructDecodeTable()
+
+            with open(self.m_outFilePath, "r+b") as self.m_outFile:
+                for task in tasks:
+                    self.DecodeBlock(*task)
+                    self.m_stats.ReportProgress(min(end, task[3] + task[2]) - start)
+
+        # Tables of blocks are built while decoding, so they are a part of it
+        self.m_stats.AddPhaseTime(coder_stats.CoderStats.BODY_DECODE, time.perf_counter() - startTime)
+
+    @staticmethod
+    def InitBlockWorker(srcFilePath: str, outFilePath: str, outMaxBufferLength: int, processBits: int, flags: int, codes: List[Tuple[int, int, int]], decodeRange: Tuple[int, int], useMmap: bool, debug: bool) -> None:
+        decoder: HuffmanDecoder = HuffmanDecoder(srcFilePath, outFilePath, outMaxBufferLength=outMaxBufferLength, decodeRange=decodeRange, useMmap=useMmap, debug=debug)
+        decoder.m_processBits = processBits
+        decoder.m_flags = flags
+        decoder.m_codes = codes
+
+        if not flags & container_format.ContainerFormat.FLAG_BLOCK_TABLES:
+            decoder.ConstructDecodeTable()
+
+        decoder.m_source = mapped_file.MappedFile(srcFilePath, useMmap, debug)
+        decoder.m_outFile = open(outFilePath, "r+b")
+        HuffmanDecoder.s_blockWorker = decoder
+
+    @staticmethod
+    def DecodeBlockInWorker(task: Tuple[int, int, int, int]) -> None:
+        decoder: HuffmanDecoder = HuffmanDecoder.s_blockWorker
+        decoder.DecodeBlock(*task)
+
+        # Worker processes do not flush their files on exit
+        decoder.m_outFile.flush()
+
+    def DecodeBlock(self, offset: int, bitLength: int, originalLength: int, outOffset: int) -> None:
+        if self.m_debug:
+            self.m_logger.debug(f"Block at {offset}: {bitLength} bits, {originalLength}B decoded at {outOffset}")
+
+        block: io.BytesIO = io.BytesIO()
+        self.DecodeBlockData(self.m_source.Read(offset, (bitLength + 7) // 8), bitLength, originalLength, block)
+
+        # Part of the block inside the decode range
+        start, end = self.m_decodeRange
+        first: int = max(start, outOffset)
+        last: int = min(end, outOffset + originalLength)
+
+        self.m_outFile.seek(first - start)
+        self.m_outFile.write(block.getbuffer()[first - outOffset:last - outOffset])
+
+    def DecodeBlockData(self, content: bytes, bitLength: int, originalLength: int, outFile: io.BufferedWriter) -> None:
+        self.m_bitReader = bit_reader.BitReader(buffer=content, debug=self.m_debug)
+
+        if self.m_flags & container_format.ContainerFormat.FLAG_BLOCK_TABLES:
+            self.DecodeCodeLengths()
+            self.ConstructDecodeTable()
+
+        # Only the last block can end with a padded symbol
+        self.m_symbolPaddingZeros = -(originalLength * 8) % self.m_processBits
+        symbolCount: int = self.DecodeBits(bitLength - self.m_bitReader.GetConsumedBits(), outFile)
+
+        if symbolCount != -(-originalLength * 8 // self.m_processBits):
+            raise Exception(f"Decoded {symbolCount} symbols of a block of {originalLength}B")
+
+    def DecodeBits(self, bitsLeft: int, outFile: io.BufferedWriter, reportProgress: bool = False) -> int:
+        # Decodes the next bitsLeft bits of m_bitReader to outFile. Returns the decoded symbol count.
+        # reportProgress only when outFile is the whole output. Blocks go to buffers of their own
+        # and are reported once written
+        table: decode_table.DecodeTable = self.m_decodeTable
+        symbols, lengths, subTables = table.m_symbols, table.m_lengths, table.m_subTables
+        primaryBits: int = table.m_primaryBits
+        maxCodeLength: int = table.m_maxCodeLength
+        processBits: int = self.m_processBits
+
+        # Escape code is followed by a raw symbol, so a window must hold both
+        escapeSymbol: int = 1 << processBits if self.m_flags & container_format.ContainerFormat.FLAG_ESCAPE else -1
+        maxCodeLength += processBits if escapeSymbol >= 0 else 0
+
+        peek = self.m_bitReader.Peek
+        consume = self.m_bitReader.Consume
+
+        # Symbols are decoded from a peeked window of several codes, then consumed at once
+        windowSize: int = max(64, maxCodeLength)
+        primaryMask: int = (1 << primaryBits) - 1
+
+        bitWriter: bit_writer.BitWriter = bit_writer.BitWriter(self.m_outMaxBufferLength, debug=self.m_debug)
+        write = bitWriter.Write
+        symbolCount: int = 0
+
+        while bitsLeft > 0:
+            # Bits past the end of file are peeked as zeros
+            window: int = peek(windowSize)
+            windowBits: int = windowSize
+
+            while windowBits >= maxCodeLength and bitsLeft > 0:
+                index: int = (window >> (windowBits - primaryBits)) & primaryMask
+                length: int = lengths[index]
+
+                if length:
+                    symbol: int = symbols[index]
+                else:
+                    # Long codes go through secondary tables, one per m_primaryBits bits at most
+                    symbol: int = symbols[index]
+                    resolvedBits: int = primaryBits
+                    while not length:
+                        subBits, subSymbols, subLengths = subTables[symbol]
+                        subIndex: int = (window >> (windowBits - resolvedBits - subBits)) & ((1 << subBits) - 1)
+                        symbol = subSymbols[subIndex]
+                        length = subLengths[subIndex]
+                        resolvedBits += subBits
+
+                if symbol == escapeSymbol:
+                    symbol = (window >> (windowBits - length - processBits)) & ((1 << processBits) - 1)
+                    length += processBits
+
+                windowBits -= length
+                bitsLeft -= length
+
+                if bitsLeft > 0:
+                    write(symbol, processBits)
+                else:
+                    # Every symbol before the last one is processBits bits long, so they are not counted one by one
+                    symbolCount = bitWriter.GetBitsWritten() // processBits + 1
+                    self.WriteLastSymbol(bitWriter, symbol)
+
+            consume(windowSize - windowBits)
+
+            if bitWriter.m_length >= self.m_outMaxBufferLength:
                 if self.m_debug:
-                    self.m_logger.debug(f"{self.m_paddingZeros} padding zeros left")
-
-                while self.m_paddingZeros and '1' not in codeHistory[-1]:
-                    lastCode = codeHistory[-1]
-                    codeHistory.pop()
-
-                    lastByte: int = self.m_huffmanCode[lastCode]
-                    byteStr: str = bin(lastByte)[2:]
-                    byteLength: int = len(byteStr)
-                    amountOfZeros: int = byteStr.count('0')
-
-                    if self.m_debug:
-                        self.m_logger.debug(f"Last used huffman code: {lastCode} ({lastByte:0{self.m_processBits}b}). Byte length to delete from buffer: {byteLength}")
-                    
-                    if self.m_paddingZeros != amountOfZeros:
-                        while byteLength > 0:
-                            byteWriter.DeleteLastBit()
-                            byteLength -= 1
-                        self.m_paddingZeros -= len(lastCode)
-                    else:
-                        byteLength = amountOfZeros
-                        while byteLength > 0:
-                            byteWriter.DeleteLastBit()
-                            byteLength -= 1
-                        self.m_paddingZeros = 0
-                    
-                    if self.m_debug:
-                        self.m_logger.debug(f"{self.m_paddingZeros} padding zeros left")
-
-                while self.m_paddingZeros > 0:
-                    byteWriter.DeleteLastBit()
-                    self.m_paddingZeros -= 1
-
-                    if self.m_debug:
-                        self.m_logger.debug(f"{self.m_paddingZeros} padding zeros left")
-
-            if len(byteWriter.m_buffer) > 0:
-                content: bytearray = byteWriter.PopContent(getAll=True)
-                outFile.write(content)
+                    self.m_logger.debug(f"Write buffer exceeds max buffer length limit! Writing to {self.m_outFilePath}...")
+
+                outFile.write(bitWriter.PopContent())
+
+                if reportProgress:
+                    self.m_stats.ReportProgress(outFile.tell())
+
+        assert bitsLeft == 0, "Encoded data does not end on a code boundary"
+        outFile.write(bitWriter.PopContent())
+
+        if reportProgress:
+            self.m_stats.ReportProgress(outFile.tell())
+
+        return symbolCount
+
+    def WriteLastSymbol(self, bitWriter: bit_writer.BitWriter, symbol: int) -> None:
+        # The last symbol was padded with zeros up to processBits
+        length: int = self.m_processBits - self.m_symbolPaddingZeros
+
+        # Files from older encoders could miss the padding of a last symbol made only of zeros
+        extraBits: int = (bitWriter.GetBitsWritten() + length) % 8
+        if extraBits > 0:
+            self.m_logger.warning(f"Decoded data is not byte aligned. Dropping {extraBits} trailing bits")
+            length -= extraBits
+
+        bitWriter.Write(symbol >> (self.m_processBits - length), length)
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("srcFile", help = "Path to the source file")
     parser.add_argument("outFile", help = "Path to the out file")
     parser.add_argument("-l", "--logLevel", type = int, default = 2, help = "To configure logging messages. 1 - DEBUG, 2 - INFO, 3 - WARNING, 4 - ERROR, 5 - CRITICAL")
+    parser.add_argument("--logFile", dest="logFile", default = "logs/decoder.log", help = "Log file. Its directory is created if missing. By default logs/decoder.log")
+    parser.add_argument("-j", "--jobs", dest="jobs", type = int, default = 1, help = "Processes decoding blocks in parallel. By default 1")
+    parser.add_argument("--profile", dest="profile", action = "store_true", help = "Profile decoding with cProfile and print the slowest functions")
+    parser.add_argument("--noMmap", dest="useMmap", action = "store_false", help = "Read the source in chunks instead of mapping it to memory")
+    parser.add_argument("-r", "--range", dest="decodeRange", default = None, help = "START:END. Decode only these bytes of the original file. Needs a file encoded in blocks")
+    parser.add_argument("-T", "--table", dest="tables", action = "append", default = [], help = "Code table made by code_table.py. Can be given several times, the file picks its own by ID")
     args = parser.parse_args()
 
     srcFile: str = args.srcFile
     outFile: str = args.outFile
     logLevel: int = args.logLevel
+    jobs: int = args.jobs
+    decodeRange: Tuple[int, int] = None
     
     if logLevel <= 0 or logLevel > 5:
         raise Exception("Bad logLevel")
+
+    if jobs <= 0:
+        raise Exception("Bad jobs")
+
+    if args.decodeRange != None:
+        start, _, end = args.decodeRange.partition(":")
+
+        if not start.isdigit() or not end.isdigit():
+            raise Exception("Bad range")
+
+        decodeRange = (int(start), int(end))
     
-    logging.basicConfig(level = logLevel * 10, filename = "logs/decoder.log", filemode = "w",
-        format = "%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    coder_logging.ConfigureLogging(logLevel, args.logFile)
+
+    codeTables: List[code_table.CodeTable] = [code_table.CodeTable.Load(filePath) for filePath in args.tables]
+
+    decoder: HuffmanDecoder = HuffmanDecoder(srcFile, outFile, jobs = jobs, decodeRange = decodeRange, useMmap = args.useMmap, codeTables = codeTables, profile = args.profile, debug = logLevel == 1)
+    stats: coder_stats.CoderStats = decoder.Run()
+    stats.Print(srcFile, outFile, sys.stdout)
 
-    decoder: HuffmanDecoder = HuffmanDecoder(srcFile, outFile, debug = logLevel == 1)
-    decoder.Run()
+    if args.profile:
+        print(stats.GetProfile())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
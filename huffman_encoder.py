@@ -1,268 +1,495 @@
-from typing import Dict, List, Tuple
+from typing import Dict, List, TextIO, Tuple
 
-import binary_tree, byte_analyzer, byte_reader, byte_writer
-import argparse, io, logging, os, sys, time
+import analysis_cache, bit_writer, byte_analyzer, canonical_code, code_table, coder_logging, coder_stats, container_format, huffman_tree_builder, mapped_file, out_file, symbol_extractor
+import argparse, concurrent.futures, contextlib, functools, io, logging, os, sys, time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 class HuffmanEncoder(object):
-    def __init__(self, srcFilePath: str, outFilePath: str, processBits: int, srcMaxBufferLength: int = 1024, outMaxBufferLength: int = 1024, debug: bool = False):
+    DEFAULT_BLOCK_SIZE: int = 4 * 1024 * 1024
+
+    def __init__(self, srcFilePath: str, outFilePath: str, processBits: int, srcMaxBufferLength: int = 1024, outMaxBufferLength: int = 1024, treeBuildMethod: str = huffman_tree_builder.HuffmanTreeBuilder.HEAP, maxCodeLength: int = 0,
+                 blockSize: int = 0, jobs: int = 1, blockTables: bool = False, sampleSize: int = 0, useMmap: bool = True, codeTable: code_table.CodeTable = None,
+                 analysisCache: analysis_cache.AnalysisCache = None, progressCallback: coder_stats.ProgressCallback = None, profile: bool = False, debug: bool = False):
         self.m_srcFilePath: str = srcFilePath
         self.m_outFilePath: str = outFilePath
-        self.m_outFile: io.BufferedWriter = None
+        self.m_outFile: out_file.OutFile = None
+        self.m_outFileSize: int = 0
+
+        # Messages go to stderr when encoded data goes to stdout
+        self.m_messageFile: TextIO = sys.stderr if out_file.OutFile.IsStdout(outFilePath) else sys.stdout
+        self.m_srcFile: io.BufferedReader = None
+
+        # Source is mapped to memory instead of read in srcMaxBufferLength chunks
+        self.m_useMmap: bool = useMmap
 
         self.m_processBits: int = processBits
         self.m_srcMaxBufferLength: int = srcMaxBufferLength
         self.m_outMaxBufferLength: int = outMaxBufferLength
+        self.m_treeBuildMethod: str = treeBuildMethod
+
+        # 0 = code length is not limited
+        self.m_maxCodeLength: int = maxCodeLength
+        self.m_codeLengthLimitCost: int = 0
+
+        # 0 = single bitstream. Otherwise the source is split into blocks of blockSize bytes,
+        # which are encoded by jobs processes. blockTables = a code per block instead of a shared one
+        self.m_jobs: int = jobs
+        self.m_blockTables: bool = blockTables
+        self.m_blockSize: int = blockSize
+
+        if self.m_blockSize == 0 and (jobs > 1 or blockTables):
+            self.m_blockSize = self.DEFAULT_BLOCK_SIZE
+
+        # 0 = the whole source is analyzed before encoding. Otherwise the code is built from the
+        # first sampleSize bytes and the source is read once. Symbols missing from the sample
+        # are written as the escape code followed by the raw symbol
+        self.m_sampleSize: int = max(sampleSize // processBits, 1) * processBits if sampleSize > 0 else 0
+        self.m_sample: bytes = b''
+        self.m_escapeSymbol: int = -1
+        self.m_samplingCost: int = 0
+
+        if self.m_sampleSize > 0 and self.m_blockSize > 0:
+            raise Exception("Sampling can not be used with blocks")
+
+        # Trained code. The source is not analyzed and the header has the table ID instead of the code
+        self.m_codeTable: code_table.CodeTable = codeTable
+
+        if codeTable != None and (self.m_sampleSize > 0 or self.m_blockSize > 0):
+            raise Exception("Code table can not be used with sampling or blocks")
+
+        if codeTable != None and codeTable.m_processBits != processBits:
+            raise Exception(f"Code table is trained for processBits {codeTable.m_processBits}, not {processBits}")
+
+        # Analysis and code of a whole source are looked up by its fingerprint before analyzing it
+        self.m_analysisCache: analysis_cache.AnalysisCache = analysisCache
+        self.m_cacheKey: str = None
 
         self.m_bytePopularity: Dict[Tuple[int, str], int] = {}
-        self.m_huffmanTreeRootNode: binary_tree.Node = None
-        self.m_huffmanCode: Dict[str, str] = {}
-        self.m_huffmanHeaderDebug: str = ""
+        self.m_symbolPopularity: Dict[int, int] = {}
+        self.m_canonicalCode: canonical_code.CanonicalCode = None
+        self.m_huffmanCode: Dict[int, Tuple[int, int]] = {}
+
+        # Stats of the last Run. Progress is reported on every flush of the out buffer
+        self.m_progressCallback: coder_stats.ProgressCallback = progressCallback
+        self.m_profile: bool = profile
+        self.m_stats: coder_stats.CoderStats = None
 
         self.m_debug: bool = debug
 
-        self.m_paddingZeros: int = 0
+        self.m_encodedBits: int = 0
+        self.m_symbolPaddingZeros: int = 0
+        self.m_symbolCount: int = 0
+        self.m_originalLength: int = 0
         
-        self.m_logger: logging.Logger = logging.getLogger(__name__)
-        self.m_logger.addHandler(logging.StreamHandler(sys.stdout))
+        self.m_logger: logging.Logger = coder_logging.GetCoderLogger(__name__, self.m_messageFile)
+
+    def Run(self) -> coder_stats.CoderStats:
+        self.m_stats = coder_stats.CoderStats(self.m_progressCallback, self.m_profile)
+        self.m_stats.m_progressTotal = os.stat(self.m_srcFilePath).st_size
+
+        # Sampled source is opened by the analysis and read on by encoding. It is closed
+        # here, so it does not leak when building the code or writing the header fails
+        try:
+            with self.m_stats.Measure():
+                if self.m_codeTable != None:
+                    self.m_canonicalCode = self.m_codeTable.m_canonicalCode
+                    self.m_huffmanCode = self.m_codeTable.GetCodes()
+                    self.m_escapeSymbol = self.m_codeTable.m_escapeSymbol
+                elif not self.m_blockTables:
+                    isCached: bool = False
+                    if self.m_analysisCache != None and self.m_sampleSize == 0:
+                        with self.m_stats.Phase(coder_stats.CoderStats.ANALYZE):
+                            isCached = self.LoadCachedAnalysis()
+
+                    if not isCached:
+                        with self.m_stats.Phase(coder_stats.CoderStats.ANALYZE):
+                            self.AnalyzeSourceFile()
+
+                        if self.m_debug:
+                            self.m_logger.debug("Byte Popularity Dict content")
+                            for byte in self.m_bytePopularity.keys():
+                                self.m_logger.debug(f"{byte[0]:0{self.m_processBits}b} \"{byte[1]}\" | {self.m_bytePopularity[byte]}")
+
+                        with self.m_stats.Phase(coder_stats.CoderStats.TREE_BUILD):
+                            self.ConstructHuffmanCode()
+
+                        if self.m_cacheKey != None:
+                            self.m_analysisCache.Put(self.m_cacheKey, self.m_bytePopularity, self.m_canonicalCode.m_codeLengths, self.m_codeLengthLimitCost)
+
+                    self.m_logger.info("Binary | Huffman Code")
+                    for byte in sorted(self.m_huffmanCode.keys()):
+                        code, length = self.m_huffmanCode[byte]
+                        self.m_logger.info(f"{byte:0{self.m_processBits}b} | {code:0{length}b}")
+            
+                if self.m_blockSize > 0:
+                    self.EncodeBlocks()
+                else:
+                    self.Encode()
+        finally:
+            if self.m_srcFile != None:
+                self.m_srcFile.close()
+                self.m_srcFile = None
+
+        self.m_logger.info(f"Done. Encoding time: {self.m_stats.m_totalTime}s")
+
+        # Counted while encoding. A sampled source may be a pipe, with no size to stat
+        stats: coder_stats.CoderStats = self.m_stats
+        stats.m_bytesIn = self.m_originalLength
+        stats.m_bytesOut = self.m_outFileSize
+        stats.m_encodedBits = self.m_encodedBits
+        stats.m_symbolCount = self.m_symbolCount
+
+        # Popularity of a sample or of no block at all does not describe the whole source
+        if self.m_sampleSize == 0 and not self.m_blockTables and self.m_codeTable == None:
+            stats.m_entropy = coder_stats.CoderStats.Entropy(self.m_symbolPopularity)
+
+        if self.m_codeLengthLimitCost > 0:
+            stats.m_extra["codeLengthLimitCost"] = self.m_codeLengthLimitCost
+
+        if self.m_sampleSize > 0 and self.m_escapeSymbol >= 0:
+            stats.m_extra["samplingCost"] = self.m_samplingCost
+
+        if self.m_analysisCache != None:
+            stats.m_extra.update(self.m_analysisCache.GetCounters())
+
+        return stats
+
+    def PrintCosts(self) -> None:
+        # Compression lost to the code length limit and to sampling
+        srcFileSize: int = self.m_stats.m_bytesIn
+        outFileSize: int = self.m_outFileSize
+
+        if self.m_codeLengthLimitCost > 0:
+            # Header size barely depends on code lengths, so only the body differs
+            unlimitedOutFileSize: float = outFileSize - self.m_codeLengthLimitCost / 8
+            print(f"Code length limit of {self.m_maxCodeLength} bits costs {self.m_codeLengthLimitCost} bits ({round(100 * self.m_codeLengthLimitCost / (unlimitedOutFileSize * 8), 3)}%)", file=self.m_messageFile)
+            print(f"Compression ratio without code length limit: {srcFileSize / unlimitedOutFileSize}", file=self.m_messageFile)
+
+        if self.m_sampleSize > 0 and self.m_escapeSymbol >= 0:
+            unsampledOutFileSize: float = outFileSize - self.m_samplingCost / 8
+            print(f"Sampling first {self.m_sampleSize}B costs {self.m_samplingCost} bits ({round(100 * self.m_samplingCost / (unsampledOutFileSize * 8), 3)}%)", file=self.m_messageFile)
+            print(f"Compression ratio without sampling: {srcFileSize / unsampledOutFileSize}", file=self.m_messageFile)
 
-    def Run(self) -> None:
-        startTime: float = time.time()
-        self.AnalyzeSourceFile()
+    def AnalyzeSourceFile(self) -> None:
+        if self.m_sampleSize > 0:
+            # Source stays open until the end of Run, encoding continues right after the sample
+            self.m_srcFile = open(self.m_srcFilePath, "rb")
+            self.m_sample = self.m_srcFile.read(self.m_sampleSize)
 
-        if self.m_debug:
-            self.m_logger.debug("Byte Popularity Dict content")
-            for byte in self.m_bytePopularity.keys():
-                self.m_logger.debug(f"{byte[0]:0{self.m_processBits}b} \"{byte[1]}\" | {self.m_bytePopularity[byte]}")
-        
-        self.ConstructHuffmanTree()
+            self.m_logger.info(f"Analyzing first {len(self.m_sample)}B of {self.m_srcFilePath}...")
+            self.m_bytePopularity = byte_analyzer.ByteAnalyzer(None, self.m_processBits, buffer=self.m_sample, debug=self.m_debug).Analyze()
+            return
+
+        self.m_logger.info(f"Analyzing {self.m_srcFilePath}...")
+        self.m_bytePopularity = byte_analyzer.ByteAnalyzer(self.m_srcFilePath, self.m_processBits, useMmap=self.m_useMmap, debug=self.m_debug).Analyze()
+
+    def LoadCachedAnalysis(self) -> bool:
+        # Returns True when the source was analyzed before and has not changed since
+        fingerprint: Tuple[int, int, int] = analysis_cache.AnalysisCache.Fingerprint(self.m_srcFilePath, self.m_useMmap)
+        self.m_cacheKey = analysis_cache.AnalysisCache.MakeKey(fingerprint, self.m_processBits, self.m_treeBuildMethod, self.m_maxCodeLength)
+
+        cached: Tuple[Dict[Tuple[int, str], int], Dict[int, int], int] = self.m_analysisCache.Get(self.m_cacheKey)
+        if cached == None:
+            return False
+
+        self.m_logger.info(f"Analysis of {self.m_srcFilePath} is cached")
+        self.m_bytePopularity, codeLengths, self.m_codeLengthLimitCost = cached
+        self.m_symbolPopularity = byte_analyzer.ByteAnalyzer.SymbolPopularity(self.m_bytePopularity)
+
+        self.m_canonicalCode = canonical_code.CanonicalCode(codeLengths)
+        self.m_huffmanCode = self.m_canonicalCode.m_codes
+        return True
 
+    def ConstructHuffmanCode(self) -> None:
         self.m_logger.info("Constructing Huffman Code...")
-        self.ConstructHuffmanCode(self.m_huffmanTreeRootNode)
 
-        self.m_logger.info("Binary | Huffman Code")
-        for byte in sorted(self.m_huffmanCode.keys()):
-            code = self.m_huffmanCode[byte]
-            self.m_logger.info(f"{byte} | {code}")
-        
-        self.Encode()
-        endTime: float = time.time()
-        
-        self.m_logger.info(f"Done. Encoding time: {endTime - startTime}s")
+        self.m_symbolPopularity = byte_analyzer.ByteAnalyzer.SymbolPopularity(self.m_bytePopularity)
+
+        if len(self.m_sample) == self.m_sampleSize > 0:
+            # Source may go on after the sample. Escape is one past the largest symbol
+            self.m_escapeSymbol = 1 << self.m_processBits
+            self.m_symbolPopularity[self.m_escapeSymbol] = 1
+
+        codeLengths, self.m_codeLengthLimitCost = canonical_code.CanonicalCode.BuildCodeLengths(self.m_symbolPopularity, self.m_treeBuildMethod, self.m_maxCodeLength)
+
+        if self.m_codeLengthLimitCost > 0:
+            self.m_logger.info(f"Limiting code length to {self.m_maxCodeLength} bits costs {self.m_codeLengthLimitCost} bits")
+
+        self.m_canonicalCode = canonical_code.CanonicalCode(codeLengths)
+        self.m_huffmanCode = self.m_canonicalCode.m_codes
+
+    def Encode(self) -> None:
+        bitWriter: bit_writer.BitWriter = bit_writer.BitWriter(self.m_outMaxBufferLength, debug=self.m_debug)
+
+        # Padding zeros are known only after encoding, so they go to the trailer
+        if self.m_codeTable != None:
+            flags: int = container_format.ContainerFormat.FLAG_TABLE_ID
+        else:
+            flags: int = container_format.ContainerFormat.FLAG_TRAILER | container_format.ContainerFormat.FLAG_COUNTS
+
+        if self.m_escapeSymbol >= 0:
+            flags |= container_format.ContainerFormat.FLAG_ESCAPE
+
+        with self.m_stats.Phase(coder_stats.CoderStats.HEADER_WRITE):
+            container_format.ContainerFormat.WriteHeader(bitWriter.Write, self.m_processBits, flags)
+
+            if self.m_codeTable != None:
+                bitWriter.Write(self.m_codeTable.m_tableId, code_table.CodeTable.ID_BITS)
+            else:
+                self.m_logger.info(f"Writing huffman header...")
+                self.m_canonicalCode.Write(bitWriter.Write, self.m_processBits)
+
+        self.m_stats.m_headerBits = bitWriter.GetBitsWritten()
+        self.m_logger.info(f"Header: {bitWriter.GetBitsWritten()} bits")
+
+        with out_file.OutFile(self.m_outFilePath) as self.m_outFile:
+            startTime: float = time.perf_counter()
+            self.EncodeSourceFile(bitWriter)
+
+            if self.m_debug:
+                self.m_logger.debug(f"Encoded {self.m_encodedBits} bits. Last symbol has {self.m_symbolPaddingZeros} padding zeros")
+
+            if self.m_codeTable != None:
+                paddingZeros: int = -(self.m_stats.m_headerBits + self.m_encodedBits) % 8
+                self.m_outFile.Write(container_format.ContainerFormat.PackPadding(paddingZeros, self.m_symbolPaddingZeros))
+            else:
+                self.m_outFile.Write(container_format.ContainerFormat.PackFields((self.m_encodedBits, self.m_symbolPaddingZeros, self.m_symbolCount, self.m_originalLength)))
+            self.m_outFileSize = self.m_outFile.GetBytesWritten()
+
+            # Writes are timed on their own
+            self.m_stats.AddPhaseTime(coder_stats.CoderStats.BODY_ENCODE, time.perf_counter() - startTime - self.m_outFile.m_writeTime)
+            self.m_stats.AddPhaseTime(coder_stats.CoderStats.IO, self.m_outFile.m_writeTime)
+
+    def EncodeBlocks(self) -> None:
         srcFileSize: int = os.stat(self.m_srcFilePath).st_size
-        outFileSize: int = os.stat(self.m_outFilePath).st_size
-        print(f"'{self.m_srcFilePath}' size: {srcFileSize}B, {round(srcFileSize / 1024, 3)}Kb, {round(srcFileSize / (1024 ** 2), 3)}Mb")
-        print(f"'{self.m_outFilePath}' size: {outFileSize}B, {round(outFileSize / 1024, 3)}Kb, {round(outFileSize / (1024 ** 2), 3)}Mb")
-        print(f"Compression ratio: {srcFileSize / outFileSize}")
 
-    def AnalyzeSourceFile(self) -> None:
-        self.m_logger.info(f"Analyzing {self.m_srcFilePath}...")
-        self.m_bytePopularity = byte_analyzer.ByteAnalyzer(self.m_srcFilePath, self.m_processBits, debug=self.m_debug).Analyze()
+        # processBits bytes hold exactly 8 whole symbols, so only the last block has a padded symbol
+        blockSize: int = max(self.m_blockSize // self.m_processBits, 1) * self.m_processBits
+        offsets: List[int] = list(range(0, srcFileSize, blockSize))
+        lengths: List[int] = [min(blockSize, srcFileSize - offset) for offset in offsets]
 
-    def ConstructHuffmanTree(self) -> None:
-        self.m_logger.info("Constructing Huffman Tree...")
+        flags: int = container_format.ContainerFormat.FLAG_BLOCKS
+        if self.m_blockTables:
+            flags |= container_format.ContainerFormat.FLAG_BLOCK_TABLES
 
-        leafs: List[binary_tree.Node] = []
+        # Padding zeros stay 0. Blocks know their own lengths
+        bitWriter: bit_writer.BitWriter = bit_writer.BitWriter(self.m_outMaxBufferLength, debug=self.m_debug)
 
-        for item in self.m_bytePopularity.items():
-            byte, count = item[0], item[1]
-            node: binary_tree.Node = binary_tree.Node(byte, count)
+        with self.m_stats.Phase(coder_stats.CoderStats.HEADER_WRITE):
+            container_format.ContainerFormat.WriteHeader(bitWriter.Write, self.m_processBits, flags)
 
-            leafs.append(node)
+            if not self.m_blockTables:
+                self.m_logger.info(f"Writing huffman header...")
+                self.m_canonicalCode.Write(bitWriter.Write, self.m_processBits)
 
-        while len(leafs) > 1:
-            leafs = sorted(leafs, key = lambda leaf: leaf.m_count)
+            bitWriter.AlignToByte()
 
-            left: binary_tree.Node = leafs.pop(0)
-            right: binary_tree.Node = leafs.pop(0)
+        self.m_stats.m_headerBits = bitWriter.GetBitsWritten()
+        self.m_logger.info(f"Header: {bitWriter.GetBitsWritten()} bits")
+        self.m_logger.info(f"Encoding {self.m_srcFilePath} in {len(offsets)} blocks of {blockSize}B with {self.m_jobs} jobs")
 
-            newByte: int = left.m_byte + right.m_byte
-            newCount: int = left.m_count + right.m_count
+        # Shared code is sent with every block. None = every block builds its own code
+        canonicalCode: canonical_code.CanonicalCode = None if self.m_blockTables else self.m_canonicalCode
+        encodeBlock = functools.partial(HuffmanEncoder.EncodeBlock, self.m_srcFilePath, self.m_useMmap, self.m_processBits, canonicalCode, self.m_treeBuildMethod, self.m_maxCodeLength)
 
-            newNode: binary_tree.Node = binary_tree.Node(newByte, newCount)
-            newNode.AddLeft(left)
-            newNode.AddRight(right)
+        index: List[Tuple[int, int, int]] = []
+        self.m_encodedBits = 0
 
-            leafs.append(newNode)
+        with out_file.OutFile(self.m_outFilePath) as outFile:
+            startTime: float = time.perf_counter()
+            outFile.Write(bitWriter.PopContent())
 
-        self.m_huffmanTreeRootNode = leafs.pop(0)
+            with concurrent.futures.ProcessPoolExecutor(self.m_jobs) if self.m_jobs > 1 else contextlib.nullcontext() as executor:
+                blocks = executor.map(encodeBlock, offsets, lengths) if executor != None else map(encodeBlock, offsets, lengths)
 
-    def ConstructHuffmanCode(self, node: binary_tree.Node, currentCode: str = "") -> None:
-        left, right = node.m_left, node.m_right
-    
-        if left != None:
-            self.ConstructHuffmanCode(left, currentCode + '0')
+                for length, (content, bitLength) in zip(lengths, blocks):
+                    outFile.Write(container_format.ContainerFormat.PackFields((bitLength, length)))
+                    position: int = outFile.GetBytesWritten()
 
-        if right != None:
-            self.ConstructHuffmanCode(right, currentCode + '1')
+                    if self.m_debug:
+                        self.m_logger.debug(f"Block {len(index)}: offset {position}, {bitLength} bits, {length}B of source")
 
-        if node.IsLeaf():
-            self.m_huffmanCode[node.m_byte[1]] = currentCode
+                    index.append((position, bitLength, length))
+                    outFile.Write(content)
 
-    def Encode(self) -> None:
-        self.m_outFile: io.BufferedWriter = open(self.m_outFilePath, "wb")
-        byteWriter: byte_writer.ByteWriter = byte_writer.ByteWriter(debug=self.m_debug)
+                    self.m_encodedBits += bitLength
+                    self.m_stats.ReportProgress(offsets[len(index) - 1] + length)
 
-        # First 4 bits for processBits
-        byteWriter.WriteBitsFromByte(self.m_processBits - 2, 4)
-        
-        # 3 bits for padding zero's at the end of file
-        for _ in range(3):
-            byteWriter.WriteBit(0)
-        
-        # 4 bits for padding zero's in byte
-        for _ in range(4):
-            byteWriter.WriteBit(0)
+            outFile.Write(container_format.ContainerFormat.PackBlockIndex(index, outFile.GetBytesWritten()))
+            self.m_outFileSize = outFile.GetBytesWritten()
 
-        self.m_logger.info(f"Writing huffman header...")
-        self.EncodeHuffmanHeader(self.m_huffmanTreeRootNode, byteWriter)
-        self.m_logger.info(f"Header: {self.m_huffmanHeaderDebug}")
-        
-        self.EncodeSourceFile(byteWriter)
-        self.m_outFile.close()
+            # Only the last block can end with a padded symbol
+            self.m_originalLength = srcFileSize
+            self.m_symbolCount = -(-srcFileSize * 8 // self.m_processBits)
 
-        # Need to add info about zero's at the end of file
-        if self.m_paddingZeros > 0:
-            if self.m_debug:
-                self.m_logger.debug(f"Byte writer has {self.m_paddingZeros} padding zeros")
-            
-            with open(self.m_outFilePath, "r+b") as outFile:
-                firstByte: int = int.from_bytes(outFile.read(1), byteorder="big")
-                
-                if self.m_debug:
-                    self.m_logger.debug(f"First byte: {firstByte:08b}")
-                
-                firstByte |= self.m_paddingZeros << 1
-                
-                if self.m_debug:
-                    self.m_logger.debug(f"Updated to: {firstByte:08b}")
-                
-                outFile.seek(0)
-                outFile.write(bytearray([firstByte]))
-
-        self.m_paddingZeros = 0
-
-        # Find byte with padding zeros
-        for byte in self.m_bytePopularity.keys():
-            byteInt: int = int(byte[1], 2)
-            if byte[0] != byteInt:
-                if self.m_debug:
-                    self.m_logger.debug(f"Found byte with padding zeros: {byte[1]}. True byte value: {byte[0]:0{self.m_processBits}b}")
-
-                while byte[0] != byteInt:
-                    byteInt >>= 1
-                    self.m_paddingZeros += 1
-                break
-
-        # Need to add info about zero's at the end of file
-        if self.m_paddingZeros > 0:
-            if self.m_debug:
-                self.m_logger.debug(f"Byte writer has {self.m_paddingZeros} padding zeros")
-            
-            with open(self.m_outFilePath, "r+b") as outFile:
-                firstByte: int = int.from_bytes(outFile.read(1), byteorder="big")
-                
-                if self.m_debug:
-                    self.m_logger.debug(f"First byte: {firstByte:08b}")
-                
-                firstByte |= self.m_paddingZeros >> 3
-                
-                if self.m_debug:
-                    self.m_logger.debug(f"Updated to: {firstByte:08b}")
-
-                secondByte: int = int.from_bytes(outFile.read(1), byteorder="big")
-                if self.m_debug:
-                    self.m_logger.debug(f"Second byte: {secondByte:08b}")
-
-                secondByte |= (self.m_paddingZeros & 0b00000111) << 5
-
-                if self.m_debug:
-                    self.m_logger.debug(f"Updated to: {secondByte:08b}")
-                
-                outFile.seek(0)
-                outFile.write(bytearray([firstByte, secondByte]))
-
-    def EncodeHuffmanHeader(self, node: binary_tree.Node, byteWriter: byte_writer.ByteWriter) -> None:
-        if not node.IsLeaf() and node.m_parent != None:
-            self.m_huffmanHeaderDebug += '0'
-            byteWriter.WriteBit(0)
-            
-            if self.m_debug:
-                self.m_logger.debug(f"Appended 0 to header. Current header = {self.m_huffmanHeaderDebug}")
-        
-        if node.m_left != None:
-            self.EncodeHuffmanHeader(node.m_left, byteWriter)
-            
-        if node.m_right != None:
-            self.EncodeHuffmanHeader(node.m_right, byteWriter)
-            
-        if node.IsLeaf():
-            self.m_huffmanHeaderDebug += '1'
-            byteWriter.WriteBit(1)
+            # Blocks are encoded while the previous ones are written, so encoding includes waiting for workers
+            self.m_stats.AddPhaseTime(coder_stats.CoderStats.BODY_ENCODE, time.perf_counter() - startTime - outFile.m_writeTime)
+            self.m_stats.AddPhaseTime(coder_stats.CoderStats.IO, outFile.m_writeTime)
 
-            if self.m_debug:
-                 self.m_logger.debug(f"Appended 1 to header. Current header = {self.m_huffmanHeaderDebug}")
-            
-            byteToWrite: int = int(node.m_byte[1], 2)
-            byteWriter.WriteBitsFromByte(byteToWrite, self.m_processBits)
-            self.m_huffmanHeaderDebug += node.m_byte[1]
-        
-        if len(byteWriter.m_buffer) >= self.m_outMaxBufferLength:
-            if self.m_debug:
-                self.m_logger.debug(f"ByteWriter buffer filled while trying to write huffman header! Writing content to {self.m_outFilePath}")
-            
-            content = byteWriter.PopContent()
-            self.m_outFile.write(content)
+    @staticmethod
+    def EncodeBlock(srcFilePath: str, useMmap: bool, processBits: int, canonicalCode: canonical_code.CanonicalCode, treeBuildMethod: str, maxCodeLength: int, offset: int, length: int) -> Tuple[bytes, int]:
+        # Runs in a worker process. Code arrays are built there, so they are not sent with every block
+        with mapped_file.MappedFile(srcFilePath, useMmap) as source:
+            return HuffmanEncoder.EncodeBlockData(source.Read(offset, length), processBits, canonicalCode, treeBuildMethod, maxCodeLength)
+
+    @staticmethod
+    def EncodeMessage(data: bytes, codeTable: code_table.CodeTable) -> bytes:
+        # Whole encoded file of data held in memory. Meant for many small messages: nothing is
+        # analyzed and the header is a few bytes, however short data is
+        bitWriter: bit_writer.BitWriter = bit_writer.BitWriter()
+        flags: int = container_format.ContainerFormat.FLAG_TABLE_ID
+        if codeTable.m_escapeSymbol >= 0:
+            flags |= container_format.ContainerFormat.FLAG_ESCAPE
+
+        container_format.ContainerFormat.WriteHeader(bitWriter.Write, codeTable.m_processBits, flags)
+        bitWriter.Write(codeTable.m_tableId, code_table.CodeTable.ID_BITS)
+
+        # Header is whole bytes, so only the body is padded
+        content, bitLength = HuffmanEncoder.EncodeBlockData(data, codeTable.m_processBits, codeTable.m_canonicalCode, None, 0, codeTable.m_escapeSymbol)
+        padding: bytes = container_format.ContainerFormat.PackPadding(-bitLength % 8, -(len(data) * 8) % codeTable.m_processBits)
+
+        return bitWriter.PopContent() + content + padding
+
+    @staticmethod
+    def EncodeBlockData(data: bytes, processBits: int, canonicalCode: canonical_code.CanonicalCode, treeBuildMethod: str, maxCodeLength: int, escapeSymbol: int = -1) -> Tuple[bytes, int]:
+        # Returns the block aligned to a byte and its length in bits. canonicalCode None = the block
+        # gets its own code, with the code lengths table in front
+        bitWriter: bit_writer.BitWriter = bit_writer.BitWriter(len(data) + 1024)
 
-    def EncodeSourceFile(self, byteWriter: byte_writer.ByteWriter) -> None:
+        if canonicalCode == None:
+            bytePopularity: Dict[Tuple[int, str], int] = byte_analyzer.ByteAnalyzer(None, processBits, buffer=data).Analyze()
+            symbolPopularity: Dict[int, int] = byte_analyzer.ByteAnalyzer.SymbolPopularity(bytePopularity)
+            codeLengths, _ = canonical_code.CanonicalCode.BuildCodeLengths(symbolPopularity, treeBuildMethod, maxCodeLength)
+
+            canonicalCode = canonical_code.CanonicalCode(codeLengths)
+            canonicalCode.Write(bitWriter.Write, processBits)
+
+        codeArrays: Tuple = canonicalCode.GetCodeArrays(processBits)
+        extractor: symbol_extractor.SymbolExtractor = symbol_extractor.SymbolExtractor(processBits)
+
+        # Chunks keep the arrays of a large block small. Last symbol is padded with zeros
+        buffer: memoryview = memoryview(data)
+        for start in range(0, len(buffer), symbol_extractor.SymbolExtractor.CHUNK_SIZE):
+            symbols = extractor.Feed(buffer[start:start + symbol_extractor.SymbolExtractor.CHUNK_SIZE])
+            HuffmanEncoder.WriteCodes(symbols, bitWriter, canonicalCode.m_codes, processBits, escapeSymbol, codeArrays)
+
+        HuffmanEncoder.WriteCodes(extractor.Flush()[0], bitWriter, canonicalCode.m_codes, processBits, escapeSymbol, codeArrays)
+
+        bitLength: int = bitWriter.GetBitsWritten()
+        bitWriter.AlignToByte()
+
+        return bitWriter.PopContent(), bitLength
+
+    def EncodeSourceFile(self, bitWriter: bit_writer.BitWriter) -> None:
         self.m_logger.info(f"Encoding {self.m_srcFilePath}")
+        headerBits: int = bitWriter.GetBitsWritten()
+
+        # Counted only to report the cost of sampling
+        symbolCounts: List[int] = [0] * (1 << self.m_processBits) if self.m_sampleSize > 0 and self.m_escapeSymbol >= 0 else None
+
+        consumedBits: int = self.EncodeChunks(bitWriter, symbolCounts)
+
+        # Zeros appended to the last symbol. Derived from the source length, because a
+        # last symbol made only of zeros can not be told apart from its padding
+        self.m_symbolPaddingZeros = -consumedBits % self.m_processBits
+        self.m_symbolCount = -(-consumedBits // self.m_processBits)
+        self.m_originalLength = consumedBits // 8
+        self.m_encodedBits = bitWriter.GetBitsWritten() - headerBits
+        self.m_stats.ReportProgress(self.m_originalLength)
+
+        if symbolCounts != None:
+            self.m_samplingCost = self.m_encodedBits - self.CountOptimalBits(symbolCounts)
+
+        bitWriter.AlignToByte()
+        self.m_outFile.Write(bitWriter.PopContent())
+
+    def EncodeChunks(self, bitWriter: bit_writer.BitWriter, symbolCounts: List[int]) -> int:
+        # Symbols are cut from whole chunks of the source at once, for any processBits
+        extractor: symbol_extractor.SymbolExtractor = symbol_extractor.SymbolExtractor(self.m_processBits)
+        # In debug every code is logged, so codes are written one by one
+        codeArrays: Tuple = None if self.m_debug else self.m_canonicalCode.GetCodeArrays(self.m_processBits)
+
+        if self.m_srcFile != None:
+            # Sampled source goes on from the end of the sample. Run closes it
+            self.EncodeSymbolArray(extractor.Feed(self.m_sample), bitWriter, symbolCounts, extractor, codeArrays)
+            while (chunk := self.m_srcFile.read(symbol_extractor.SymbolExtractor.CHUNK_SIZE)) != b'':
+                self.EncodeSymbolArray(extractor.Feed(chunk), bitWriter, symbolCounts, extractor, codeArrays)
+        else:
+            with mapped_file.MappedFile(self.m_srcFilePath, self.m_useMmap, self.m_debug) as source:
+                for chunk in source.ReadChunks(symbol_extractor.SymbolExtractor.CHUNK_SIZE):
+                    self.EncodeSymbolArray(extractor.Feed(chunk), bitWriter, symbolCounts, extractor, codeArrays)
+
+        # Last symbol is padded with zeros
+        lastSymbols, _ = extractor.Flush()
+        self.EncodeSymbolArray(lastSymbols, bitWriter, symbolCounts, extractor, codeArrays)
+
+        return extractor.GetConsumedBits()
+
+    def EncodeSymbolArray(self, symbols, bitWriter: bit_writer.BitWriter, symbolCounts: List[int], extractor: symbol_extractor.SymbolExtractor, codeArrays: Tuple) -> None:
+        if symbolCounts != None and np is not None and len(symbols) > 0:
+            counts = np.bincount(symbols, minlength=len(symbolCounts))
+            for symbol in np.flatnonzero(counts).tolist():
+                symbolCounts[symbol] += int(counts[symbol])
+        elif symbolCounts != None:
+            for symbol in symbols:
+                symbolCounts[symbol] += 1
+
+        HuffmanEncoder.WriteCodes(symbols, bitWriter, self.m_huffmanCode, self.m_processBits, self.m_escapeSymbol, codeArrays, self.m_logger if self.m_debug else None)
+
+        if bitWriter.m_length >= self.m_outMaxBufferLength:
+            if self.m_debug:
+                self.m_logger.debug(f"BitWriter buffer filled while encoding {self.m_srcFilePath}! Writing content to {self.m_outFilePath}")
 
-        byteReader: byte_reader.ByteReader = byte_reader.ByteReader()
-        
-        with open(self.m_srcFilePath, "rb") as src:
-            def UpdateBuffer() -> bool:
-                buffer: bytes = src.read(self.m_srcMaxBufferLength)
+            self.m_outFile.Write(bitWriter.PopContent())
+            self.m_stats.ReportProgress(extractor.GetConsumedBits() // 8)
 
-                if buffer == b'':
-                    return False
+    @staticmethod
+    def WriteCodes(symbols, bitWriter: bit_writer.BitWriter, huffmanCode: Dict[int, Tuple[int, int]], processBits: int, escapeSymbol: int, codeArrays: Tuple, logger: logging.Logger = None) -> None:
+        # Writes the codes of symbols, a list or a numpy array. codeArrays (see CanonicalCode.GetCodeArrays) look up
+        # and pack all of them at once, None = one by one, each logged to logger if it is given
+        if codeArrays != None:
+            codeValues, codeLengths = codeArrays
+            values = codeValues[symbols]
+            lengths = codeLengths[symbols]
 
-                byteReader.SetBuffer(buffer)
-                return True
-            
-            UpdateBuffer()
-            while byteReader.CanRead() or UpdateBuffer():
-                byte: str = ""
-                for _ in range(self.m_processBits):
-                    result: int = byteReader.ReadBit()
+            missing = lengths == 0
+            if missing.any():
+                values[missing], lengths[missing] = HuffmanEncoder.EscapeCode(symbols[missing].astype(np.uint64), huffmanCode, processBits, escapeSymbol)
 
-                    if result == -1:
-                        if UpdateBuffer():
-                            result = byteReader.ReadBit()
-                        else:
-                            break
+            bitWriter.WriteArray(values, lengths)
+            return
 
-                    byte += str(result)
-                
-                code: str = self.m_huffmanCode[byte.ljust(self.m_processBits, '0')]
+        for symbol in symbols if isinstance(symbols, list) else symbols.tolist():
+            code, length = huffmanCode[symbol] if symbol in huffmanCode else HuffmanEncoder.EscapeCode(symbol, huffmanCode, processBits, escapeSymbol)
 
-                if self.m_debug:
-                    self.m_logger.debug(f'Read {byte}. It\'s code: {code}')
+            if logger != None:
+                logger.debug(f"Read {symbol:0{processBits}b}. It's code: {code:0{length}b}")
 
-                for bit in code:
-                    byteWriter.WriteBit(int(bit))
+            bitWriter.Write(code, length)
 
-                if len(byteWriter.m_buffer) >= self.m_outMaxBufferLength:
-                    if self.m_debug:
-                        self.m_logger.debug(f"ByteWriter buffer filled while encoding {self.m_srcFilePath}! Writing content to {self.m_outFilePath}")
-                    
-                    content = byteWriter.PopContent()
-                    self.m_outFile.write(content)
+    @staticmethod
+    def EscapeCode(symbol, huffmanCode: Dict[int, Tuple[int, int]], processBits: int, escapeSymbol: int) -> Tuple[int, int]:
+        # Code of a symbol missing from huffmanCode: the escape code followed by the raw symbol.
+        # symbol may be a numpy array of such symbols as well
+        if escapeSymbol not in huffmanCode:
+            raise KeyError(symbol)
 
-        if byteWriter.m_leftToWriteBits != byteWriter.m_maxBits:
-            self.m_paddingZeros = byteWriter.m_leftToWriteBits
-            byteWriter.AppendByteToBuffer()
+        escapeCode, escapeLength = huffmanCode[escapeSymbol]
+        return (escapeCode << processBits) | symbol, escapeLength + processBits
 
-        content = byteWriter.PopContent(getAll=True)
-        self.m_outFile.write(content)
+    def CountOptimalBits(self, symbolCounts: List[int]) -> int:
+        # Encoded size of the source with a code built from all of it
+        symbolPopularity: Dict[int, int] = {symbol: count for symbol, count in enumerate(symbolCounts) if count > 0}
+
+        # Without the escape symbol the limit may not fit all symbols. Compared to unlimited codes then
+        maxCodeLength: int = self.m_maxCodeLength if len(symbolPopularity) <= 1 << self.m_maxCodeLength else 0
+        codeLengths, _ = canonical_code.CanonicalCode.BuildCodeLengths(symbolPopularity, self.m_treeBuildMethod, maxCodeLength)
+
+        return sum(count * codeLengths[symbol] for symbol, count in symbolPopularity.items())
 
 def main() -> None:
     parser = argparse.ArgumentParser()
@@ -270,24 +497,74 @@ def main() -> None:
     parser.add_argument("outFile", help = "Path to the out file")
     parser.add_argument("-p", "--processBits", dest="processBits", type = int, default = 8, help = "How much bits to process. By default 8 (1 byte)")
     parser.add_argument("-l", "--logLevel", dest="logLevel", type = int, default = 2, help = "To configure logging messages. 1 - DEBUG, 2 - INFO, 3 - WARNING, 4 - ERROR, 5 - CRITICAL")
+    parser.add_argument("--logFile", dest="logFile", default = "logs/encoder.log", help = "Log file. Its directory is created if missing. By default logs/encoder.log")
+    parser.add_argument("-t", "--treeBuildMethod", dest="treeBuildMethod", choices = huffman_tree_builder.HuffmanTreeBuilder.METHODS, default = huffman_tree_builder.HuffmanTreeBuilder.HEAP, help = "Huffman tree construction. heap - priority queue, twoqueue - linear merge over sorted counts")
+    parser.add_argument("-m", "--maxCodeLength", dest="maxCodeLength", type = int, default = 0, help = "Longest allowed Huffman code in bits. Bounds decoder table size. By default 0 (not limited)")
+    parser.add_argument("-j", "--jobs", dest="jobs", type = int, default = 1, help = "Processes encoding blocks in parallel. By default 1")
+    parser.add_argument("-b", "--blockSize", dest="blockSize", type = int, default = 0, help = f"Block size in bytes. By default 0 (single block, or {HuffmanEncoder.DEFAULT_BLOCK_SIZE}B with --jobs or --blockTables)")
+    parser.add_argument("--profile", dest="profile", action = "store_true", help = "Profile encoding with cProfile and print the slowest functions")
+    parser.add_argument("--blockTables", dest="blockTables", action = "store_true", help = "Build a Huffman Code for every block instead of a shared one")
+    parser.add_argument("--noMmap", dest="useMmap", action = "store_false", help = "Read the source in chunks instead of mapping it to memory")
+    parser.add_argument("-s", "--sampleSize", dest="sampleSize", type = int, default = 0, help = "Build the Huffman Code from the first sampleSize bytes and read the source once. By default 0 (analyze the whole source)")
+    parser.add_argument("--cacheDir", dest="cacheDir", default = None, help = "Directory caching analysis and code of sources by their fingerprint. By default none (no cache)")
+    parser.add_argument("--cacheSize", dest="cacheSize", type = int, default = analysis_cache.AnalysisCache.DEFAULT_MAX_BYTES, help = f"Cache size in bytes. Least recently used entries are removed past it. By default {analysis_cache.AnalysisCache.DEFAULT_MAX_BYTES}")
+    parser.add_argument("-T", "--table", dest="table", default = None, help = "Code table made by code_table.py. The source is not analyzed, its processBits are used")
     args = parser.parse_args()
     
     srcFile: str = args.srcFile
     outFile: str = args.outFile
     logLevel: int = args.logLevel
     processBits: int = args.processBits
+    treeBuildMethod: str = args.treeBuildMethod
+    maxCodeLength: int = args.maxCodeLength
+    jobs: int = args.jobs
+    blockSize: int = args.blockSize
+    blockTables: bool = args.blockTables
+    sampleSize: int = args.sampleSize
+    useMmap: bool = args.useMmap
+    codeTable: code_table.CodeTable = None
+
+    if args.table != None:
+        codeTable = code_table.CodeTable.Load(args.table)
+        processBits = codeTable.m_processBits
     
     if logLevel <= 0 or logLevel > 5:
         raise Exception("Bad logLevel")
     
     if processBits <= 1 or processBits > 16:
         raise Exception("Bad processBits")
+
+    if maxCodeLength < 0 or maxCodeLength >= 1 << canonical_code.CanonicalCode.MIN_LENGTH_BITS:
+        raise Exception("Bad maxCodeLength")
+
+    if jobs <= 0:
+        raise Exception("Bad jobs")
+
+    if blockSize < 0:
+        raise Exception("Bad blockSize")
+
+    if sampleSize < 0:
+        raise Exception("Bad sampleSize")
+
+    if args.cacheSize <= 0:
+        raise Exception("Bad cacheSize")
     
-    logging.basicConfig(level = logLevel * 10, filename = "logs/encoder.log", filemode = "w",
-        format = "%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    coder_logging.ConfigureLogging(logLevel, args.logFile)
         
-    encoder: HuffmanEncoder = HuffmanEncoder(srcFile, outFile, processBits, debug = logLevel == 1)
-    encoder.Run()
+    analysisCache: analysis_cache.AnalysisCache = analysis_cache.AnalysisCache(args.cacheDir, args.cacheSize, debug = logLevel == 1) if args.cacheDir != None else None
+
+    encoder: HuffmanEncoder = HuffmanEncoder(srcFile, outFile, processBits, treeBuildMethod = treeBuildMethod, maxCodeLength = maxCodeLength,
+        blockSize = blockSize, jobs = jobs, blockTables = blockTables, sampleSize = sampleSize, useMmap = useMmap, codeTable = codeTable, analysisCache = analysisCache, profile = args.profile, debug = logLevel == 1)
+    stats: coder_stats.CoderStats = encoder.Run()
+
+    stats.Print(srcFile, outFile, encoder.m_messageFile)
+    encoder.PrintCosts()
+
+    if analysisCache != None:
+        print(f"Analysis cache: {analysisCache.m_hits} hits, {analysisCache.m_misses} misses, {analysisCache.m_evictions} evictions", file=encoder.m_messageFile)
+
+    if args.profile:
+        print(stats.GetProfile(), file=encoder.m_messageFile)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,70 @@
+from typing import Deque, Dict, List, Tuple
+
+import binary_tree
+import collections, heapq
+
+class HuffmanTreeBuilder(object):
+    HEAP: str = "heap"
+    TWO_QUEUES: str = "twoqueue"
+    METHODS: Tuple[str, ...] = (HEAP, TWO_QUEUES)
+
+    def __init__(self, symbolPopularity: Dict[int, int]):
+        # Leafs ordered by (count, symbol). Ties are always resolved by this order
+        # first and by merge order second, so the same input gives the same tree
+        self.m_leafs: List[binary_tree.Node] = [binary_tree.Node(byte, count) for byte, count in sorted(symbolPopularity.items(), key = lambda item: (item[1], item[0]))]
+
+    def Build(self, method: str = HEAP) -> binary_tree.Node:
+        if method == self.HEAP:
+            return self.BuildWithHeap()
+
+        if method == self.TWO_QUEUES:
+            return self.BuildWithTwoQueues()
+
+        raise Exception(f"Unknown tree build method: {method}")
+
+    def BuildWithHeap(self) -> binary_tree.Node:
+        if len(self.m_leafs) == 0:
+            return None
+
+        # (count, order, node). order is unique, so nodes themselves are never compared
+        heap: List[Tuple[int, int, binary_tree.Node]] = [(leaf.m_count, order, leaf) for order, leaf in enumerate(self.m_leafs)]
+        heapq.heapify(heap)
+        order: int = len(heap)
+
+        while len(heap) > 1:
+            _, _, left = heapq.heappop(heap)
+            _, _, right = heapq.heappop(heap)
+
+            newNode: binary_tree.Node = self.__Merge(left, right)
+            heapq.heappush(heap, (newNode.m_count, order, newNode))
+            order += 1
+
+        return heap[0][2]
+
+    def BuildWithTwoQueues(self) -> binary_tree.Node:
+        if len(self.m_leafs) == 0:
+            return None
+
+        # Merged nodes are created in non-decreasing count order, so both queues stay
+        # sorted and the two smallest nodes are always at their fronts
+        leafs: Deque[binary_tree.Node] = collections.deque(self.m_leafs)
+        merged: Deque[binary_tree.Node] = collections.deque()
+
+        while len(leafs) + len(merged) > 1:
+            pair: List[binary_tree.Node] = []
+            for _ in range(2):
+                if len(merged) == 0 or (len(leafs) > 0 and leafs[0].m_count <= merged[0].m_count):
+                    pair.append(leafs.popleft())
+                else:
+                    pair.append(merged.popleft())
+
+            merged.append(self.__Merge(pair[0], pair[1]))
+
+        return merged[0] if len(merged) > 0 else leafs[0]
+
+    def __Merge(self, left: binary_tree.Node, right: binary_tree.Node) -> binary_tree.Node:
+        newNode: binary_tree.Node = binary_tree.Node(count = left.m_count + right.m_count)
+        newNode.AddLeft(left)
+        newNode.AddRight(right)
+
+        return newNode
@@ -0,0 +1,61 @@
+from typing import Iterator
+
+import bit_reader
+import io, logging, mmap, os
+
+class MappedFile(object):
+    def __init__(self, filePath: str, useMmap: bool = True, debug: bool = False):
+        # m_view = whole file as a read-only memoryview over mmap. None when the file
+        # can not be mapped (pipes, empty files), m_file is read in chunks then
+        self.m_filePath: str = filePath
+        self.m_file: io.BufferedReader = open(filePath, "rb")
+        self.m_view: memoryview = None
+
+        self.m_debug: bool = debug
+        self.m_logger: logging.Logger = logging.getLogger(__name__)
+
+        if useMmap:
+            try:
+                self.m_view = memoryview(mmap.mmap(self.m_file.fileno(), 0, access=mmap.ACCESS_READ))
+            except (ValueError, OSError) as error:
+                if self.m_debug:
+                    self.m_logger.debug(f"Can not map {filePath}: {error}. Using buffered reads")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.Close()
+
+    def IsMapped(self) -> bool:
+        return self.m_view != None
+
+    def Read(self, offset: int, length: int) -> bytes:
+        # Slice of the mapping, no copy
+        if self.m_view != None:
+            return self.m_view[offset:offset + length]
+
+        # Position of m_file is kept, a BitReader of CreateBitReader may be streaming from it
+        return os.pread(self.m_file.fileno(), length, offset)
+
+    def ReadChunks(self, chunkSize: int) -> Iterator[bytes]:
+        # Chunks of the mapping are slices, not copies
+        if self.m_view != None:
+            for start in range(0, len(self.m_view), chunkSize):
+                yield self.m_view[start:start + chunkSize]
+            return
+
+        while (chunk := self.m_file.read(chunkSize)) != b'':
+            yield chunk
+
+    def CreateBitReader(self, bufferSize: int = 1024) -> bit_reader.BitReader:
+        if self.m_view != None:
+            return bit_reader.BitReader(buffer=self.m_view, debug=self.m_debug)
+
+        return bit_reader.BitReader(self.m_file, bufferSize, debug=self.m_debug)
+
+    def Close(self) -> None:
+        # The mapping itself is not closed. Slices of m_view may still be in use,
+        # it is unmapped when the last of them is gone
+        self.m_view = None
+        self.m_file.close()
@@ -0,0 +1,52 @@
+from typing import BinaryIO
+
+import io, os, sys, time
+
+class OutFile(object):
+    # Path of stdout
+    STDOUT: str = "-"
+
+    def __init__(self, filePath: str):
+        # Written strictly in order, so it can be a pipe or a socket as well.
+        # Bytes are counted because such files can not tell their position
+        self.m_filePath: str = filePath
+        self.m_bytesWritten: int = 0
+
+        # Spent in writes. Reported as I/O time
+        self.m_writeTime: float = 0
+
+        if filePath == self.STDOUT:
+            # Closing it must not close stdout itself
+            self.m_file: io.BufferedWriter = open(sys.stdout.fileno(), "wb", closefd=False)
+        else:
+            self.m_file: io.BufferedWriter = open(filePath, "wb")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.Close()
+
+    @staticmethod
+    def IsStdout(filePath: str) -> bool:
+        return filePath == OutFile.STDOUT
+
+    @staticmethod
+    def Preallocate(file: BinaryIO, size: int) -> None:
+        # Reserves size bytes up front, so the file does not grow while it is written
+        try:
+            os.posix_fallocate(file.fileno(), 0, size)
+        except (AttributeError, OSError):
+            file.truncate(size)
+
+    def Write(self, content: bytes) -> None:
+        startTime: float = time.perf_counter()
+        self.m_file.write(content)
+        self.m_writeTime += time.perf_counter() - startTime
+        self.m_bytesWritten += len(content)
+
+    def GetBytesWritten(self) -> int:
+        return self.m_bytesWritten
+
+    def Close(self) -> None:
+        self.m_file.close()
@@ -0,0 +1,118 @@
+from typing import BinaryIO, Iterable, Iterator
+
+import bit_reader, coder_logging, container_format, huffman_decoder
+import argparse, functools, io, logging, sys
+
+class StreamHuffmanDecoder(object):
+    def __init__(self, outMaxBufferLength: int = 1024, debug: bool = False):
+        # Fed data waits in m_pending until a whole block is there. Only files encoded
+        # in blocks can be streamed, a single bitstream ends where its file ends
+        self.m_pending: bytearray = bytearray()
+        self.m_decoder: huffman_decoder.HuffmanDecoder = huffman_decoder.HuffmanDecoder(None, None, outMaxBufferLength=outMaxBufferLength, debug=debug)
+
+        self.m_isHeaderDecoded: bool = False
+        self.m_isFinished: bool = False
+
+        self.m_debug: bool = debug
+        self.m_logger: logging.Logger = logging.getLogger(__name__)
+
+    def Feed(self, data: bytes) -> bytes:
+        # Returns decoded data of every block completed by data
+        self.m_pending += data
+
+        if not self.m_isHeaderDecoded and not self.__DecodeHeader():
+            return b''
+
+        content: io.BytesIO = io.BytesIO()
+        start: int = 0
+        blockHeaderBytes: int = container_format.ContainerFormat.BLOCK_HEADER_BYTES
+
+        while not self.m_isFinished and len(self.m_pending) - start >= blockHeaderBytes:
+            bitLength, originalLength = container_format.ContainerFormat.UnpackFields(self.m_pending[start:start + blockHeaderBytes])
+
+            if bitLength == 0 and originalLength == 0:
+                # Blocks terminator. The block index is not needed
+                self.m_isFinished = True
+                start = len(self.m_pending)
+                break
+
+            end: int = start + blockHeaderBytes + (bitLength + 7) // 8
+            if len(self.m_pending) < end:
+                break
+
+            if self.m_debug:
+                self.m_logger.debug(f"Block: {bitLength} bits, {originalLength}B decoded")
+
+            self.m_decoder.DecodeBlockData(bytes(self.m_pending[start + blockHeaderBytes:end]), bitLength, originalLength, content)
+            start = end
+
+        del self.m_pending[:start]
+        return content.getvalue()
+
+    def Flush(self) -> bytes:
+        # Every block is returned as soon as it is complete, so only checks that the stream is complete
+        if not self.m_isFinished:
+            raise Exception("Encoded stream ended before its last block")
+
+        return b''
+
+    def Decode(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        for chunk in chunks:
+            content: bytes = self.Feed(chunk)
+
+            if len(content) > 0:
+                yield content
+
+        self.Flush()
+
+    def __DecodeHeader(self) -> bool:
+        # False = not enough data yet
+        decoder: huffman_decoder.HuffmanDecoder = self.m_decoder
+        decoder.m_bitReader = bit_reader.BitReader(buffer=bytes(self.m_pending), debug=self.m_debug)
+
+        try:
+            decoder.DecodeHeader()
+        except EOFError:
+            return False
+
+        if not decoder.m_flags & container_format.ContainerFormat.FLAG_BLOCKS:
+            raise Exception("Streaming needs a file encoded in blocks")
+
+        if not decoder.m_flags & container_format.ContainerFormat.FLAG_BLOCK_TABLES:
+            decoder.ConstructDecodeTable()
+
+        # Header is aligned to a byte in files encoded in blocks
+        del self.m_pending[:(decoder.m_bitReader.GetConsumedBits() + 7) // 8]
+        self.m_isHeaderDecoded = True
+        return True
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("srcFile", help = "Path to the source file. - for stdin")
+    parser.add_argument("outFile", help = "Path to the out file. - for stdout")
+    parser.add_argument("-l", "--logLevel", dest="logLevel", type = int, default = 2, help = "To configure logging messages. 1 - DEBUG, 2 - INFO, 3 - WARNING, 4 - ERROR, 5 - CRITICAL")
+    parser.add_argument("--logFile", dest="logFile", default = "logs/stream_decoder.log", help = "Log file. Its directory is created if missing. By default logs/stream_decoder.log")
+    args = parser.parse_args()
+
+    logLevel: int = args.logLevel
+
+    if logLevel <= 0 or logLevel > 5:
+        raise Exception("Bad logLevel")
+
+    coder_logging.ConfigureLogging(logLevel, args.logFile)
+
+    srcFile: BinaryIO = sys.stdin.buffer if args.srcFile == "-" else open(args.srcFile, "rb")
+    outFile: BinaryIO = sys.stdout.buffer if args.outFile == "-" else open(args.outFile, "wb")
+
+    if args.outFile == "-":
+        # Decoder messages are printed to stdout. Keep them out of decoded data
+        sys.stdout = sys.stderr
+
+    decoder: StreamHuffmanDecoder = StreamHuffmanDecoder(debug = logLevel == 1)
+    for content in decoder.Decode(iter(functools.partial(srcFile.read, 64 * 1024), b'')):
+        outFile.write(content)
+
+    outFile.flush()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+from typing import BinaryIO, Iterable, Iterator, List, Tuple
+
+import bit_writer, coder_logging, container_format, huffman_encoder, huffman_tree_builder
+import argparse, functools, logging, sys
+
+class StreamHuffmanEncoder(object):
+    DEFAULT_BLOCK_SIZE: int = 1024 * 1024
+
+    def __init__(self, processBits: int = 8, blockSize: int = DEFAULT_BLOCK_SIZE, treeBuildMethod: str = huffman_tree_builder.HuffmanTreeBuilder.HEAP, maxCodeLength: int = 0, debug: bool = False):
+        # Data is encoded in blocks with their own Huffman Code, because the whole input is never known.
+        # Fed data waits in m_pending until a block is full, so memory stays around blockSize
+        self.m_processBits: int = processBits
+        self.m_blockSize: int = max(blockSize // processBits, 1) * processBits
+        self.m_treeBuildMethod: str = treeBuildMethod
+        self.m_maxCodeLength: int = maxCodeLength
+
+        self.m_pending: bytearray = bytearray()
+        self.m_index: List[Tuple[int, int, int]] = []
+
+        # Bytes returned so far. Offsets in the block index
+        self.m_position: int = 0
+        self.m_isFlushed: bool = False
+
+        self.m_debug: bool = debug
+        self.m_logger: logging.Logger = logging.getLogger(__name__)
+
+    def Feed(self, data: bytes) -> bytes:
+        # Returns encoded data of every block completed by data
+        if self.m_isFlushed:
+            raise Exception("Encoder is already flushed")
+
+        self.m_pending += data
+        content: List[bytes] = [self.__EncodeHeader()] if self.m_position == 0 else []
+
+        start: int = 0
+        while len(self.m_pending) - start >= self.m_blockSize:
+            content.append(self.__EncodeBlock(bytes(self.m_pending[start:start + self.m_blockSize])))
+            start += self.m_blockSize
+
+        del self.m_pending[:start]
+        return b''.join(content)
+
+    def Flush(self) -> bytes:
+        # Returns the last block, the block index and the footer. No data can be fed after that
+        content: bytes = self.Feed(b'')
+
+        if len(self.m_pending) > 0:
+            content += self.__EncodeBlock(bytes(self.m_pending))
+            self.m_pending.clear()
+
+        content += container_format.ContainerFormat.PackBlockIndex(self.m_index, self.m_position)
+        self.m_isFlushed = True
+
+        if self.m_debug:
+            self.m_logger.debug(f"Flushed {len(self.m_index)} blocks")
+
+        return content
+
+    def Encode(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        for chunk in chunks:
+            content: bytes = self.Feed(chunk)
+
+            if len(content) > 0:
+                yield content
+
+        yield self.Flush()
+
+    def __EncodeHeader(self) -> bytes:
+        bitWriter: bit_writer.BitWriter = bit_writer.BitWriter(debug=self.m_debug)
+        flags: int = container_format.ContainerFormat.FLAG_BLOCKS | container_format.ContainerFormat.FLAG_BLOCK_TABLES
+        container_format.ContainerFormat.WriteHeader(bitWriter.Write, self.m_processBits, flags)
+
+        header: bytes = bitWriter.PopContent()
+        self.m_position += len(header)
+        return header
+
+    def __EncodeBlock(self, data: bytes) -> bytes:
+        content, bitLength = huffman_encoder.HuffmanEncoder.EncodeBlockData(data, self.m_processBits, None, self.m_treeBuildMethod, self.m_maxCodeLength)
+
+        self.m_position += container_format.ContainerFormat.BLOCK_HEADER_BYTES
+        self.m_index.append((self.m_position, bitLength, len(data)))
+        self.m_position += len(content)
+
+        if self.m_debug:
+            self.m_logger.debug(f"Block {len(self.m_index) - 1}: {len(data)}B encoded to {bitLength} bits")
+
+        return container_format.ContainerFormat.PackFields((bitLength, len(data))) + content
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("srcFile", help = "Path to the source file. - for stdin")
+    parser.add_argument("outFile", help = "Path to the out file. - for stdout")
+    parser.add_argument("-p", "--processBits", dest="processBits", type = int, default = 8, help = "How much bits to process. By default 8 (1 byte)")
+    parser.add_argument("-b", "--blockSize", dest="blockSize", type = int, default = StreamHuffmanEncoder.DEFAULT_BLOCK_SIZE, help = f"Block size in bytes. By default {StreamHuffmanEncoder.DEFAULT_BLOCK_SIZE}")
+    parser.add_argument("-l", "--logLevel", dest="logLevel", type = int, default = 2, help = "To configure logging messages. 1 - DEBUG, 2 - INFO, 3 - WARNING, 4 - ERROR, 5 - CRITICAL")
+    parser.add_argument("--logFile", dest="logFile", default = "logs/stream_encoder.log", help = "Log file. Its directory is created if missing. By default logs/stream_encoder.log")
+    args = parser.parse_args()
+
+    processBits: int = args.processBits
+    blockSize: int = args.blockSize
+    logLevel: int = args.logLevel
+
+    if logLevel <= 0 or logLevel > 5:
+        raise Exception("Bad logLevel")
+
+    if processBits <= 1 or processBits > 16:
+        raise Exception("Bad processBits")
+
+    if blockSize <= 0:
+        raise Exception("Bad blockSize")
+
+    coder_logging.ConfigureLogging(logLevel, args.logFile)
+
+    srcFile: BinaryIO = sys.stdin.buffer if args.srcFile == "-" else open(args.srcFile, "rb")
+    outFile: BinaryIO = sys.stdout.buffer if args.outFile == "-" else open(args.outFile, "wb")
+
+    encoder: StreamHuffmanEncoder = StreamHuffmanEncoder(processBits, blockSize, debug = logLevel == 1)
+    for content in encoder.Encode(iter(functools.partial(srcFile.read, blockSize), b'')):
+        outFile.write(content)
+
+    outFile.flush()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+from typing import List, Tuple
+
+import bit_reader
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+class SymbolExtractor(object):
+    # Source bytes in chunks of any size -> arrays of processBits bit symbols. processBits bytes hold
+    # exactly 8 whole symbols, so bytes short of such a group are carried over to the next chunk.
+    # Symbols are numpy arrays, or lists when numpy is missing
+    CHUNK_SIZE: int = 1024 * 1024
+
+    def __init__(self, processBits: int):
+        self.m_processBits: int = processBits
+        self.m_carry: bytes = b''
+        self.m_consumedBytes: int = 0
+
+        # Symbol k of a group is made of group bytes first..last, shifted right and masked:
+        # (first, last, shift) for every k
+        self.m_layout: List[Tuple[int, int, int]] = []
+        for index in range(8):
+            start: int = index * processBits
+            last: int = (start + processBits - 1) // 8
+            self.m_layout.append((start // 8, last, (last + 1) * 8 - start - processBits))
+
+    def Feed(self, data: bytes):
+        # Symbols of all whole groups so far
+        buffer: memoryview = memoryview(data)
+        processBits: int = self.m_processBits
+        self.m_consumedBytes += len(buffer)
+        parts: List = []
+
+        if len(self.m_carry) > 0:
+            # Only the bytes completing the carried group are copied
+            needed: int = processBits - len(self.m_carry)
+            if len(buffer) < needed:
+                self.m_carry += buffer.tobytes()
+                return self.Extract(b'')
+
+            parts.append(self.Extract(self.m_carry + buffer[:needed].tobytes()))
+            buffer = buffer[needed:]
+
+        usable: int = len(buffer) - len(buffer) % processBits
+        parts.append(self.Extract(buffer[:usable]))
+        self.m_carry = buffer[usable:].tobytes()
+
+        if len(parts) == 1:
+            return parts[0]
+
+        return np.concatenate(parts) if np is not None else parts[0] + parts[1]
+
+    def Flush(self) -> Tuple[object, int]:
+        # Symbols of the carried bytes and the length of the last one in bits. It is padded with
+        # zeros up to processBits, like the bitwise readers do
+        carryBits: int = len(self.m_carry) * 8
+        padded: bytes = self.m_carry + bytes(self.m_processBits - len(self.m_carry))
+        self.m_carry = b''
+
+        symbolCount: int = -(-carryBits // self.m_processBits)
+        lastSymbolBits: int = carryBits - (symbolCount - 1) * self.m_processBits if symbolCount > 0 else 0
+        return self.Extract(padded)[:symbolCount], lastSymbolBits
+
+    def GetConsumedBits(self) -> int:
+        return self.m_consumedBytes * 8
+
+    def Extract(self, data: bytes):
+        # data = whole groups of processBits bytes
+        processBits: int = self.m_processBits
+
+        if np is None:
+            bitReader: bit_reader.BitReader = bit_reader.BitReader(buffer=data)
+            return [bitReader.Read(processBits) for _ in range(len(data) * 8 // processBits)]
+
+        buffer = np.frombuffer(data, dtype=np.uint8)
+
+        if processBits == 8:
+            return buffer
+
+        if processBits == 16:
+            return buffer.view(">u2")
+
+        # Every symbol lies in at most 3 bytes. Columns of the groups are shifted together,
+        # with no array of single bits in between
+        groups = buffer.reshape(-1, processBits)
+        symbols = np.empty((len(groups), 8), dtype=np.uint8 if processBits < 8 else np.uint16)
+        mask: int = (1 << processBits) - 1
+
+        for index, (first, last, shift) in enumerate(self.m_layout):
+            window = groups[:, first].astype(np.uint32)
+            for column in range(first + 1, last + 1):
+                window = (window << 8) | groups[:, column]
+
+            symbols[:, index] = (window >> shift) & mask
+
+        return symbols.ravel()
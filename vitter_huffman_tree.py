@@ -0,0 +1,223 @@
+from __future__ import annotations
+from typing import Dict, List, Tuple
+
+import binary_tree
+import heapq
+
+class VitterNode(binary_tree.Node):
+    def __init__(self, byte: int = 0, count: int = 0, number: int = 0, isLeaf: bool = True):
+        super().__init__(byte, count)
+
+        # Nodes never change their type, so it is not looked up from the children
+        self.m_isLeaf: bool = isLeaf
+
+        # Implicit number. Nodes ordered by numbers have nondecreasing counts, siblings
+        # are neighbours and the root has the highest number
+        self.m_number: int = number
+
+class VitterHuffmanTree(object):
+    # Vitter's algorithm (Algorithm V). Nodes of the same count and type (leaf or internal)
+    # form a block, numbered contiguously, leafs of a count right below internal nodes of
+    # that count. Its highest numbered node is the block leader
+    SYMBOL_BITS: int = 8
+
+    def __init__(self, rescaleThreshold: int = 0):
+        self.m_nytValue = -1
+        self.m_internalNodeValue = -2
+
+        # Number -> node. Numbers are given top down, the NYT always has the lowest one
+        self.m_nodes: List[VitterNode] = [None] * ((2 << self.SYMBOL_BITS) + 1)
+        self.m_root: VitterNode = VitterNode(self.m_nytValue, 0, len(self.m_nodes) - 1)
+        self.m_nodes[self.m_root.m_number] = self.m_root
+        self.m_nyt: VitterNode = self.m_root
+        self.m_symbolNodes: Dict[int, VitterNode] = {}
+
+        # (count, is leaf) -> number of the block leader
+        self.m_leaders: Dict[Tuple[int, bool], int] = {(0, True): self.m_root.m_number}
+
+        # Counts are halved when the root count passes the threshold. 0 = never
+        self.m_rescaleThreshold: int = rescaleThreshold
+
+    def AddSymbol(self, symbol: int) -> None:
+        leafToIncrement: VitterNode = None
+
+        if symbol not in self.m_symbolNodes:
+            node: VitterNode = self.__AddNewSymbol(symbol)
+            leafToIncrement = node.m_right
+        else:
+            node: VitterNode = self.m_symbolNodes[symbol]
+            self.__Swap(node, self.m_nodes[self.m_leaders[(node.m_count, True)]])
+
+            if node.m_parent != None and node.m_parent.m_left == self.m_nyt:
+                # Parent has the same count. Incremented first, so the leaf never slides past its own parent
+                leafToIncrement = node
+                node = node.m_parent
+
+        # Every node here is the leader of its block
+        while node != None:
+            node = self.__SlideAndIncrement(node)
+
+        if leafToIncrement != None:
+            self.__SlideAndIncrement(leafToIncrement)
+
+        if self.m_rescaleThreshold > 0 and self.m_root.m_count > self.m_rescaleThreshold:
+            self.__Rescale()
+
+    def GetCode(self, symbol: int) -> Tuple[int, int]:
+        # (code, length). Unknown symbols get the NYT code followed by the symbol
+        if symbol not in self.m_symbolNodes:
+            code, length = self.__ConstructCode(self.m_nyt)
+            return (code << self.SYMBOL_BITS) | symbol, length + self.SYMBOL_BITS
+
+        return self.__ConstructCode(self.m_symbolNodes[symbol])
+
+    def GetHuffmanCode(self, symbol: int) -> str:
+        code, length = self.GetCode(symbol)
+        return f"{code:0{length}b}" if length > 0 else ""
+
+    def GetSymbol(self, code: str) -> int:
+        currentNode: VitterNode = self.m_root
+
+        for char in code:
+            currentNode = currentNode.m_left if char == '0' else currentNode.m_right
+
+        return currentNode.m_byte
+
+    def __AddNewSymbol(self, symbol: int) -> VitterNode:
+        # NYT turns into an internal node of count 0 with the NYT and the new leaf as its children.
+        # Returns the new internal node
+        nyt: VitterNode = self.m_nyt
+        number: int = nyt.m_number
+
+        newParentNode: VitterNode = VitterNode(self.m_internalNodeValue, 0, number, False)
+        newSymbolNode: VitterNode = VitterNode(symbol, 0, number - 1)
+
+        if nyt.m_parent == None:
+            self.m_root = newParentNode
+        elif nyt.m_parent.m_left == nyt:
+            nyt.m_parent.AddLeft(newParentNode)
+        else:
+            nyt.m_parent.AddRight(newParentNode)
+
+        nyt.m_number = number - 2
+        newParentNode.AddLeft(nyt)
+        newParentNode.AddRight(newSymbolNode)
+
+        self.m_nodes[number] = newParentNode
+        self.m_nodes[number - 1] = newSymbolNode
+        self.m_nodes[number - 2] = nyt
+        self.m_symbolNodes[symbol] = newSymbolNode
+
+        self.m_leaders[(0, True)] = number - 1
+        self.m_leaders[(0, False)] = number
+        return newParentNode
+
+    def __Rescale(self) -> None:
+        # Halved counts, rounded up so no symbol drops to 0, do not keep the sibling property
+        # of the old shape, so the tree is rebuilt. Nodes are merged two lowest first, leafs
+        # before internal nodes of the same count. Merge order numbers them as the algorithm needs
+        leafs: List[VitterNode] = sorted([self.m_nyt, *self.m_symbolNodes.values()], key = lambda leaf: leaf.m_number)
+        queue: List[Tuple[int, bool, int, VitterNode]] = []
+
+        for order, leaf in enumerate(leafs):
+            leaf.m_count = (leaf.m_count + 1) // 2
+            heapq.heappush(queue, (leaf.m_count, False, order, leaf))
+
+        mergeOrder: List[VitterNode] = []
+        order: int = len(leafs)
+
+        while len(queue) > 1:
+            left: VitterNode = heapq.heappop(queue)[3]
+            right: VitterNode = heapq.heappop(queue)[3]
+            mergeOrder.extend((left, right))
+
+            parent: VitterNode = VitterNode(self.m_internalNodeValue, left.m_count + right.m_count, isLeaf = False)
+            parent.AddLeft(left)
+            parent.AddRight(right)
+            heapq.heappush(queue, (parent.m_count, True, order, parent))
+            order += 1
+
+        self.m_root = queue[0][3]
+        self.m_root.m_parent = None
+        mergeOrder.append(self.m_root)
+
+        self.m_nodes = [None] * len(self.m_nodes)
+        self.m_leaders = {}
+        firstNumber: int = len(self.m_nodes) - len(mergeOrder)
+
+        for number, node in enumerate(mergeOrder, firstNumber):
+            node.m_number = number
+            self.m_nodes[number] = node
+            self.m_leaders[(node.m_count, node.m_isLeaf)] = number
+
+    def __SlideAndIncrement(self, node: VitterNode) -> VitterNode:
+        # Returns the next node to increment
+        nodes: List[VitterNode] = self.m_nodes
+        leaders: Dict[Tuple[int, bool], int] = self.m_leaders
+        count: int = node.m_count
+        isLeaf: bool = node.m_isLeaf
+        parent: VitterNode = node.m_parent
+        number: int = node.m_number
+
+        # Node leaves its block, the node below it becomes the leader if they share the block
+        previousNode: VitterNode = nodes[number - 1] if number > 0 else None
+        if previousNode != None and previousNode.m_count == count and previousNode.m_isLeaf == isLeaf:
+            leaders[(count, isLeaf)] = number - 1
+        else:
+            del leaders[(count, isLeaf)]
+
+        # Leafs slide past internal nodes of their count, internal nodes past leafs of count + 1
+        if number + 1 < len(nodes):
+            nextNode: VitterNode = nodes[number + 1]
+
+            if nextNode.m_isLeaf != isLeaf and nextNode.m_count == (count if isLeaf else count + 1):
+                nextKey: Tuple[int, bool] = (nextNode.m_count, nextNode.m_isLeaf)
+                lastNumber: int = leaders[nextKey]
+
+                for otherNumber in range(number + 1, lastNumber + 1):
+                    self.__Swap(node, nodes[otherNumber])
+
+                leaders[nextKey] = lastNumber - 1
+
+        node.m_count = count + 1
+        leaders.setdefault((count + 1, isLeaf), node.m_number)
+
+        return node.m_parent if isLeaf else parent
+
+    def __Swap(self, first: VitterNode, second: VitterNode) -> None:
+        # Exchanges places of two nodes in the tree and their numbers. Neither is an ancestor of the other
+        if first == second:
+            return
+
+        firstParent: VitterNode = first.m_parent
+        secondParent: VitterNode = second.m_parent
+        isFirstLeft: bool = firstParent.m_left == first
+        isSecondLeft: bool = secondParent.m_left == second
+
+        if isFirstLeft:
+            firstParent.m_left = second
+        else:
+            firstParent.m_right = second
+
+        if isSecondLeft:
+            secondParent.m_left = first
+        else:
+            secondParent.m_right = first
+
+        first.m_parent, second.m_parent = secondParent, firstParent
+        first.m_number, second.m_number = second.m_number, first.m_number
+        self.m_nodes[first.m_number] = first
+        self.m_nodes[second.m_number] = second
+
+    def __ConstructCode(self, currentNode: VitterNode) -> Tuple[int, int]:
+        code: int = 0
+        length: int = 0
+
+        while currentNode.m_parent != None:
+            if currentNode == currentNode.m_parent.m_right:
+                code |= 1 << length
+
+            length += 1
+            currentNode = currentNode.m_parent
+
+        return code, length